@@ -5,11 +5,23 @@ provided by modules klient.py and serwer.py.
 from __future__ import annotations
 from sqlalchemy.orm import DeclarativeBase, relationship, mapped_column
 from sqlalchemy.orm import Mapped, validates, sessionmaker
-from sqlalchemy import Table, Column, ForeignKey, String, Integer
-from sqlalchemy import Engine, create_engine, select
+from sqlalchemy import Table, Column, Index, ForeignKey, String, Integer
+from sqlalchemy import DateTime, Boolean
+from sqlalchemy import Engine, Connection, create_engine, event, inspect
+from sqlalchemy import select, insert, update, delete, bindparam, literal
+from sqlalchemy import tuple_, func, and_, or_, text, type_coerce
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional, Callable, Dict, Union, Any
-from re import fullmatch
+from typing import Iterable, Iterator, Sequence, Set, Tuple, cast
+from re import fullmatch, findall
+from collections import deque
+from contextlib import contextmanager
+import calendar
 import datetime
+import heapq
+import itertools
+import threading
 
 
 class Base(DeclarativeBase):
@@ -22,17 +34,96 @@ c1: Column[Integer] = Column("osoba_id",
 c2: Column[Integer] = Column("wydarzenie_id",
                              ForeignKey("wydarzenia.id"),
                              primary_key=True)
-uczestnictwa = Table("osoba_wydarzenie", Base.metadata, c1, c2)
+uczestnictwa = Table("osoba_wydarzenie", Base.metadata, c1, c2,
+                     Index("ix_osoba_wydarzenie_wydarzenie_osoba", c2, c1))
 """Table for many-to-many relation: participation of people in events."""
 
 
+def sprawdz_godzine(s: str) -> str:
+    """Check that s is an hour in the format GG:MM. Return s.
+
+    Raises ValueError otherwise.
+    """
+    (hh, _, mm) = s.partition(":")
+    try:
+        hour = int(hh)
+        minute = int(mm)
+    except ValueError:
+        raise ValueError("Niepoprawna godzina.")
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError("Niepoprawna godzina.")
+    return s
+
+
+def sprawdz_date(s: str) -> str:
+    """Check that s is a date in the format RRRR-MM-DD. Return s.
+
+    Raises ValueError otherwise.
+    """
+    try:
+        datetime.date.fromisoformat(s)
+    except ValueError:
+        raise ValueError("Niepoprawna data.")
+    return s
+
+
+def chwila(data: str, godzina: str) -> datetime.datetime:
+    """Return the moment given by a date RRRR-MM-DD and an hour GG:MM."""
+    (hh, _, mm) = godzina.partition(":")
+    return datetime.datetime.combine(datetime.date.fromisoformat(data),
+                                     datetime.time(int(hh), int(mm)))
+
+
+def sprawdz_kolejnosc(data_rozp: str, godzina_rozp: str,
+                      data_zak: str, godzina_zak: str) -> None:
+    """Check that an event does not end before it starts.
+
+    Raises ValueError otherwise.
+    """
+    if chwila(data_rozp, godzina_rozp) > chwila(data_zak, godzina_zak):
+        raise ValueError("Data rozpoczęcia powinna być"
+                         " nie później od daty zakończenia.")
+
+
+def sprawdz_niepusty(s: str, komunikat: str) -> str:
+    """Check that s is a nonempty string. Return s.
+
+    Raises ValueError with the given message otherwise.
+    """
+    if s == "":
+        raise ValueError(komunikat)
+    return s
+
+
+def sprawdz_email(s: str) -> str:
+    """Check that s looks like an email address. Return s.
+
+    Raises ValueError otherwise.
+    """
+    if fullmatch(r"^\S+@[^@\s.]+\.[^@\s]+", s) is None:
+        raise ValueError("Niepoprawny adres email.")
+    return s
+
+
+Czas = DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d"
+                    " %(hour)02d:%(minute)02d:%(second)02d"), "sqlite")
+"""Column type of moments.
+
+In SQLite, stored as text in the format of SQLite's datetime function,
+so that stored moments compare like the moments themselves.
+"""
+
+
 class Wydarzenie(Base):
     """ORM class for events."""
 
     __tablename__ = "wydarzenia"
+    __table_args__ = (Index("ix_wydarzenia_miejsce_poczatek",
+                            "miejsce_id", "poczatek"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    nazwa: Mapped[str] = mapped_column(String)
+    nazwa: Mapped[str] = mapped_column(String, index=True)
     """Name"""
     data_rozp: Mapped[str] = mapped_column(String)
     """Starting date"""
@@ -42,8 +133,18 @@ class Wydarzenie(Base):
     """Ending date"""
     godzina_zak: Mapped[str] = mapped_column(String)
     """Ending hour"""
+    poczatek: Mapped[Optional[datetime.datetime]] \
+        = mapped_column(Czas, index=True)
+    """Starting moment, computed from data_rozp and godzina_rozp"""
+    koniec: Mapped[Optional[datetime.datetime]] = mapped_column(Czas)
+    """Ending moment, computed from data_zak and godzina_zak"""
     opis: Mapped[str] = mapped_column(String)
     """Description"""
+    liczba_uczestnikow: Mapped[int] = mapped_column(Integer, default=0)
+    """Number of participants, kept up to date by triggers on uczestnictwa
+    -- see _migracja_uczestnicy"""
+    limit_miejsc: Mapped[Optional[int]] = mapped_column(Integer)
+    """Greatest number of participants; `None` if not limited"""
     miejsce_id: Mapped[Optional[int]] \
         = mapped_column(ForeignKey("miejsca.id"))
     miejsce: Mapped[Optional["Miejsce"]] = relationship()
@@ -55,35 +156,19 @@ class Wydarzenie(Base):
 
     @validates("godzina_rozp", "godzina_zak")
     def validate_hour(self, key: str, s: str) -> str:
-        (hh, _, mm) = s.partition(":")
-        try:
-            hour = int(hh)
-            minute = int(mm)
-            if not 0 <= hour and hour <= 23 and 0 <= minute and minute <= 59:
-                raise ValueError("Niepoprawna godzina.")
-        except ValueError:
-            raise ValueError("Niepoprawna godzina.")
+        sprawdz_godzine(s)
         if key == "godzina_zak":
-            if (datetime.datetime.fromisoformat(self.data_rozp + "T"
-                                                + self.godzina_rozp)
-               > datetime.datetime.fromisoformat(self.data_zak + "T" + s)):
-                raise ValueError("Data rozpoczęcia powinna być"
-                                 " nie później od daty zakończenia.")
+            sprawdz_kolejnosc(self.data_rozp, self.godzina_rozp,
+                              self.data_zak, s)
         return s
 
     @validates("data_rozp", "data_zak")
     def validate_date(self, _, s: str) -> str:
-        try:
-            datetime.date.fromisoformat(s)
-        except ValueError:
-            raise ValueError("Niepoprawna data.")
-        return s
+        return sprawdz_date(s)
 
     @validates("nazwa")
     def validate_nazwa(self, _, s: str) -> str:
-        if s == "":
-            raise ValueError("Nazwa powinna być niepusta.")
-        return s
+        return sprawdz_niepusty(s, "Nazwa powinna być niepusta.")
 
 
 class Miejsce(Base):
@@ -92,22 +177,18 @@ class Miejsce(Base):
     __tablename__ = "miejsca"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    nazwa: Mapped[str] = mapped_column(String)
+    nazwa: Mapped[str] = mapped_column(String, index=True)
     """Name"""
     adres: Mapped[Optional[str]] = mapped_column(String)
     """Address"""
 
     @validates("nazwa")
     def validate_nazwa(self, _, s: str) -> str:
-        if s == "":
-            raise ValueError("Nazwa powinna być niepusta.")
-        return s
+        return sprawdz_niepusty(s, "Nazwa powinna być niepusta.")
 
     @validates("adres")
     def validate_adres(self, _, s: str) -> str:
-        if s == "":
-            raise ValueError("Adres powinien być niepusty.")
-        return s
+        return sprawdz_niepusty(s, "Adres powinien być niepusty.")
 
 
 class Osoba(Base):
@@ -116,10 +197,10 @@ class Osoba(Base):
     __tablename__ = "osoby"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    imie: Mapped[str] = mapped_column(String)
+    imie: Mapped[str] = mapped_column(String, index=True)
     """Name"""
-    email: Mapped[str] = mapped_column(String)
-    """Email address"""
+    email: Mapped[str] = mapped_column(String, index=True, unique=True)
+    """Email address, unique"""
     wydarzenia: Mapped[List[Wydarzenie]] \
         = relationship("Wydarzenie",
                        secondary=uczestnictwa,
@@ -128,24 +209,127 @@ class Osoba(Base):
 
     @validates("imie")
     def validate_imie(self, _, s: str) -> str:
-        if s == "":
-            raise ValueError("Imię powinno być niepuste.")
-        return s
+        return sprawdz_niepusty(s, "Imię powinno być niepuste.")
 
     @validates("email")
     def validate_email(self, _, s: str) -> str:
-        if fullmatch(r"^\S+@[^@\s.]+\.[^@\s]+", s) is None:
-            raise ValueError("Niepoprawny adres email.")
-        return s
+        return sprawdz_email(s)
+
+
+CZESTOTLIWOSCI = ["dziennie", "tygodniowo", "miesiecznie"]
+"""Frequencies of series of events -- see Powtorzenie."""
+
+
+class Powtorzenie(Base):
+    """ORM class for recurrence rules of events.
+
+    An event with a rule is a series: its own fields describe its first
+    occurrence, and the following ones are computed when needed
+    -- see wystapienia. Occurrences can be cancelled or replaced
+    by events of their own -- see wyjatki.
+    """
+
+    __tablename__ = "powtorzenia"
+
+    wydarzenie_id: Mapped[int] \
+        = mapped_column(ForeignKey("wydarzenia.id"), primary_key=True)
+    czestotliwosc: Mapped[str] = mapped_column(String)
+    """Frequency, one of CZESTOTLIWOSCI"""
+    interwal: Mapped[int] = mapped_column(Integer)
+    """Number of days, weeks or months between occurrences"""
+    liczba: Mapped[Optional[int]] = mapped_column(Integer)
+    """Number of occurrences; `None` if not limited"""
+    do_kiedy: Mapped[Optional[datetime.datetime]] = mapped_column(Czas)
+    """No occurrence starts after this moment; `None` if not limited"""
+    koniec: Mapped[Optional[datetime.datetime]] \
+        = mapped_column(Czas, index=True)
+    """Ending moment of the last occurrence; `None` if there is none"""
+
+
+wyjatki = Table("wyjatki", Base.metadata,
+                Column("wydarzenie_id", ForeignKey("wydarzenia.id"),
+                       primary_key=True),
+                Column("poczatek", Czas, primary_key=True),
+                Column("zastepstwo_id", ForeignKey("wydarzenia.id"),
+                       index=True))
+"""Table of exceptions of series: starting moments of the occurrences
+that were cancelled, or replaced by the event with ID zastepstwo_id
+-- see odwolaj_wystapienie and mod_wystapienie."""
+
+
+zmiany = Table("zmiany", Base.metadata,
+               Column("rewizja", Integer, primary_key=True),
+               Column("tabela", String),
+               Column("klucz", Integer),
+               Column("klucz2", Integer),
+               Column("usuniete", Boolean),
+               Index("ix_zmiany_klucz", "tabela", "klucz", "klucz2",
+                     "rewizja"))
+"""Table of the log of changes: for each revision -- see Metadane,
+the row that it inserted, updated or deleted, identified by the name
+of its table -- see ZRODLA_ZMIAN -- and its ID, or the IDs of the event
+and the person for participations. Deleted rows are marked by usuniete.
+Kept up to date by triggers, and compacted by konserwuj
+-- see zmiany_od."""
+
+
+@event.listens_for(Wydarzenie, "before_insert")
+@event.listens_for(Wydarzenie, "before_update")
+def przelicz_chwile(_mapper: Any, _connection: Any, wyd: Wydarzenie) -> None:
+    """Compute the columns poczatek and koniec of an event being written."""
+    wyd.poczatek = chwila(wyd.data_rozp, wyd.godzina_rozp)
+    wyd.koniec = chwila(wyd.data_zak, wyd.godzina_zak)
+
+
+class Metadane(Base):
+    """ORM class for named integer values describing the database.
+
+    Keys:
+    wersja_schematu -- number of steps of MIGRACJE applied to the database.
+    max_dlugosc -- upper bound on the length of events, in seconds.
+    Kept up to date by triggers, and used to bound searches
+    for events overlapping a given time range.
+    rewizja -- number of rows inserted, updated or deleted so far
+    in the tables of events, locations, people and participations.
+    Kept up to date by triggers -- see rewizja.
+    poczatek_zmian -- revision since which the log of changes is complete
+    -- see zmiany_od.
+    import:... -- number of records written so far by a resumable import
+    -- see importuj.
+    """
+
+    __tablename__ = "metadane"
+
+    klucz: Mapped[str] = mapped_column(String, primary_key=True)
+    wartosc: Mapped[int] = mapped_column(Integer)
 
 
 class NotFoundError(Exception):
     """Error raised by functions that modify rows if no row is found."""
     wydarzenie_msg = "Nie ma takiego wydarzenia."
+    wystapienie_msg = "Nie ma takiego wystąpienia wydarzenia."
     miejsce_msg = "Nie ma takiego miejsca."
     osoba_msg = "Nie ma takiej osoby."
 
 
+class DuplicateError(ValueError):
+    """Error raised by functions that write rows if a unique value
+    is already taken."""
+    email_msg = "Adres email jest już zajęty."
+
+
+class CapacityError(ValueError):
+    """Error raised by functions that sign people up for events
+    if the event is full -- see Wydarzenie.limit_miejsc."""
+    wydarzenie_msg = "Wydarzenie jest pełne."
+
+
+class ConflictError(ValueError):
+    """Error raised by functions that assign locations to events
+    if the location is taken at the time of the event."""
+    miejsce_msg = "Miejsce jest zajęte w czasie wydarzenia."
+
+
 path = "baza/kalendarz.db"
 """Path of database file to be accessed or created.
 
@@ -158,12 +342,196 @@ echo = True
 Set to `True` iff the program should display all of its SQL operations
 on the database.
 """
+pula: Dict[str, Any] = {"pool_size": 5, "max_overflow": 10,
+                        "pool_timeout": 30}
+"""Connection pool parameters passed to SQLAlchemy's engine by get_engine."""
+PROFILE: Dict[str, Dict[str, Any]] = {
+    "trwaly": {"journal_mode": "WAL", "synchronous": "FULL",
+               "cache_size": -16384, "mmap_size": 64 * 2**20,
+               "temp_store": "DEFAULT", "busy_timeout": 5000},
+    "szybki": {"journal_mode": "WAL", "synchronous": "NORMAL",
+               "cache_size": -65536, "mmap_size": 256 * 2**20,
+               "temp_store": "MEMORY", "busy_timeout": 5000},
+    "masowy": {"journal_mode": "WAL", "synchronous": "OFF",
+               "cache_size": -262144, "mmap_size": 256 * 2**20,
+               "temp_store": "MEMORY", "busy_timeout": 30000,
+               "wal_autocheckpoint": 10000}}
+"""SQLite pragmas set on every new connection, by name of profile:
+trwaly -- WAL journal, so that readers do not wait for writers, and every
+commit synced to disk.
+szybki -- commits survive a crash of the process, but the last ones
+may be lost on power failure; larger caches.
+masowy -- for loading data in bulk: no syncing, rare checkpoints;
+a power failure may corrupt the database.
+cache_size is in KiB if negative, mmap_size in bytes, busy_timeout
+in milliseconds."""
+profil = "trwaly"
+"""Name of the profile of connections made by get_engine -- see PROFILE;
+`None` for SQLite's defaults."""
 AnsDict = Dict[str, Union[int, Optional[str]]]
+WynikWsadu = Dict[str, List[Any]]
+"""Result of a batch function -- see dodaj_wydarzenia."""
+rozmiar_paczki = 1000
+"""Default number of records written by one statement
+in batch functions -- see dodaj_wydarzenia."""
+KONFLIKTY = ["odrzuc", "ostrzez", "pozwol"]
+"""What dodaj_miejsce_do_wydarzenia does if the location is taken
+at the time of the event: raise ConflictError, assign the location
+and return the conflicting events, or assign it without looking."""
+konflikty_miejsc = "odrzuc"
+"""Default mode of dodaj_miejsce_do_wydarzenia -- see KONFLIKTY."""
+horyzont_konfliktow = datetime.timedelta(days=366)
+"""Conflicts of infinite series are looked for up to this long
+after their start or the current moment, whichever is later."""
+
+Session = sessionmaker()
+"""Session factory shared by all functions of this module.
+
+Bound to an engine when a session is opened: `Session(bind=engine)`.
+"""
+Lacze = Union[Engine, Connection]
+"""What the functions of this module take as their first argument:
+an engine, or a connection on which they run, e.g. the synchronous
+facade of an asynchronous connection -- see serwer_async.py. Given
+a connection, they take part in its transaction, if it has begun one,
+and leave committing it to the caller."""
+
+
+@contextmanager
+def polaczenie(engine: Lacze) -> Iterator[Connection]:
+    """Return a context manager yielding a new connection of an engine,
+    closed on exit, or the given connection itself."""
+    if isinstance(engine, Connection):
+        yield engine
+        return
+    with engine.connect() as conn:
+        yield conn
+
+
+@contextmanager
+def transakcja(engine: Lacze) -> Iterator[Connection]:
+    """Return a context manager yielding a connection in a transaction,
+    committed on exit and rolled back on error: a new connection
+    of an engine, or the given connection, joining its transaction
+    if it has begun one."""
+    if isinstance(engine, Engine):
+        with engine.begin() as conn:
+            yield conn
+    elif engine.in_transaction():
+        yield engine
+    else:
+        with engine.begin():
+            yield engine
+
+
+_silniki: Dict[str, Engine] = {}
+_silniki_blokada = threading.Lock()
+
+
+def get_engine(url: Optional[str] = None) -> Engine:
+    """Return the process-wide engine for the given database URL.
+
+    The engine is created on first use with the parameters echo and pula,
+    and later calls return the same engine, so that the connection pool
+    and SQLAlchemy's statement cache survive between calls.
+
+    Keyword arguments:
+    url -- database URL; dbpath if `None`.
+    """
+    if url is None:
+        url = dbpath
+    with _silniki_blokada:
+        engine = _silniki.get(url)
+        if engine is None:
+            engine = create_engine(url, echo=echo, **pula)
+            if profil is not None:
+                ustaw_profil(engine, profil)
+            _silniki[url] = engine
+    return engine
+
+
+def ustaw_profil(engine: Engine, nazwa: str) -> None:
+    """Set the pragmas of the given profile -- see PROFILE, on every new
+    connection of a SQLite engine. Other engines are left unchanged."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmy = PROFILE[nazwa]
+
+    def polaczono(dbapi_conn: Any, _record: Any) -> None:
+        kursor = dbapi_conn.cursor()
+        for pragma, wartosc in pragmy.items():
+            kursor.execute("PRAGMA {0} = {1}".format(pragma, wartosc))
+        kursor.close()
+    event.listen(engine, "connect", polaczono)
+
+
+przechowanie_zmian = 100000
+"""Number of most recent revisions kept in the log of changes
+by konserwuj -- see zmiany_od."""
+
+
+def _kompaktuj_zmiany(conn: Connection) -> int:
+    """Compact the log of changes -- see zmiany: delete the entries
+    followed by a later entry for the same row, and those older than
+    przechowanie_zmian revisions, moving the start of the log.
+    Returns the number of deleted entries."""
+    z = zmiany.alias("z")
+    wartosci = dict(conn.execute(
+        select(Metadane.klucz, Metadane.wartosc)
+        .where(Metadane.klucz.in_(["rewizja", "poczatek_zmian"]))).all())
+    poczatek = max(wartosci.get("poczatek_zmian", 0),
+                   wartosci.get("rewizja", 0) - przechowanie_zmian)
+    _ustaw_metadane(conn, "poczatek_zmian", poczatek)
+    wynik = conn.execute(delete(zmiany).where(or_(
+        zmiany.c.rewizja <= poczatek,
+        select(z.c.rewizja)
+        .where(z.c.tabela == zmiany.c.tabela, z.c.klucz == zmiany.c.klucz,
+               z.c.klucz2.is_not_distinct_from(zmiany.c.klucz2),
+               z.c.rewizja > zmiany.c.rewizja).exists())))
+    return int(wynik.rowcount)
+
+
+def konserwuj(engine: Lacze) -> Dict[str, int]:
+    """Compact the log of changes -- see _kompaktuj_zmiany, checkpoint
+    the write-ahead log, truncating it, and let SQLite refresh
+    the statistics of the query planner (PRAGMA optimize).
+
+    Meant to be called periodically, e.g. by the server.
+    Returns a dictionary with fields zajete (1 if the checkpoint could not
+    finish because of other connections, 0 otherwise), strony_logu and
+    przeniesione (numbers of pages in the log and moved to the database;
+    -1 if the database is not in WAL mode), and zmiany (number of entries
+    deleted from the log of changes).
+    """
+    with transakcja(engine) as conn:
+        usuniete = _kompaktuj_zmiany(conn)
+    with polaczenie(engine) as conn:
+        zajete, strony, przeniesione = conn.exec_driver_sql(
+            "PRAGMA wal_checkpoint(TRUNCATE)").one()
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.commit()
+    return {"zajete": zajete, "strony_logu": strony,
+            "przeniesione": przeniesione, "zmiany": usuniete}
+
+
+def dispose_engines(url: Optional[str] = None) -> None:
+    """Dispose of engines created by get_engine and forget them.
+
+    Keyword arguments:
+    url -- database URL whose engine should be disposed of;
+    all engines if `None`.
+    """
+    with _silniki_blokada:
+        urls = list(_silniki) if url is None else [url]
+        for u in urls:
+            engine = _silniki.pop(u, None)
+            if engine is not None:
+                engine.dispose()
 
 
 def with_engine(f: Callable[..., Any], *args: Any,
-                dispose: bool = False) -> None:
-    """Call function with a new SQLAlchemy engine.
+                dispose: bool = False) -> Any:
+    """Call function with the process-wide SQLAlchemy engine.
 
     Positional arguments:
     f -- function that takes an SQLAlchemy engine as first argument.
@@ -174,24 +542,343 @@ def with_engine(f: Callable[..., Any], *args: Any,
     calling f. Useful when testing, if one wants to delete the database
     after performing some operations.
     """
-    engine = create_engine(dbpath, echo=echo)
+    engine = get_engine()
     res = f(engine, *args)
     if dispose:
-        engine.dispose()
+        dispose_engines(dbpath)
     return res
 
 
-def utworz(engine: Engine) -> None:
-    """Create database."""
-    Base.metadata.create_all(engine)
+def _sprawdz_wsad(rekordy: Sequence[Dict[str, Any]],
+                  sprawdz: Callable[[Dict[str, Any]], Dict[str, Any]],
+                  scisle: bool) -> Tuple[List[Tuple[int, Dict[str, Any]]],
+                                         List[Dict[str, Any]]]:
+    """Validate the records of a batch.
+
+    Returns the list of pairs (number of record, row to be written)
+    and the list of errors -- see dodaj_wydarzenia.
+
+    Positional arguments:
+    sprawdz -- function that returns the row for a record,
+    or raises ValueError or KeyError if the record is invalid.
+    scisle -- set to `True` iff the first invalid record should raise
+    ValueError instead of being reported.
+    """
+    wiersze = []
+    bledy: List[Dict[str, Any]] = []
+    for nr, rekord in enumerate(rekordy):
+        try:
+            wiersze.append((nr, sprawdz(rekord)))
+        except (ValueError, KeyError, TypeError) as e:
+            blad = ("Brak pola {0}.".format(e) if isinstance(e, KeyError)
+                    else str(e))
+            _zglos_blad(bledy, nr, blad, scisle)
+    return wiersze, bledy
+
+
+def _zglos_blad(bledy: List[Dict[str, Any]], nr: int, blad: str,
+                scisle: bool) -> None:
+    """Append an error of the record with the given number to bledy.
+
+    Raises ValueError instead if scisle.
+    """
+    if scisle:
+        raise ValueError("Rekord nr {0}: {1}".format(nr, blad))
+    bledy.append({"nr": nr, "blad": blad})
+
+
+def _paczki(xs: List[Any], rozmiar: Optional[int]) -> Iterator[List[Any]]:
+    """Split a list into consecutive chunks of the given size.
 
+    Uses rozmiar_paczki if rozmiar is `None`.
+    """
+    if rozmiar is None:
+        rozmiar = rozmiar_paczki
+    for i in range(0, len(xs), rozmiar):
+        yield xs[i:i + rozmiar]
+
+
+def _dodaj_wiele(session: Any, model: Any,
+                 wiersze: List[Tuple[int, Dict[str, Any]]],
+                 ids: List[Optional[int]], rozmiar: Optional[int]) -> None:
+    """Insert rows into the table of model, one statement per chunk.
 
-def dodaj_wydarzenie(engine: Engine, nazwa: str,
+    Stores the ID of each row in ids, under the number of its record.
+    """
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    for paczka in _paczki(wiersze, rozmiar):
+        nowe = session.scalars(stmt, [w for _, w in paczka]).all()
+        for (nr, _), id in zip(paczka, nowe):
+            ids[nr] = id
+
+
+def _dodaj_kolumne(conn: Connection, kolumna: Column[Any]) -> None:
+    """Add a column of a model to its table, unless it already exists."""
+    tabela = kolumna.table.name
+    if kolumna.name in {k["name"] for k in inspect(conn).get_columns(tabela)}:
+        return
+    conn.exec_driver_sql("ALTER TABLE {0} ADD COLUMN {1} {2}".format(
+        tabela, kolumna.name, kolumna.type.compile(conn.dialect)))
+
+
+def _utworz_indeksy(conn: Connection, tabela: Table) -> None:
+    """Create the indexes declared on a table, unless they already exist."""
+    for indeks in tabela.indexes:
+        indeks.create(conn, checkfirst=True)
+
+
+def _ustaw_metadane(conn: Connection, klucz: str, wartosc: int) -> None:
+    """Set a value in the table of metadata -- see Metadane."""
+    conn.execute(insert(Metadane).prefix_with("OR REPLACE")
+                 .values(klucz=klucz, wartosc=wartosc))
+
+
+def _dlugosc_sql(wiersz: str) -> str:
+    """Return an SQL expression: upper bound on the length in seconds
+    of the event in the given row."""
+    return ("CAST((julianday({0}.koniec) - julianday({0}.poczatek)) * 86400"
+            " AS INTEGER) + 1".format(wiersz))
+
+
+def _migracja_chwile(conn: Connection) -> None:
+    """Add the columns poczatek and koniec to the table of events,
+    fill them in, and create the index and triggers for time ranges."""
+    t = cast(Table, Wydarzenie.__table__)
+    _dodaj_kolumne(conn, t.c.poczatek)
+    _dodaj_kolumne(conn, t.c.koniec)
+    wiersze = []
+    for r in conn.execute(select(t.c.id, t.c.data_rozp, t.c.godzina_rozp,
+                                 t.c.data_zak, t.c.godzina_zak)
+                          .where(t.c.poczatek.is_(None))):
+        try:
+            wiersze.append({"b_id": r.id,
+                            "poczatek": chwila(r.data_rozp, r.godzina_rozp),
+                            "koniec": chwila(r.data_zak, r.godzina_zak)})
+        except ValueError:
+            pass
+    if wiersze:
+        conn.execute(update(t).where(t.c.id == bindparam("b_id"))
+                     .values(poczatek=bindparam("poczatek"),
+                             koniec=bindparam("koniec")),
+                     wiersze)
+    _utworz_indeksy(conn, t)
+    conn.exec_driver_sql(
+        "INSERT OR REPLACE INTO metadane (klucz, wartosc)"
+        " SELECT 'max_dlugosc', coalesce(max({0}), 0) FROM wydarzenia"
+        .format(_dlugosc_sql("wydarzenia")))
+    for nazwa, kiedy in [("insert", "INSERT"),
+                         ("update", "UPDATE OF poczatek, koniec")]:
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS wydarzenia_max_dlugosc_{0}"
+            " AFTER {1} ON wydarzenia BEGIN"
+            " UPDATE metadane SET wartosc = max(wartosc, coalesce({2}, 0))"
+            " WHERE klucz = 'max_dlugosc'; END"
+            .format(nazwa, kiedy, _dlugosc_sql("NEW")))
+
+
+def _migracja_indeksy(conn: Connection) -> None:
+    """Create the indexes on the columns used by lookups,
+    including the unique index on the email addresses of people.
+
+    Raises DuplicateError if some email address is used more than once.
+    """
+    powtorzone = conn.scalars(select(Osoba.email).group_by(Osoba.email)
+                              .having(func.count() > 1).limit(5)).all()
+    if powtorzone:
+        raise DuplicateError(DuplicateError.email_msg + " Powtórzone adresy: "
+                             + ", ".join(powtorzone))
+    for model in [Wydarzenie, Miejsce, Osoba]:
+        _utworz_indeksy(conn, cast(Table, model.__table__))
+    _utworz_indeksy(conn, uczestnictwa)
+
+
+def _migracja_stronicowanie(conn: Connection) -> None:
+    """Replace the index on the events of participations with one
+    on the pairs (event, person), used by the pages of participants."""
+    conn.exec_driver_sql("DROP INDEX IF EXISTS"
+                         " ix_osoba_wydarzenie_wydarzenie_id")
+    _utworz_indeksy(conn, uczestnictwa)
+
+
+INDEKSY_PELNOTEKSTOWE = [("wydarzenia", "nazwa", ["nazwa", "opis"]),
+                         ("miejsca", "nazwa", ["nazwa", "adres"]),
+                         ("osoby", "imie", ["imie"])]
+"""Tables searched by szukaj: name of table, column holding the name
+of a row, and indexed columns. The full-text index of a table is
+the FTS5 table named after it with suffix _fts."""
+
+
+def _migracja_pelnotekstowa(conn: Connection) -> None:
+    """Create the full-text indexes -- see INDEKSY_PELNOTEKSTOWE,
+    with triggers that keep them in sync with their tables."""
+    for tabela, _, kolumny in INDEKSY_PELNOTEKSTOWE:
+        fts = tabela + "_fts"
+        k = ", ".join(kolumny)
+        stare = ", ".join("old." + kol for kol in kolumny)
+        nowe = ", ".join("new." + kol for kol in kolumny)
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5({1},"
+            " content='{2}', content_rowid='id', prefix='2 3',"
+            " tokenize='unicode61 remove_diacritics 2')"
+            .format(fts, k, tabela))
+        usun = ("INSERT INTO {0}({0}, rowid, {1}) VALUES ('delete', old.id,"
+                " {2});".format(fts, k, stare))
+        dodaj = ("INSERT INTO {0}(rowid, {1}) VALUES (new.id, {2});"
+                 .format(fts, k, nowe))
+        for nazwa, kiedy, cialo in [("insert", "INSERT", dodaj),
+                                    ("delete", "DELETE", usun),
+                                    ("update", "UPDATE OF " + k,
+                                     usun + " " + dodaj)]:
+            conn.exec_driver_sql(
+                "CREATE TRIGGER IF NOT EXISTS {0}_{1} AFTER {2} ON {3}"
+                " BEGIN {4} END".format(fts, nazwa, kiedy, tabela, cialo))
+        conn.exec_driver_sql("INSERT INTO {0}({0}) VALUES ('rebuild')"
+                             .format(fts))
+
+
+TABELE_REWIZJI = ["wydarzenia", "miejsca", "osoby", "osoba_wydarzenie",
+                  "powtorzenia", "wyjatki"]
+"""Tables whose changes are counted by the revision -- see Metadane."""
+
+
+def _wyzwalacze_rewizji(conn: Connection, tabele: List[str]) -> None:
+    """Create the triggers that increment the revision on every change
+    of the given tables."""
+    for tabela in tabele:
+        for kiedy in ["INSERT", "UPDATE", "DELETE"]:
+            conn.exec_driver_sql(
+                "CREATE TRIGGER IF NOT EXISTS {0}_rewizja_{1} AFTER {2}"
+                " ON {0} BEGIN UPDATE metadane SET wartosc = wartosc + 1"
+                " WHERE klucz = 'rewizja'; END"
+                .format(tabela, kiedy.lower(), kiedy))
+
+
+def _migracja_rewizja(conn: Connection) -> None:
+    """Create the revision of the database -- see Metadane, with triggers
+    that increment it on every change of the tables of events, locations,
+    people and participations."""
+    conn.exec_driver_sql("INSERT OR IGNORE INTO metadane (klucz, wartosc)"
+                         " VALUES ('rewizja', 0)")
+    _wyzwalacze_rewizji(conn, TABELE_REWIZJI[:4])
+
+
+def _migracja_powtorzenia(conn: Connection) -> None:
+    """Count the changes of the tables of series in the revision."""
+    _wyzwalacze_rewizji(conn, TABELE_REWIZJI[4:])
+
+
+ZRODLA_ZMIAN = [("wydarzenia", "wydarzenia", "id", None, True),
+                ("miejsca", "miejsca", "id", None, True),
+                ("osoby", "osoby", "id", None, True),
+                ("osoba_wydarzenie", "uczestnictwa", "wydarzenie_id",
+                 "osoba_id", True),
+                ("powtorzenia", "wydarzenia", "wydarzenie_id", None, False),
+                ("wyjatki", "wydarzenia", "wydarzenie_id", None, False)]
+"""Tables whose changes are logged -- see zmiany: name of the table,
+name of the table in the log, columns holding the keys of a row,
+and whether deleting a row deletes it in the log. Changes of the rules
+and exceptions of series are logged as changes of their events."""
+
+
+def _migracja_zmiany(conn: Connection) -> None:
+    """Replace the triggers that increment the revision by ones that also
+    log the change -- see zmiany. The log starts at the current revision.
+    """
+    for tabela in TABELE_REWIZJI:
+        for kiedy in ["insert", "update", "delete"]:
+            conn.exec_driver_sql("DROP TRIGGER IF EXISTS {0}_rewizja_{1}"
+                                 .format(tabela, kiedy))
+    for tabela, nazwa, klucz, klucz2, usuwa in ZRODLA_ZMIAN:
+        for kiedy, wiersz in [("INSERT", "NEW"), ("UPDATE", "NEW"),
+                              ("DELETE", "OLD")]:
+            conn.exec_driver_sql(
+                "CREATE TRIGGER IF NOT EXISTS {0}_zmiany_{1} AFTER {2}"
+                " ON {0} BEGIN UPDATE metadane SET wartosc = wartosc + 1"
+                " WHERE klucz = 'rewizja'; INSERT INTO zmiany (rewizja,"
+                " tabela, klucz, klucz2, usuniete) SELECT wartosc, '{3}',"
+                " {4}.{5}, {6}, {7} FROM metadane WHERE klucz = 'rewizja';"
+                " END".format(tabela, kiedy.lower(), kiedy, nazwa, wiersz,
+                              klucz,
+                              "NULL" if klucz2 is None
+                              else wiersz + "." + klucz2,
+                              int(usuwa and kiedy == "DELETE")))
+    conn.exec_driver_sql("INSERT OR IGNORE INTO metadane (klucz, wartosc)"
+                         " SELECT 'poczatek_zmian', wartosc FROM metadane"
+                         " WHERE klucz = 'rewizja'")
+
+
+def _migracja_miejsca(conn: Connection) -> None:
+    """Replace the index on the locations of events with one on the pairs
+    (location, starting moment), used by the searches for the events
+    of a location in a range -- see _zajetosc."""
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_wydarzenia_miejsce_id")
+    _utworz_indeksy(conn, cast(Table, Wydarzenie.__table__))
+
+
+def _migracja_uczestnicy(conn: Connection) -> None:
+    """Add the numbers of participants and the limits of participants
+    of events -- see Wydarzenie, with triggers that keep the numbers up
+    to date and reject participations beyond the limits."""
+    t = cast(Table, Wydarzenie.__table__)
+    for kolumna in [t.c.liczba_uczestnikow, t.c.limit_miejsc]:
+        _dodaj_kolumne(conn, kolumna)
+    conn.exec_driver_sql("UPDATE wydarzenia SET liczba_uczestnikow ="
+                         " (SELECT count(*) FROM osoba_wydarzenie"
+                         " WHERE wydarzenie_id = wydarzenia.id)")
+    zmiana = ("UPDATE wydarzenia SET liczba_uczestnikow"
+              " = liczba_uczestnikow {0} 1 WHERE id = {1}.wydarzenie_id;")
+    for nazwa, kiedy, cialo in [
+            ("insert", "INSERT", zmiana.format("+", "NEW")),
+            ("delete", "DELETE", zmiana.format("-", "OLD")),
+            ("update", "UPDATE OF wydarzenie_id",
+             zmiana.format("-", "OLD") + " " + zmiana.format("+", "NEW"))]:
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS osoba_wydarzenie_liczba_{0}"
+            " AFTER {1} ON osoba_wydarzenie BEGIN {2} END"
+            .format(nazwa, kiedy, cialo))
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS osoba_wydarzenie_limit"
+        " BEFORE INSERT ON osoba_wydarzenie"
+        " WHEN (SELECT liczba_uczestnikow >= limit_miejsc FROM wydarzenia"
+        " WHERE id = NEW.wydarzenie_id)"
+        " BEGIN SELECT RAISE(ABORT, '{0}'); END"
+        .format(CapacityError.wydarzenie_msg))
+
+
+MIGRACJE: List[Callable[[Connection], None]] = [_migracja_chwile,
+                                                _migracja_indeksy,
+                                                _migracja_stronicowanie,
+                                                _migracja_pelnotekstowa,
+                                                _migracja_rewizja,
+                                                _migracja_powtorzenia,
+                                                _migracja_zmiany,
+                                                _migracja_miejsca,
+                                                _migracja_uczestnicy]
+"""Steps that bring the schema of an existing database up to date.
+
+Step number i (counting from 1) brings the schema from version i - 1
+to version i -- see Metadane. Steps are also applied to newly created
+databases, so they must not fail if the schema is already up to date.
+"""
+
+
+def utworz(engine: Lacze) -> None:
+    """Create database, or bring the schema of an existing one
+    up to date -- see MIGRACJE."""
+    with transakcja(engine) as conn:
+        Base.metadata.create_all(conn)
+        wersja = conn.scalar(select(Metadane.wartosc)
+                             .where(Metadane.klucz == "wersja_schematu"))
+        for krok in MIGRACJE[wersja or 0:]:
+            krok(conn)
+        _ustaw_metadane(conn, "wersja_schematu", len(MIGRACJE))
+
+
+def dodaj_wydarzenie(engine: Lacze, nazwa: str,
                      data_rozp: str, godzina_rozp: str,
                      data_zak: str, godzina_zak: str, opis: str) -> int:
     """Insert row with given field values into the table of events."""
-    Session = sessionmaker(engine)
-    with Session() as session:
+    with Session(bind=engine) as session:
         wyd = Wydarzenie(nazwa=nazwa,
                          data_rozp=data_rozp,
                          godzina_rozp=godzina_rozp,
@@ -205,17 +892,133 @@ def dodaj_wydarzenie(engine: Engine, nazwa: str,
     return res
 
 
-def usun_wydarzenie(engine: Engine, id_wydarzenia: int) -> None:
-    """Delete the row with the given ID from the table of events."""
-    Session = sessionmaker(engine)
-    with Session() as session:
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        session.delete(wyd)
+def _wiersz_wydarzenia(rekord: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a record of dodaj_wydarzenia and return its row."""
+    wiersz = {"nazwa": sprawdz_niepusty(rekord["nazwa"],
+                                        "Nazwa powinna być niepusta."),
+              "data_rozp": sprawdz_date(rekord["data_rozp"]),
+              "godzina_rozp": sprawdz_godzine(rekord["godzina_rozp"]),
+              "data_zak": sprawdz_date(rekord["data_zak"]),
+              "godzina_zak": sprawdz_godzine(rekord["godzina_zak"]),
+              "opis": rekord.get("opis", ""),
+              "miejsce_id": rekord.get("id_miejsca")}
+    sprawdz_kolejnosc(wiersz["data_rozp"], wiersz["godzina_rozp"],
+                      wiersz["data_zak"], wiersz["godzina_zak"])
+    wiersz["poczatek"] = chwila(wiersz["data_rozp"], wiersz["godzina_rozp"])
+    wiersz["koniec"] = chwila(wiersz["data_zak"], wiersz["godzina_zak"])
+    return wiersz
+
+
+def dodaj_wydarzenia(engine: Lacze, rekordy: List[Dict[str, Any]],
+                     scisle: bool = False,
+                     rozmiar: Optional[int] = None) -> WynikWsadu:
+    """Insert many rows into the table of events in one transaction.
+
+    Returns a dictionary with fields:
+    id -- list of IDs of the inserted rows, in the order of rekordy;
+    `None` for records that were rejected.
+    bledy -- list of dictionaries with fields nr (number of the rejected
+    record, counting from 0) and blad (error message).
+
+    Positional arguments:
+    rekordy -- list of dictionaries with the fields nazwa, data_rozp,
+    godzina_rozp, data_zak, godzina_zak and optionally opis and id_miejsca
+    (ID of the event's location).
+
+    Keyword arguments:
+    scisle -- set to `True` iff the whole batch should be rejected,
+    by raising ValueError, if any record is invalid.
+    rozmiar -- number of rows inserted by one statement;
+    rozmiar_paczki if `None`.
+    """
+    wiersze, bledy = _sprawdz_wsad(rekordy, _wiersz_wydarzenia, scisle)
+    ids: List[Optional[int]] = [None] * len(rekordy)
+    with Session(bind=engine) as session:
+        miejsca = {w["miejsce_id"] for _, w in wiersze} - {None}
+        if miejsca:
+            istniejace = set(session.scalars(
+                select(Miejsce.id).where(Miejsce.id.in_(miejsca)))) | {None}
+            for nr, w in wiersze:
+                if w["miejsce_id"] not in istniejace:
+                    _zglos_blad(bledy, nr, NotFoundError.miejsce_msg, scisle)
+            wiersze = [(nr, w) for nr, w in wiersze
+                       if w["miejsce_id"] in istniejace]
+        _dodaj_wiele(session, Wydarzenie, wiersze, ids, rozmiar)
         session.commit()
-        session.close()
+    bledy.sort(key=lambda b: b["nr"])
+    return {"id": ids, "bledy": bledy}
 
 
-def mod_wydarzenie(engine: Engine,
+def _usun(conn: Connection, model: Any, id: int, komunikat: str) -> None:
+    """Delete the row with the given ID from the table of a model
+    by a single DELETE. Throws NotFoundError with the given message
+    if no row with given ID exists."""
+    if conn.execute(delete(model).where(model.id == id)).rowcount == 0:
+        raise NotFoundError(komunikat)
+
+
+def _zmien(conn: Connection, model: Any, id: int, wartosci: Dict[str, Any],
+           komunikat: str, *warunki: Any, zwroc: Sequence[Any] = ()
+           ) -> Optional[Any]:
+    """Update the row with the given ID in the table of a model
+    by a single UPDATE setting the given values, if it satisfies
+    the given SQL conditions, or check that the row exists if there
+    are no values. Throws NotFoundError with the given message if no row
+    with given ID exists.
+
+    Returns the updated row with the ID and the columns zwroc, read
+    by the same statement, or `None` if the row was not updated.
+    """
+    if wartosci:
+        wiersz = conn.execute(update(model).where(model.id == id, *warunki)
+                              .values(**wartosci)
+                              .returning(model.id, *zwroc)).first()
+        if wiersz is not None:
+            return wiersz
+    if conn.scalar(select(model.id).where(model.id == id)) is None:
+        raise NotFoundError(komunikat)
+    return None
+
+
+def usun_wydarzenie(engine: Lacze, id_wydarzenia: int) -> None:
+    """Delete the row with the given ID from the table of events,
+    with its participations, recurrence rule and exceptions, by one
+    DELETE per table. If the event replaced an occurrence of a series,
+    the occurrence stays cancelled.
+    Throws NotFoundError if no row with given ID exists.
+    """
+    with transakcja(engine) as conn:
+        _usun(conn, Wydarzenie, id_wydarzenia, NotFoundError.wydarzenie_msg)
+        conn.execute(delete(uczestnictwa)
+                     .where(uczestnictwa.c.wydarzenie_id == id_wydarzenia))
+        conn.execute(delete(Powtorzenie)
+                     .where(Powtorzenie.wydarzenie_id == id_wydarzenia))
+        conn.execute(delete(wyjatki)
+                     .where(wyjatki.c.wydarzenie_id == id_wydarzenia))
+        conn.execute(update(wyjatki)
+                     .where(wyjatki.c.zastepstwo_id == id_wydarzenia)
+                     .values(zastepstwo_id=None))
+
+
+def _nowa_chwila(kolumna: Any, data: Optional[str],
+                 godzina: Optional[str]) -> Any:
+    """Return an SQL expression: the moment in the column with its date
+    and hour replaced by the given ones that are not `None`, or `None`
+    if both are `None`. Raises ValueError if they are malformed."""
+    if data is None and godzina is None:
+        return None
+    if data is not None and godzina is not None:
+        return literal(chwila(sprawdz_date(data), sprawdz_godzine(godzina)),
+                       Czas)
+    if data is not None:
+        dzien = datetime.date.fromisoformat(sprawdz_date(data)).isoformat()
+        return func.datetime(literal(dzien + " ").concat(func.time(kolumna)))
+    (hh, _, mm) = sprawdz_godzine(str(godzina)).partition(":")
+    return func.datetime(func.date(kolumna).concat(
+        " {0:02d}:{1:02d}:00".format(int(hh), int(mm))))
+
+
+def mod_wydarzenie(engine: Lacze,
                    id_wydarzenia: int, nazwa: Optional[str],
                    data_rozp: Optional[str], godzina_rozp: Optional[str],
                    data_zak: Optional[str], godzina_zak: Optional[str],
@@ -223,66 +1026,593 @@ def mod_wydarzenie(engine: Engine,
     """Modify the row with the given ID in the table of events.
 
     Pass `None` if a field is not to be modified.
-    Throws NotFoundError if no row with given ID exists.
+    The arguments are validated first, and the row is modified by a
+    single UPDATE, which leaves it unchanged if the event would end
+    before it starts -- the fields not given are taken from the row.
+    If the times changed, the end of a series is recomputed
+    -- see Powtorzenie.koniec.
+    Throws NotFoundError if no row with given ID exists
+    and ValueError if the event would end before it starts.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        if wyd is None:
-            raise NotFoundError(NotFoundError.wydarzenie_msg)
-
-        if nazwa is not None:
-            wyd.nazwa = nazwa
-        if data_rozp is not None:
-            wyd.data_rozp = data_rozp
-        if godzina_rozp is not None:
-            wyd.godzina_rozp = godzina_rozp
-        if data_zak is not None:
-            wyd.data_zak = data_zak
-        if godzina_zak is not None:
-            wyd.godzina_zak = godzina_zak
-        if opis is not None:
-            wyd.opis = opis
-
-        session.commit()
-        session.close()
-
-
-def dict_of_wydarzenie(wyd: Wydarzenie) -> AnsDict:
+    wartosci: Dict[str, Any] = {}
+    if nazwa is not None:
+        wartosci["nazwa"] = sprawdz_niepusty(nazwa,
+                                             "Nazwa powinna być niepusta.")
+    poczatek = _nowa_chwila(Wydarzenie.poczatek, data_rozp, godzina_rozp)
+    koniec = _nowa_chwila(Wydarzenie.koniec, data_zak, godzina_zak)
+    for klucz, wartosc in [("data_rozp", data_rozp),
+                           ("godzina_rozp", godzina_rozp),
+                           ("data_zak", data_zak),
+                           ("godzina_zak", godzina_zak),
+                           ("opis", opis)]:
+        if wartosc is not None:
+            wartosci[klucz] = wartosc
+    warunki = []
+    if poczatek is not None or koniec is not None:
+        if poczatek is not None:
+            wartosci["poczatek"] = poczatek
+        else:
+            poczatek = Wydarzenie.poczatek
+        if koniec is not None:
+            wartosci["koniec"] = koniec
+        else:
+            koniec = Wydarzenie.koniec
+        warunki.append(poczatek <= koniec)
+    seria = (select(Powtorzenie.wydarzenie_id)
+             .where(Powtorzenie.wydarzenie_id == Wydarzenie.id).exists())
+    with transakcja(engine) as conn:
+        wiersz = _zmien(conn, Wydarzenie, id_wydarzenia, wartosci,
+                        NotFoundError.wydarzenie_msg, *warunki,
+                        zwroc=[Wydarzenie.poczatek, Wydarzenie.koniec,
+                               seria.label("seria")])
+        if wiersz is None:
+            if wartosci:
+                raise ValueError("Data rozpoczęcia powinna być"
+                                 " nie później od daty zakończenia.")
+            return
+        if warunki and wiersz.seria:
+            regula = conn.execute(
+                select(Powtorzenie.czestotliwosc, Powtorzenie.interwal,
+                       Powtorzenie.liczba, Powtorzenie.do_kiedy)
+                .where(Powtorzenie.wydarzenie_id == id_wydarzenia)).one()
+            conn.execute(update(Powtorzenie)
+                         .where(Powtorzenie.wydarzenie_id == id_wydarzenia)
+                         .values(koniec=_koniec_serii(
+                             wiersz.poczatek, wiersz.koniec, regula)))
+
+
+def dict_of_wydarzenie(wyd: Wydarzenie, zapisy: bool = False) -> AnsDict:
     """Return a dictionary describing an event.
 
     Fields:
     id, nazwa, data_rozp, godzina_rozp,
     data_zak, godzina_zak, opis -- see Wydarzenie.
     nazwa_miejsca -- name of location; `None` if no location is assigned.
+
+    Fields present only if zapisy is set:
+    liczba_uczestnikow, limit_miejsc -- see Wydarzenie.
+    pelne -- whether the number of participants reached the limit.
     """
-    return {"id": wyd.id, "nazwa": wyd.nazwa,
-            "data_rozp": wyd.data_rozp,
-            "data_zak": wyd.data_zak,
-            "godzina_rozp": wyd.godzina_rozp,
-            "godzina_zak": wyd.godzina_zak,
-            "opis": wyd.opis,
-            "nazwa_miejsca": (wyd.miejsce.nazwa if wyd.miejsce is not None
-                              else None)}
+    res: AnsDict = {"id": wyd.id, "nazwa": wyd.nazwa,
+                    "data_rozp": wyd.data_rozp,
+                    "data_zak": wyd.data_zak,
+                    "godzina_rozp": wyd.godzina_rozp,
+                    "godzina_zak": wyd.godzina_zak,
+                    "opis": wyd.opis,
+                    "nazwa_miejsca": (wyd.miejsce.nazwa
+                                      if wyd.miejsce is not None else None)}
+    if zapisy:
+        res.update({"liczba_uczestnikow": wyd.liczba_uczestnikow,
+                    "limit_miejsc": wyd.limit_miejsc,
+                    "pelne": (wyd.limit_miejsc is not None
+                              and wyd.liczba_uczestnikow
+                              >= wyd.limit_miejsc)})
+    return res
 
 
-def znajdz_wydarzenie(engine: Engine, nazwa: str) -> List[AnsDict]:
+def _odczytaj(engine: Lacze, stmt: Any) -> List[AnsDict]:
+    """Execute a Core SELECT and return its rows as dictionaries
+    keyed by the labels of the selected columns."""
+    with polaczenie(engine) as conn:
+        return [dict(row._mapping) for row in conn.execute(stmt)]
+
+
+def stronicuj(stmt: Any, klucz: Any, limit: Optional[int],
+              po_id: Optional[int]) -> Any:
+    """Restrict a SELECT ordered by klucz to one page of results.
+
+    Uses keyset pagination: the page starts right after the row
+    with ID po_id, so fetching it costs the same for every page.
+
+    Positional arguments:
+    klucz -- ID column by which the rows are ordered.
+    limit -- maximum number of rows; `None` if unlimited.
+    po_id -- ID of the last row of the previous page;
+    `None` for the first page.
+    """
+    if po_id is not None:
+        stmt = stmt.where(klucz > po_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+POLA_ZAPISOW = ("liczba_uczestnikow", "limit_miejsc", "pelne")
+"""Fields of dict_of_wydarzenie present only on request."""
+
+
+def _wydarzenia_select(zapisy: bool = False) -> Any:
+    """Return a Core SELECT of the fields of dict_of_wydarzenie,
+    including POLA_ZAPISOW iff zapisy is set.
+
+    Events are joined with their locations in the same statement,
+    so that no query is issued per event. The numbers of participants
+    are read from the events' rows -- see Wydarzenie.liczba_uczestnikow.
+    """
+    w = Wydarzenie.__table__
+    m = Miejsce.__table__
+    stmt = (select(w.c.id, w.c.nazwa,
+                   w.c.data_rozp, w.c.data_zak,
+                   w.c.godzina_rozp, w.c.godzina_zak,
+                   w.c.opis, m.c.nazwa.label("nazwa_miejsca"))
+            .select_from(w.outerjoin(m, w.c.miejsce_id == m.c.id)))
+    if zapisy:
+        stmt = stmt.add_columns(
+            w.c.liczba_uczestnikow, w.c.limit_miejsc,
+            type_coerce(func.coalesce(w.c.liczba_uczestnikow
+                                      >= w.c.limit_miejsc, False),
+                        Boolean).label("pelne"))
+    return stmt
+
+
+def znajdz_wydarzenie(engine: Lacze, nazwa: str,
+                      limit: Optional[int] = None,
+                      po_id: Optional[int] = None,
+                      zapisy: bool = False) -> List[AnsDict]:
     """Find events with the exact given name.
 
-    Returns a list of dictionaries -- see dict_of_wydarzenie.
+    Returns a list of dictionaries -- see dict_of_wydarzenie,
+    ordered by ID.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj.
+    zapisy -- set to `True` iff the results should have the fields
+    POLA_ZAPISOW.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        stmt = select(Wydarzenie).where(Wydarzenie.nazwa == nazwa)
-        res = list(map(dict_of_wydarzenie, session.scalars(stmt)))
-        session.close()
+    stmt = (_wydarzenia_select(zapisy).where(Wydarzenie.nazwa == nazwa)
+            .order_by(Wydarzenie.id))
+    return _odczytaj(engine, stronicuj(stmt, Wydarzenie.id, limit, po_id))
+
+
+def parsuj_chwile(s: str) -> datetime.datetime:
+    """Return the moment given by a string RRRR-MM-DD GG:MM.
+
+    The date and hour can also be separated by "T", and the hour can be
+    omitted, which means midnight. Raises ValueError otherwise.
+    """
+    try:
+        return datetime.datetime.fromisoformat(s)
+    except ValueError:
+        raise ValueError("Niepoprawna data.")
+
+
+def w_przedziale(od: datetime.datetime, do: datetime.datetime) -> Any:
+    """Return an SQL condition: the event overlaps the time range [od, do).
+
+    Events of length zero overlap the range if they start in it.
+    The condition can be answered by scanning the part of the index
+    on Wydarzenie.poczatek between do and od minus the greatest length
+    of an event -- see Metadane.
+    """
+    max_dlugosc = (select(Metadane.wartosc)
+                   .where(Metadane.klucz == "max_dlugosc")
+                   .scalar_subquery())
+    najwczesniej = func.datetime(od.isoformat(" "),
+                                 func.printf("-%d seconds", max_dlugosc))
+    return ((Wydarzenie.poczatek < do)
+            & (Wydarzenie.poczatek >= najwczesniej)
+            & or_(Wydarzenie.koniec > od, Wydarzenie.poczatek >= od))
+
+
+def _zapytania_przedzialu(baza: Any, od: datetime.datetime,
+                          do: datetime.datetime) -> Tuple[Any, Any]:
+    """Return two statements selecting the columns of baza, a select
+    of events, and the moments, rule and exceptions of the events:
+    of the series that may have occurrences in the range [od, do),
+    and of the single events in that range -- see w_przedziale.
+    Their results can be joined by UNION ALL."""
+    serie = (baza
+             .add_columns(Wydarzenie.poczatek, Wydarzenie.koniec,
+                          Powtorzenie.czestotliwosc, Powtorzenie.interwal,
+                          Powtorzenie.liczba, Powtorzenie.do_kiedy,
+                          select(func.group_concat(wyjatki.c.poczatek))
+                          .where(wyjatki.c.wydarzenie_id == Wydarzenie.id,
+                                 wyjatki.c.poczatek < do)
+                          .scalar_subquery().label("wyjatki"))
+             .join(Powtorzenie, Powtorzenie.wydarzenie_id == Wydarzenie.id)
+             .where(Wydarzenie.poczatek < do,
+                    or_(Powtorzenie.koniec.is_(None),
+                        Powtorzenie.koniec > od)))
+    seria = (select(Powtorzenie.wydarzenie_id)
+             .where(Powtorzenie.wydarzenie_id == Wydarzenie.id).exists())
+    pojedyncze = (baza
+                  .add_columns(Wydarzenie.poczatek, Wydarzenie.koniec,
+                               *[literal(None).label(k) for k in
+                                 ("czestotliwosc", "interwal", "liczba",
+                                  "do_kiedy", "wyjatki")])
+                  .where(w_przedziale(od, do), ~seria))
+    return serie, pojedyncze
+
+
+def _pominiete(r: Any) -> Set[datetime.datetime]:
+    """Return the starting moments of the exceptions of a series
+    in a row read by a statement of _zapytania_przedzialu."""
+    return {datetime.datetime.fromisoformat(p)
+            for p in (r.wyjatki or "").split(",") if p}
+
+
+def _zajetosc(conn: Connection, od: datetime.datetime,
+              do: datetime.datetime, *warunki: Any
+              ) -> Iterator[Tuple[datetime.datetime, datetime.datetime,
+                                  int]]:
+    """Return an iterator over the events satisfying the given SQL
+    conditions that overlap the range [od, do), and over the occurrences
+    in that range of such series, as triples (starting moment, ending
+    moment, ID), ordered by the starting moment.
+
+    One statement reads the events; with an index whose columns
+    are compared for equality by warunki, followed by poczatek, only
+    the part of it that w_przedziale bounds is scanned.
+    """
+    serie, pojedyncze = _zapytania_przedzialu(select(Wydarzenie.id), od, do)
+    stmt = serie.where(*warunki).union_all(pojedyncze.where(*warunki))
+    wiersze = conn.execute(stmt.order_by(stmt.selected_columns.poczatek)
+                           ).all()
+    strumienie: List[Iterator[Tuple[datetime.datetime, datetime.datetime,
+                                    int]]] = [
+        iter([(r.poczatek, r.koniec, r.id) for r in wiersze
+              if r.czestotliwosc is None])]
+    for r in wiersze:
+        if r.czestotliwosc is not None:
+            strumienie.append(
+                (p, k, r.id) for p, k in
+                wystapienia(r.poczatek, r.koniec, r.czestotliwosc,
+                            r.interwal, r.liczba, r.do_kiedy, od, do,
+                            _pominiete(r)))
+    return heapq.merge(*strumienie)
+
+
+def znajdz_wydarzenia_w_przedziale(engine: Lacze, od: str, do: str,
+                                   limit: Optional[int] = None,
+                                   po_id: Optional[int] = None,
+                                   po_chwili: Optional[str] = None,
+                                   zapisy: bool = False) -> List[AnsDict]:
+    """Find events that take place, at least partly, in a time range,
+    including the occurrences of series -- see Powtorzenie.
+
+    Returns a list of dictionaries -- see dict_of_wydarzenie,
+    ordered by the starting moment and ID. Occurrences of a series have
+    its ID, and their own dates and hours.
+
+    One statement reads the single events in the range and the series
+    that may have occurrences in it, with their exceptions; only
+    the occurrences in the range are computed -- see wystapienia.
+
+    Positional arguments:
+    od, do -- beginning and end of the range, RRRR-MM-DD GG:MM
+    -- see parsuj_chwile.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj. The page starts right after
+    the event with ID po_id in the order of the results.
+    po_chwili -- starting moment RRRR-MM-DD GG:MM of the last result
+    of the previous page, needed if it was an occurrence of a series;
+    the starting moment of event po_id if `None`.
+    zapisy -- see znajdz_wydarzenie.
+    """
+    od_, do_ = parsuj_chwile(od), parsuj_chwile(do)
+    serie, pojedyncze = _zapytania_przedzialu(_wydarzenia_select(zapisy),
+                                              od_, do_)
+    pojedyncze = pojedyncze.order_by(Wydarzenie.poczatek, Wydarzenie.id)
+    with polaczenie(engine) as conn:
+        po: Optional[Tuple[datetime.datetime, int]] = None
+        if po_id is not None:
+            poprzedni = (parsuj_chwile(po_chwili) if po_chwili is not None
+                         else conn.scalar(select(Wydarzenie.poczatek)
+                                          .where(Wydarzenie.id == po_id)))
+            if poprzedni is not None:
+                po = (poprzedni, po_id)
+                pojedyncze = pojedyncze.where(or_(
+                    Wydarzenie.poczatek > poprzedni,
+                    (Wydarzenie.poczatek == poprzedni)
+                    & (Wydarzenie.id > po_id)))
+        pojedyncze = stronicuj(pojedyncze, Wydarzenie.id, limit, None)
+        stmt = serie.union_all(select(pojedyncze.subquery()))
+        wiersze = conn.execute(stmt.order_by(stmt.selected_columns.poczatek,
+                                             stmt.selected_columns.id)).all()
+    strumienie: List[Iterator[Tuple[datetime.datetime, int, AnsDict]]] = [
+        ((r.poczatek, r.id, _bez_chwil(r)) for r in wiersze
+         if r.czestotliwosc is None)]
+    for r in wiersze:
+        if r.czestotliwosc is not None:
+            strumienie.append(_wystapienia_wiersza(
+                r, od_ if po is None else max(od_, po[0]), do_))
+    res: List[AnsDict] = []
+    for poczatek, id, w in heapq.merge(*strumienie, key=lambda x: x[:2]):
+        if po is not None and (poczatek, id) <= po:
+            continue
+        if limit is not None and len(res) == limit:
+            break
+        res.append(w)
     return res
 
 
-def dodaj_miejsce(engine: Engine, nazwa: str, adres: str) -> int:
+def _bez_chwil(r: Any) -> AnsDict:
+    """Return a row of _wydarzenia_select with extra columns as
+    a dictionary with the fields of dict_of_wydarzenie."""
+    w = r._asdict()
+    return {k: w[k] for k in ("id", "nazwa", "data_rozp", "data_zak",
+                              "godzina_rozp", "godzina_zak", "opis",
+                              "nazwa_miejsca") + POLA_ZAPISOW if k in w}
+
+
+def _wystapienia_wiersza(r: Any, od: datetime.datetime,
+                         do: datetime.datetime
+                         ) -> Iterator[Tuple[datetime.datetime, int,
+                                             AnsDict]]:
+    """Yield the occurrences in the range [od, do) of the series
+    in a row read by znajdz_wydarzenia_w_przedziale, as triples
+    (starting moment, ID, dictionary)."""
+    w = _bez_chwil(r)
+    for poczatek, koniec in wystapienia(r.poczatek, r.koniec,
+                                        r.czestotliwosc, r.interwal,
+                                        r.liczba, r.do_kiedy, od, do,
+                                        _pominiete(r)):
+        yield poczatek, r.id, {**w,
+                               "data_rozp": poczatek.strftime("%Y-%m-%d"),
+                               "godzina_rozp": poczatek.strftime("%H:%M"),
+                               "data_zak": koniec.strftime("%Y-%m-%d"),
+                               "godzina_zak": koniec.strftime("%H:%M")}
+
+
+def _dodaj_miesiace(t: datetime.datetime, n: int) -> datetime.datetime:
+    """Return the moment n months after t. If the day of the month does
+    not exist in that month, its last day is used instead."""
+    rok, miesiac = divmod(t.month - 1 + n, 12)
+    rok += t.year
+    return t.replace(year=rok, month=miesiac + 1,
+                     day=min(t.day, calendar.monthrange(rok,
+                                                        miesiac + 1)[1]))
+
+
+def wystapienia(poczatek: datetime.datetime, koniec: datetime.datetime,
+                czestotliwosc: str, interwal: int,
+                liczba: Optional[int] = None,
+                do_kiedy: Optional[datetime.datetime] = None,
+                od: Optional[datetime.datetime] = None,
+                do: Optional[datetime.datetime] = None,
+                pominiete: Optional[Set[datetime.datetime]] = None
+                ) -> Iterator[Tuple[datetime.datetime, datetime.datetime]]:
+    """Yield the starting and ending moments of the occurrences
+    of a series, in order.
+
+    Occurrences are computed lazily, starting right before the first
+    one that can overlap the range [od, do) -- see w_przedziale,
+    so the cost does not depend on the number of earlier occurrences.
+    The series is infinite if liczba, do_kiedy and do are all `None`.
+
+    Positional arguments:
+    poczatek, koniec -- moments of the first occurrence.
+    czestotliwosc, interwal, liczba, do_kiedy -- see Powtorzenie.
+
+    Keyword arguments:
+    od, do -- range that the occurrences overlap; `None` if unbounded.
+    pominiete -- starting moments of occurrences to skip;
+    `None` if none.
+    """
+    if pominiete is None:
+        pominiete = set()
+    dlugosc = koniec - poczatek
+    k = 0
+    if czestotliwosc == "miesiecznie":
+        def start(k: int) -> datetime.datetime:
+            return _dodaj_miesiace(poczatek, k * interwal)
+        if od is not None:
+            granica = od - dlugosc
+            k = ((granica.year - poczatek.year) * 12 + granica.month
+                 - poczatek.month) // interwal - 1
+    else:
+        krok = datetime.timedelta(
+            days=interwal * (7 if czestotliwosc == "tygodniowo" else 1))
+
+        def start(k: int) -> datetime.datetime:
+            return poczatek + k * krok
+        if od is not None:
+            k = (od - dlugosc - poczatek) // krok
+    k = max(k, 0)
+    while liczba is None or k < liczba:
+        s = start(k)
+        if ((do_kiedy is not None and s > do_kiedy)
+                or (do is not None and s >= do)):
+            return
+        e = s + dlugosc
+        if (od is None or e > od or s >= od) and s not in pominiete:
+            yield s, e
+        k += 1
+
+
+def _koniec_serii(poczatek: datetime.datetime, koniec: datetime.datetime,
+                  regula: Any) -> Optional[datetime.datetime]:
+    """Return the ending moment of the last occurrence of a series
+    whose first occurrence has the given moments, or `None` if it is
+    infinite -- see Powtorzenie.koniec. regula has the fields
+    of the series' rule."""
+    if regula.liczba is None and regula.do_kiedy is None:
+        return None
+    ostatnie = deque(wystapienia(poczatek, koniec, regula.czestotliwosc,
+                                 regula.interwal, regula.liczba,
+                                 regula.do_kiedy), maxlen=1)
+    return ostatnie[0][1] if ostatnie else koniec
+
+
+def _sprawdz_regule(poczatek: datetime.datetime, czestotliwosc: str,
+                    interwal: int, liczba: Optional[int],
+                    do: Optional[str]) -> Optional[datetime.datetime]:
+    """Validate the rule of a series starting at the given moment
+    -- see ustaw_powtarzanie, and return its moment do_kiedy
+    -- see Powtorzenie. Throws ValueError if the rule is invalid."""
+    if czestotliwosc not in CZESTOTLIWOSCI:
+        raise ValueError("Niepoprawna częstotliwość.")
+    if (not isinstance(interwal, int) or interwal < 1
+            or (liczba is not None
+                and (not isinstance(liczba, int) or liczba < 1))):
+        raise ValueError("Liczba powtórzeń i odstęp między nimi"
+                         " powinny być dodatnie.")
+    do_kiedy = parsuj_chwile(do) if do is not None else None
+    if do_kiedy is not None and do_kiedy < poczatek:
+        raise ValueError("Seria powinna kończyć się"
+                         " nie wcześniej niż się zaczyna.")
+    return do_kiedy
+
+
+def ustaw_powtarzanie(engine: Lacze, id_wydarzenia: int,
+                      czestotliwosc: str, interwal: int = 1,
+                      liczba: Optional[int] = None,
+                      do: Optional[str] = None) -> None:
+    """Make an event a series, or change the rule of a series
+    -- see Powtorzenie. The event describes its first occurrence.
+
+    Throws NotFoundError if no event with the given ID exists,
+    and ValueError if the rule is invalid.
+
+    Positional arguments:
+    czestotliwosc -- one of CZESTOTLIWOSCI.
+
+    Keyword arguments:
+    interwal -- number of days, weeks or months between occurrences.
+    liczba -- number of occurrences; `None` if not limited.
+    do -- moment RRRR-MM-DD GG:MM after which no occurrence starts
+    -- see parsuj_chwile; `None` if not limited.
+    """
+    with Session(bind=engine) as session:
+        wyd = session.get(Wydarzenie, id_wydarzenia)
+        if wyd is None:
+            raise NotFoundError(NotFoundError.wydarzenie_msg)
+        poczatek = chwila(wyd.data_rozp, wyd.godzina_rozp)
+        do_kiedy = _sprawdz_regule(poczatek, czestotliwosc, interwal,
+                                   liczba, do)
+        regula = Powtorzenie(wydarzenie_id=id_wydarzenia,
+                             czestotliwosc=czestotliwosc, interwal=interwal,
+                             liczba=liczba, do_kiedy=do_kiedy)
+        regula.koniec = _koniec_serii(
+            poczatek, chwila(wyd.data_zak, wyd.godzina_zak), regula)
+        session.merge(regula)
+        session.commit()
+
+
+def _wystapienie(session: Any, id_wydarzenia: int,
+                 poczatek: str) -> Tuple[Wydarzenie, datetime.datetime,
+                                         datetime.datetime,
+                                         Optional[Tuple[Optional[int]]]]:
+    """Find an occurrence of a series given its starting moment
+    RRRR-MM-DD GG:MM. Returns the series, the moments
+    of the occurrence, and the row of its exception, if any.
+
+    Throws NotFoundError if there is no such occurrence.
+    """
+    s = parsuj_chwile(poczatek)
+    wyd = session.get(Wydarzenie, id_wydarzenia)
+    regula = session.get(Powtorzenie, id_wydarzenia)
+    if wyd is None or regula is None:
+        raise NotFoundError(NotFoundError.wystapienie_msg)
+    for p, k in wystapienia(wyd.poczatek, wyd.koniec, regula.czestotliwosc,
+                            regula.interwal, regula.liczba,
+                            regula.do_kiedy, s,
+                            s + datetime.timedelta(seconds=1)):
+        if p == s:
+            wyjatek = session.execute(
+                select(wyjatki.c.zastepstwo_id)
+                .where(wyjatki.c.wydarzenie_id == id_wydarzenia,
+                       wyjatki.c.poczatek == s)).first()
+            return wyd, p, k, wyjatek
+    raise NotFoundError(NotFoundError.wystapienie_msg)
+
+
+def odwolaj_wystapienie(engine: Lacze, id_wydarzenia: int,
+                        poczatek: str) -> None:
+    """Cancel the occurrence of a series that starts at the given moment
+    RRRR-MM-DD GG:MM -- see wyjatki. If the occurrence was replaced
+    by an event -- see mod_wystapienie, that event is left unchanged.
+
+    Throws NotFoundError if there is no such occurrence.
+    """
+    with Session(bind=engine) as session:
+        _, s, _, wyjatek = _wystapienie(session, id_wydarzenia, poczatek)
+        if wyjatek is None:
+            session.execute(insert(wyjatki).values(
+                wydarzenie_id=id_wydarzenia, poczatek=s))
+        session.commit()
+
+
+def mod_wystapienie(engine: Lacze, id_wydarzenia: int, poczatek: str,
+                    nazwa: Optional[str], data_rozp: Optional[str],
+                    godzina_rozp: Optional[str], data_zak: Optional[str],
+                    godzina_zak: Optional[str],
+                    opis: Optional[str]) -> int:
+    """Modify one occurrence of a series: the one that starts
+    at the given moment RRRR-MM-DD GG:MM.
+
+    The first time, the occurrence is replaced by a new event
+    with the fields of the series and of the occurrence, the same
+    location and participants -- see wyjatki; the series itself
+    is not changed. Later modifications change that event.
+    Returns its ID.
+    Pass `None` if a field is not to be modified.
+    Throws NotFoundError if there is no such occurrence, or it was
+    cancelled.
+    """
+    with Session(bind=engine) as session:
+        wyd, s, k, wyjatek = _wystapienie(session, id_wydarzenia, poczatek)
+        if wyjatek is not None:
+            if wyjatek[0] is None:
+                raise NotFoundError(NotFoundError.wystapienie_msg)
+            zastepstwo: int = wyjatek[0]
+            session.close()
+            mod_wydarzenie(engine, zastepstwo, nazwa, data_rozp,
+                           godzina_rozp, data_zak, godzina_zak, opis)
+            return zastepstwo
+        nowe = Wydarzenie(
+            nazwa=wyd.nazwa if nazwa is None else nazwa,
+            data_rozp=s.strftime("%Y-%m-%d") if data_rozp is None
+            else data_rozp,
+            godzina_rozp=s.strftime("%H:%M") if godzina_rozp is None
+            else godzina_rozp,
+            data_zak=k.strftime("%Y-%m-%d") if data_zak is None
+            else data_zak,
+            godzina_zak=k.strftime("%H:%M") if godzina_zak is None
+            else godzina_zak,
+            opis=wyd.opis if opis is None else opis,
+            miejsce_id=wyd.miejsce_id)
+        session.add(nowe)
+        session.flush()
+        zastepstwo = nowe.id
+        session.execute(insert(uczestnictwa).from_select(
+            ["osoba_id", "wydarzenie_id"],
+            select(uczestnictwa.c.osoba_id, literal(zastepstwo))
+            .where(uczestnictwa.c.wydarzenie_id == id_wydarzenia)))
+        # Set after copying the participants, who may outnumber it
+        # -- see ustaw_limit_miejsc.
+        nowe.limit_miejsc = wyd.limit_miejsc
+        session.execute(insert(wyjatki).values(
+            wydarzenie_id=id_wydarzenia, poczatek=s,
+            zastepstwo_id=zastepstwo))
+        session.commit()
+    return zastepstwo
+
+
+def dodaj_miejsce(engine: Lacze, nazwa: str, adres: str) -> int:
     """Insert row with given field values into the table of locations."""
-    Session = sessionmaker(engine)
-    with Session() as session:
+    with Session(bind=engine) as session:
         msc = Miejsce(nazwa=nazwa, adres=adres)
         session.add(msc)
         session.commit()
@@ -291,33 +1621,65 @@ def dodaj_miejsce(engine: Engine, nazwa: str, adres: str) -> int:
     return res
 
 
-def usun_miejsce(engine: Engine, id_miejsca: int) -> None:
-    """Delete the row with the given ID from the table of locations."""
-    Session = sessionmaker(engine)
-    with Session() as session:
-        msc = session.get(Miejsce, id_miejsca)
-        session.delete(msc)
+def _wiersz_miejsca(rekord: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a record of dodaj_miejsca and return its row."""
+    adres = rekord.get("adres")
+    if adres is not None:
+        sprawdz_niepusty(adres, "Adres powinien być niepusty.")
+    return {"nazwa": sprawdz_niepusty(rekord["nazwa"],
+                                      "Nazwa powinna być niepusta."),
+            "adres": adres}
+
+
+def dodaj_miejsca(engine: Lacze, rekordy: List[Dict[str, Any]],
+                  scisle: bool = False,
+                  rozmiar: Optional[int] = None) -> WynikWsadu:
+    """Insert many rows into the table of locations in one transaction.
+
+    Returns a dictionary -- see dodaj_wydarzenia.
+
+    Positional arguments:
+    rekordy -- list of dictionaries with the field nazwa
+    and optionally adres.
+
+    Keyword arguments: see dodaj_wydarzenia.
+    """
+    wiersze, bledy = _sprawdz_wsad(rekordy, _wiersz_miejsca, scisle)
+    ids: List[Optional[int]] = [None] * len(rekordy)
+    with Session(bind=engine) as session:
+        _dodaj_wiele(session, Miejsce, wiersze, ids, rozmiar)
         session.commit()
-        session.close()
+    return {"id": ids, "bledy": bledy}
+
+
+def usun_miejsce(engine: Lacze, id_miejsca: int) -> None:
+    """Delete the row with the given ID from the table of locations
+    by a single DELETE, and remove the location from its events.
+    Throws NotFoundError if no row with given ID exists."""
+    with transakcja(engine) as conn:
+        _usun(conn, Miejsce, id_miejsca, NotFoundError.miejsce_msg)
+        conn.execute(update(Wydarzenie)
+                     .where(Wydarzenie.miejsce_id == id_miejsca)
+                     .values(miejsce_id=None))
 
 
-def mod_miejsce(engine: Engine, id_miejsca: int,
+def mod_miejsce(engine: Lacze, id_miejsca: int,
                 nazwa: Optional[str], adres: Optional[str]) -> None:
-    """Modify the row with the given ID in the table of locations.
+    """Modify the row with the given ID in the table of locations
+    by a single UPDATE, after validating the arguments.
 
     Pass `None` if a field is not to be modified.
+    Throws NotFoundError if no row with given ID exists.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        msc = session.get(Miejsce, id_miejsca)
-        if msc is None:
-            raise NotFoundError(NotFoundError.miejsce_msg)
-        if nazwa is not None:
-            msc.nazwa = nazwa
-        if adres is not None:
-            msc.adres = adres
-        session.commit()
-        session.close()
+    wartosci: Dict[str, Any] = {}
+    if nazwa is not None:
+        wartosci["nazwa"] = sprawdz_niepusty(nazwa,
+                                             "Nazwa powinna być niepusta.")
+    if adres is not None:
+        wartosci["adres"] = sprawdz_niepusty(adres,
+                                             "Adres powinien być niepusty.")
+    with transakcja(engine) as conn:
+        _zmien(conn, Miejsce, id_miejsca, wartosci, NotFoundError.miejsce_msg)
 
 
 def dict_of_miejsce(msc: Miejsce) -> AnsDict:
@@ -329,117 +1691,327 @@ def dict_of_miejsce(msc: Miejsce) -> AnsDict:
     return {"id": msc.id, "nazwa": msc.nazwa, "adres": msc.adres}
 
 
-def znajdz_miejsce(engine: Engine, nazwa_miejsca: str) -> List[AnsDict]:
+def znajdz_miejsce(engine: Lacze, nazwa_miejsca: str,
+                   limit: Optional[int] = None,
+                   po_id: Optional[int] = None) -> List[AnsDict]:
     """Find locations with the exact given name.
 
-    Returns a list of dictionaries -- see dict_of_miejsce.
+    Returns a list of dictionaries -- see dict_of_miejsce,
+    ordered by ID.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        stmt = select(Miejsce).where(Miejsce.nazwa == nazwa_miejsca)
-        res = list(map(dict_of_miejsce, session.scalars(stmt)))
-        session.close()
-    return res
+    stmt = (select(Miejsce.id, Miejsce.nazwa, Miejsce.adres)
+            .where(Miejsce.nazwa == nazwa_miejsca).order_by(Miejsce.id))
+    return _odczytaj(engine, stronicuj(stmt, Miejsce.id, limit, po_id))
+
+
+_MINUTA = datetime.timedelta(minutes=1)
+
+
+def _koniec_dodatni(poczatek: datetime.datetime,
+                    koniec: datetime.datetime) -> datetime.datetime:
+    """Return the ending moment of an event, moved one minute after
+    the start if the event has length zero, so that it overlaps the
+    events that contain its starting moment -- see w_przedziale."""
+    return max(koniec, poczatek + _MINUTA)
 
 
-def dodaj_miejsce_do_wydarzenia(engine: Engine, id_miejsca: int,
-                                id_wydarzenia: int) -> None:
+def _nakladajace(
+        a: Iterable[Tuple[datetime.datetime, datetime.datetime, int]],
+        b: Iterable[Tuple[datetime.datetime, datetime.datetime, int]]
+) -> Iterator[Tuple[datetime.datetime, datetime.datetime, int]]:
+    """Yield, once each, the events of b that overlap some event of a.
+
+    Both are iterables of triples (starting moment, ending moment, ID)
+    ordered by the starting moment -- see _zajetosc. They are read once,
+    keeping only the events of b that started but did not end before
+    the current event of a.
+    """
+    b = iter(b)
+    nastepne = next(b, None)
+    trwajace: List[Tuple[datetime.datetime,
+                         Tuple[datetime.datetime, datetime.datetime,
+                               int]]] = []
+    zgloszone = set()
+    for poczatek, koniec, _ in a:
+        koniec = _koniec_dodatni(poczatek, koniec)
+        while nastepne is not None and nastepne[0] < koniec:
+            heapq.heappush(trwajace, (_koniec_dodatni(*nastepne[:2]),
+                                      nastepne))
+            nastepne = next(b, None)
+        while trwajace and trwajace[0][0] <= poczatek:
+            heapq.heappop(trwajace)
+        for _, w in sorted(trwajace, key=lambda t: t[1]):
+            if w not in zgloszone:
+                zgloszone.add(w)
+                yield w
+
+
+def _luki(zajete: Iterable[Tuple[datetime.datetime, datetime.datetime,
+                                 int]],
+          od: datetime.datetime, do: datetime.datetime,
+          min_dlugosc: datetime.timedelta
+          ) -> Iterator[Tuple[datetime.datetime, datetime.datetime]]:
+    """Yield the ranges in [od, do) not covered by the events, triples
+    ordered by the starting moment -- see _zajetosc, that are at least
+    min_dlugosc long, as pairs (starting moment, ending moment)."""
+    wolne_od = od
+    for poczatek, koniec, _ in zajete:
+        if poczatek >= do:
+            break
+        if poczatek > wolne_od and poczatek - wolne_od >= min_dlugosc:
+            yield wolne_od, poczatek
+        wolne_od = max(wolne_od, koniec)
+    if do > wolne_od and do - wolne_od >= min_dlugosc:
+        yield wolne_od, do
+
+
+def _tekst_chwili(t: datetime.datetime) -> str:
+    """Return a moment as a string RRRR-MM-DD GG:MM -- see parsuj_chwile.
+    """
+    return t.strftime("%Y-%m-%d %H:%M")
+
+
+def _kolizje_miejsca(conn: Connection, wyd: Any, id_miejsca: int
+                     ) -> Iterator[AnsDict]:
+    """Yield the events in a location that overlap an event, or its
+    occurrences if it is a series, as dictionaries with keys id, od
+    and do -- the moments of the event or occurrence in the location.
+    wyd has the fields id, poczatek and koniec of Wydarzenie.
+    See horyzont_konfliktow. Events whose moments are unknown, having
+    been left unparsed by _migracja_chwile, overlap nothing."""
+    od, do = wyd.poczatek, wyd.koniec
+    if od is None or do is None:
+        return
+    seria = conn.execute(select(Powtorzenie.koniec)
+                         .where(Powtorzenie.wydarzenie_id == wyd.id)).first()
+    if seria is not None and seria.koniec is None:
+        do = max(od, datetime.datetime.now()) + horyzont_konfliktow
+    elif seria is not None:
+        do = seria.koniec
+    do = _koniec_dodatni(od, do)
+    wlasne = _zajetosc(conn, od, do, Wydarzenie.id == wyd.id)
+    zajete = _zajetosc(conn, od, do, Wydarzenie.miejsce_id == id_miejsca,
+                       Wydarzenie.id != wyd.id)
+    for poczatek, koniec, id in _nakladajace(wlasne, zajete):
+        yield {"id": id, "od": _tekst_chwili(poczatek),
+               "do": _tekst_chwili(koniec)}
+
+
+def dodaj_miejsce_do_wydarzenia(engine: Lacze, id_miejsca: int,
+                                id_wydarzenia: int,
+                                konflikty: Optional[str] = None
+                                ) -> List[AnsDict]:
     """Assign a location to an event.
 
-    Modifies the row of the event by updating miejsce_id and miejsce.
+    Updates miejsce_id of the event's row first, and then, unless
+    konflikty is "pozwol", looks for the events in the location that
+    overlap the event, or its occurrences if it is a series -- see
+    horyzont_konfliktow, by one indexed query and one pass over them,
+    in the same write transaction, rolled back if the location is
+    rejected. So two callers cannot both find the location free
+    and book it.
+
+    Returns the list of the conflicting events or occurrences, if
+    konflikty is "ostrzez", as dictionaries with keys id, od and do,
+    ordered by the starting moment; an empty list otherwise.
 
     Positional arguments:
     id_miejsca -- the location's ID.
     id_wydarzenia -- the event's ID.
+
+    Keyword arguments:
+    konflikty -- what to do if the location is taken -- see KONFLIKTY;
+    default konflikty_miejsc.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        msc = session.get(Miejsce, id_miejsca)
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        if wyd is None:
-            raise NotFoundError(NotFoundError.wydarzenie_msg)
-        if msc is None:
+    tryb = konflikty or konflikty_miejsc
+    if tryb not in KONFLIKTY:
+        raise ValueError("Nieznany tryb konfliktów: " + tryb)
+    with transakcja(engine) as conn:
+        wyd = _zmien(conn, Wydarzenie, id_wydarzenia,
+                     {"miejsce_id": id_miejsca},
+                     NotFoundError.wydarzenie_msg,
+                     zwroc=[Wydarzenie.poczatek, Wydarzenie.koniec])
+        if conn.scalar(select(Miejsce.id)
+                       .where(Miejsce.id == id_miejsca)) is None:
             raise NotFoundError(NotFoundError.miejsce_msg)
-        wyd.miejsce_id = id_miejsca
-        wyd.miejsce = msc
-        session.commit()
-        session.close()
-
-
-def usun_miejsce_z_wydarzenia(engine: Engine, id_wydarzenia: int) -> None:
+        kolizje: List[AnsDict] = []
+        if tryb != "pozwol":
+            kolizje = list(itertools.islice(
+                _kolizje_miejsca(conn, wyd, id_miejsca),
+                1 if tryb == "odrzuc" else None))
+        if kolizje and tryb == "odrzuc":
+            raise ConflictError(
+                ConflictError.miejsce_msg
+                + " Koliduje z wydarzeniem nr {id} od {od} do {do}."
+                .format(**kolizje[0]))
+    return kolizje
+
+
+def usun_miejsce_z_wydarzenia(engine: Lacze, id_wydarzenia: int) -> None:
     """Removes a location from an event.
 
-    Updates the event row's miejsce and miejsce_id fields to null.
+    Sets the event row's miejsce_id field to null with a single UPDATE.
+    Throws NotFoundError if no event with given ID exists.
 
     Positional arguments:
     id_wydarzenia -- the event's ID.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        if wyd is None:
-            raise NotFoundError(NotFoundError.wydarzenie_msg)
-        wyd.miejsce_id = None
-        wyd.miejsce = None
-        session.commit()
-        session.close()
+    with transakcja(engine) as conn:
+        _zmien(conn, Wydarzenie, id_wydarzenia, {"miejsce_id": None},
+               NotFoundError.wydarzenie_msg)
 
 
-def znajdz_wydarzenia_w_miejscu(engine: Engine,
-                                nazwa_miejsca: str) -> List[AnsDict]:
+def znajdz_wydarzenia_w_miejscu(engine: Lacze, nazwa_miejsca: str,
+                                limit: Optional[int] = None,
+                                po_id: Optional[int] = None,
+                                zapisy: bool = False) -> List[AnsDict]:
     """Return events that take place in locations with the given name.
 
-    Returns a list of dictionaries -- see dict_of_wydarzenie.
+    Returns a list of dictionaries -- see dict_of_wydarzenie,
+    ordered by ID.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj.
+    zapisy -- see znajdz_wydarzenie.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        stmt = ((select(Wydarzenie)
-                 .join(Wydarzenie.miejsce))
-                .where(Miejsce.nazwa == nazwa_miejsca))
-        res = list(map(dict_of_wydarzenie, session.scalars(stmt)))
-        session.close()
-    return res
+    stmt = (_wydarzenia_select(zapisy)
+            .where(Miejsce.nazwa == nazwa_miejsca)
+            .order_by(Wydarzenie.id))
+    return _odczytaj(engine, stronicuj(stmt, Wydarzenie.id, limit, po_id))
+
+
+def wolne_terminy(engine: Lacze, id_miejsca: int, od: str, do: str,
+                  min_dlugosc: int = 0) -> List[Dict[str, str]]:
+    """Return the ranges of time in [od, do) when a location is free.
+
+    Reads the events in the location that overlap the range, and the
+    occurrences of its series, by one indexed query -- see _zajetosc,
+    and returns the gaps between them, found in one pass.
 
+    Returns a list of dictionaries with keys od and do -- moments
+    in the format of parsuj_chwile, ordered by the starting moment.
 
-def dodaj_osoba(engine: Engine, imie: str, email: str) -> int:
-    """Insert row with the given field values into the table of people."""
-    Session = sessionmaker(engine)
-    with Session() as session:
+    Positional arguments:
+    id_miejsca -- the location's ID.
+    od, do -- moments in the format of parsuj_chwile.
+
+    Keyword arguments:
+    min_dlugosc -- the least length of a returned range, in minutes.
+    """
+    od_, do_ = parsuj_chwile(od), parsuj_chwile(do)
+    if min_dlugosc < 0:
+        raise ValueError("Niepoprawna długość.")
+    with polaczenie(engine) as conn:
+        if conn.scalar(select(Miejsce.id)
+                       .where(Miejsce.id == id_miejsca)) is None:
+            raise NotFoundError(NotFoundError.miejsce_msg)
+        zajete = _zajetosc(conn, od_, do_, Wydarzenie.miejsce_id == id_miejsca)
+        return [{"od": _tekst_chwili(p), "do": _tekst_chwili(k)}
+                for p, k in _luki(zajete, od_, do_,
+                                  datetime.timedelta(minutes=min_dlugosc))]
+
+
+def dodaj_osoba(engine: Lacze, imie: str, email: str) -> int:
+    """Insert row with the given field values into the table of people.
+
+    Throws DuplicateError if the email address is already taken.
+    """
+    with Session(bind=engine) as session:
         osoba = Osoba(imie=imie, email=email)
         session.add(osoba)
-        session.commit()
+        _zatwierdz_osobe(session)
         res = osoba.id
         session.close()
     return res
 
 
-def usun_osoba(engine: Engine, id_osoby: int) -> None:
-    """Delete the row with the given ID from the table of peoble."""
-    Session = sessionmaker(engine)
-    with Session() as session:
-        os = session.get(Osoba, id_osoby)
-        session.delete(os)
+def _zatwierdz_osobe(session: Any) -> None:
+    """Commit a session that writes a row of the table of people.
+
+    Throws DuplicateError if the email address is already taken.
+    """
+    try:
         session.commit()
-        session.close()
+    except IntegrityError:
+        raise DuplicateError(DuplicateError.email_msg)
+
 
+def _wiersz_osoby(rekord: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a record of dodaj_osoby and return its row."""
+    return {"imie": sprawdz_niepusty(rekord["imie"],
+                                     "Imię powinno być niepuste."),
+            "email": sprawdz_email(rekord["email"])}
 
-def mod_osoba(engine: Engine, id_osoby: int,
+
+def dodaj_osoby(engine: Lacze, rekordy: List[Dict[str, Any]],
+                scisle: bool = False,
+                rozmiar: Optional[int] = None) -> WynikWsadu:
+    """Insert many rows into the table of people in one transaction.
+
+    Returns a dictionary -- see dodaj_wydarzenia.
+
+    Records whose email address is already taken, by an existing person
+    or by an earlier record, are rejected.
+
+    Positional arguments:
+    rekordy -- list of dictionaries with the fields imie and email.
+
+    Keyword arguments: see dodaj_wydarzenia.
+    """
+    wiersze, bledy = _sprawdz_wsad(rekordy, _wiersz_osoby, scisle)
+    ids: List[Optional[int]] = [None] * len(rekordy)
+    with Session(bind=engine) as session:
+        zajete: Set[str] = set()
+        for paczka in _paczki(wiersze, rozmiar):
+            zajete.update(session.scalars(
+                select(Osoba.email)
+                .where(Osoba.email.in_({w["email"] for _, w in paczka}))))
+            nowe = []
+            for nr, w in paczka:
+                if w["email"] in zajete:
+                    _zglos_blad(bledy, nr, DuplicateError.email_msg, scisle)
+                else:
+                    zajete.add(w["email"])
+                    nowe.append((nr, w))
+            _dodaj_wiele(session, Osoba, nowe, ids, rozmiar)
+        session.commit()
+    bledy.sort(key=lambda b: b["nr"])
+    return {"id": ids, "bledy": bledy}
+
+
+def usun_osoba(engine: Lacze, id_osoby: int) -> None:
+    """Delete the row with the given ID from the table of people,
+    with its participations, by one DELETE per table.
+    Throws NotFoundError if no row with given ID exists."""
+    with transakcja(engine) as conn:
+        _usun(conn, Osoba, id_osoby, NotFoundError.osoba_msg)
+        conn.execute(delete(uczestnictwa)
+                     .where(uczestnictwa.c.osoba_id == id_osoby))
+
+
+def mod_osoba(engine: Lacze, id_osoby: int,
               imie: Optional[str], email: Optional[str]) -> None:
-    """Modify the row with the given ID in the table of people.
+    """Modify the row with the given ID in the table of people
+    by a single UPDATE, after validating the arguments.
 
     Pass `None` if a field is not to be modified.
+    Throws NotFoundError if no row with given ID exists
+    and DuplicateError if the email address is already taken.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        os = session.get(Osoba, id_osoby)
-        if os is None:
-            raise NotFoundError(NotFoundError.osoba_msg)
-        if imie is not None:
-            os.imie = imie
-        if email is not None:
-            os.email = email
-        session.commit()
-        session.close()
+    wartosci: Dict[str, Any] = {}
+    if imie is not None:
+        wartosci["imie"] = sprawdz_niepusty(imie,
+                                            "Imię powinno być niepuste.")
+    if email is not None:
+        wartosci["email"] = sprawdz_email(email)
+    with transakcja(engine) as conn:
+        try:
+            _zmien(conn, Osoba, id_osoby, wartosci, NotFoundError.osoba_msg)
+        except IntegrityError:
+            raise DuplicateError(DuplicateError.email_msg)
 
 
 def dict_of_osoba(os: Osoba) -> AnsDict:
@@ -451,101 +2023,675 @@ def dict_of_osoba(os: Osoba) -> AnsDict:
     return {"id": os.id, "imie": os.imie, "email": os.email}
 
 
-def znajdz_osoba(engine: Engine, imie: str) -> List[AnsDict]:
+def znajdz_osoba(engine: Lacze, imie: str,
+                 limit: Optional[int] = None,
+                 po_id: Optional[int] = None) -> List[AnsDict]:
     """Find people with the exact given name.
 
-    Returns a list of dictionaries -- see dict_of_osoba.
+    Returns a list of dictionaries -- see dict_of_osoba, ordered by ID.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        oss = session.scalars(select(Osoba).where(Osoba.imie == imie))
-        res = list(map(dict_of_osoba, oss))
-        session.close()
-    return res
+    stmt = (select(Osoba.id, Osoba.imie, Osoba.email)
+            .where(Osoba.imie == imie).order_by(Osoba.id))
+    return _odczytaj(engine, stronicuj(stmt, Osoba.id, limit, po_id))
+
+
+def ustaw_limit_miejsc(engine: Lacze, id_wydarzenia: int,
+                       limit: Optional[int]) -> None:
+    """Set the greatest number of participants of an event.
+
+    Updates the event's row with a single UPDATE. People already signed
+    up stay signed up even if there are more of them than the limit.
+    Throws NotFoundError if no event with given ID exists.
+
+    Positional arguments:
+    id_wydarzenia -- the event's ID.
+    limit -- the limit; `None` removes it.
+    """
+    if limit is not None and limit < 0:
+        raise ValueError("Niepoprawny limit miejsc.")
+    with transakcja(engine) as conn:
+        if conn.execute(update(Wydarzenie)
+                        .where(Wydarzenie.id == id_wydarzenia)
+                        .values(limit_miejsc=limit)).rowcount == 0:
+            raise NotFoundError(NotFoundError.wydarzenie_msg)
 
 
-def zapisz(engine: Engine, email: str, id_wydarzenia: int) -> None:
+def zapisz(engine: Lacze, email: str, id_wydarzenia: int) -> None:
     """Sign a person up for an event.
 
-    Inserts a row into the table of participations (see uczestnictwa).
-    Modifies the person row's wydarzenia field,
-    and the event row's uczestnicy field.
-    Assumes that the people's email addresses are unique.
+    Inserts a row into the table of participations (see uczestnictwa)
+    with a single INSERT ... SELECT that resolves the email address,
+    so the cost does not depend on the number of participants.
+    The same statement checks the limit of participants, so that
+    concurrent sign-ups cannot exceed it -- see Wydarzenie.limit_miejsc.
+    People's email addresses are unique -- see Osoba.
+    Throws NoResultFound if no person has the email address,
+    NotFoundError if no event with given ID exists,
+    CapacityError if the event is full
+    and IntegrityError if the person is already signed up.
 
     Positional arguments:
     email -- email address used to query the table of people.
     id_wydarzenia -- the event's ID.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        os = session.scalars(select(Osoba).where(Osoba.email == email)).one()
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        if wyd is None:
-            raise NotFoundError(NotFoundError.wydarzenie_msg)
-        wyd.uczestnicy.append(os)
+    stmt = insert(uczestnictwa).from_select(
+        ["osoba_id", "wydarzenie_id"],
+        select(Osoba.id, literal(id_wydarzenia))
+        .where(Osoba.email == email,
+               select(Wydarzenie.id)
+               .where(Wydarzenie.id == id_wydarzenia,
+                      or_(Wydarzenie.limit_miejsc.is_(None),
+                          Wydarzenie.liczba_uczestnikow
+                          < Wydarzenie.limit_miejsc)).exists()))
+    with transakcja(engine) as conn:
+        if conn.execute(stmt).rowcount == 0:
+            _sprawdz_uczestnictwo(conn, email, id_wydarzenia)
+            raise CapacityError(CapacityError.wydarzenie_msg)
+
+
+def _wiersz_zapisu(rekord: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a record of zapisz_wiele and return it."""
+    return {"email": sprawdz_email(rekord["email"]),
+            "id_wydarzenia": int(rekord["id_wydarzenia"])}
+
+
+def zapisz_wiele(engine: Lacze, rekordy: List[Dict[str, Any]],
+                 scisle: bool = False,
+                 rozmiar: Optional[int] = None) -> WynikWsadu:
+    """Sign many people up for events in one transaction.
+
+    Returns a dictionary -- see dodaj_wydarzenia; field id holds the IDs
+    of the people that were signed up.
+    People's email addresses are unique -- see Osoba.
+
+    Positional arguments:
+    rekordy -- list of dictionaries with the fields email
+    and id_wydarzenia (the event's ID).
+
+    Keyword arguments: see dodaj_wydarzenia.
+    """
+    wiersze, bledy = _sprawdz_wsad(rekordy, _wiersz_zapisu, scisle)
+    ids: List[Optional[int]] = [None] * len(rekordy)
+    with Session(bind=engine) as session:
+        for paczka in _paczki(wiersze, rozmiar):
+            emaile = {w["email"] for _, w in paczka}
+            osoby = {r.email: r.id for r in session.execute(
+                select(Osoba.email, Osoba.id)
+                .where(Osoba.email.in_(emaile)))}
+            wolne: Dict[int, Optional[int]] = {
+                r.id: (None if r.limit_miejsc is None
+                       else r.limit_miejsc - r.liczba_uczestnikow)
+                for r in session.execute(
+                    select(Wydarzenie.id, Wydarzenie.limit_miejsc,
+                           Wydarzenie.liczba_uczestnikow)
+                    .where(Wydarzenie.id.in_({w["id_wydarzenia"]
+                                              for _, w in paczka})))}
+            pary = {(osoby[w["email"]], w["id_wydarzenia"])
+                    for _, w in paczka if w["email"] in osoby}
+            zapisani = {(r.osoba_id, r.wydarzenie_id)
+                        for r in session.execute(
+                            select(uczestnictwa)
+                            .where(tuple_(uczestnictwa.c.osoba_id,
+                                          uczestnictwa.c.wydarzenie_id)
+                                   .in_(pary)))} if pary else set()
+            nowe = []
+            for nr, w in paczka:
+                para = (osoby.get(w["email"]), w["id_wydarzenia"])
+                zostalo = wolne.get(para[1])
+                if para[0] is None:
+                    _zglos_blad(bledy, nr, NotFoundError.osoba_msg, scisle)
+                elif para[1] not in wolne:
+                    _zglos_blad(bledy, nr, NotFoundError.wydarzenie_msg,
+                                scisle)
+                elif para in zapisani:
+                    _zglos_blad(bledy, nr, "Osoba jest już zapisana"
+                                " na wydarzenie.", scisle)
+                elif zostalo is not None and zostalo <= 0:
+                    _zglos_blad(bledy, nr, CapacityError.wydarzenie_msg,
+                                scisle)
+                else:
+                    if zostalo is not None:
+                        wolne[para[1]] = zostalo - 1
+                    zapisani.add(para)
+                    nowe.append({"osoba_id": para[0],
+                                 "wydarzenie_id": para[1]})
+                    ids[nr] = para[0]
+            if nowe:
+                session.execute(insert(uczestnictwa), nowe)
         session.commit()
-        session.close()
+    bledy.sort(key=lambda b: b["nr"])
+    return {"id": ids, "bledy": bledy}
+
+
+def _wiersz_importu(rekord: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a record of importuj and return its event's row,
+    the natural key of its location and its participants."""
+    wiersz = _wiersz_wydarzenia(rekord)
+    miejsce = None
+    if rekord.get("miejsce"):
+        miejsce = _wiersz_miejsca({"nazwa": rekord["miejsce"],
+                                   "adres": rekord.get("adres") or None})
+    uczestnicy = {}
+    for osoba in rekord.get("uczestnicy", []):
+        o = _wiersz_osoby(osoba)
+        uczestnicy[o["email"]] = o["imie"]
+    if rekord.get("zastepuje") is not None:
+        raise ValueError("Nie można importować zmienionego wystąpienia"
+                         " serii.")
+    regula = None
+    odwolane = []
+    if rekord.get("powtarzanie") is not None:
+        regula = _regula_importu(wiersz, rekord["powtarzanie"])
+        for p in rekord.get("odwolane", []):
+            s = parsuj_chwile(p)
+            if not any(w == s for w, _ in wystapienia(
+                    wiersz["poczatek"], wiersz["koniec"],
+                    regula["czestotliwosc"], regula["interwal"],
+                    regula["liczba"], regula["do_kiedy"], s,
+                    s + datetime.timedelta(seconds=1))):
+                raise ValueError(NotFoundError.wystapienie_msg)
+            odwolane.append(s)
+    elif rekord.get("odwolane"):
+        raise ValueError(NotFoundError.wystapienie_msg)
+    return {"wydarzenie": wiersz,
+            "miejsce": None if miejsce is None
+            else (miejsce["nazwa"], miejsce["adres"] or ""),
+            "uczestnicy": uczestnicy, "powtarzanie": regula,
+            "odwolane": odwolane}
+
+
+def _regula_importu(wiersz: Dict[str, Any],
+                    regula: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate the rule of a record of importuj and return the fields
+    of its row of Powtorzenie, but wydarzenie_id."""
+    inne = sorted(set(regula) - {"czestotliwosc", "interwal", "liczba",
+                                 "do"})
+    if inne:
+        raise ValueError("Nieobsługiwane pola reguły powtarzania: {0}."
+                         .format(", ".join(inne)))
+    res = {"czestotliwosc": regula["czestotliwosc"],
+           "interwal": regula.get("interwal", 1),
+           "liczba": regula.get("liczba")}
+    res["do_kiedy"] = _sprawdz_regule(wiersz["poczatek"],
+                                      res["czestotliwosc"], res["interwal"],
+                                      res["liczba"], regula.get("do"))
+    res["koniec"] = _koniec_serii(wiersz["poczatek"], wiersz["koniec"],
+                                  Powtorzenie(**res))
+    return res
+
+
+def _wstaw_miejsca(session: Any, klucze: Sequence[Tuple[str, str]],
+                   rozmiar: Optional[int]) -> Dict[Tuple[str, str], int]:
+    """Return the IDs of the locations with the given natural keys
+    (name, address or ""), inserting those that do not exist.
+    If many locations share a key, the oldest one is used."""
+    res: Dict[Tuple[str, str], int] = {}
+    klucz = tuple_(Miejsce.nazwa, func.coalesce(Miejsce.adres, ""))
+    for paczka in _paczki(list(klucze), rozmiar):
+        for r in session.execute(select(Miejsce.id, Miejsce.nazwa,
+                                        Miejsce.adres)
+                                 .where(klucz.in_(paczka))
+                                 .order_by(Miejsce.id)):
+            res.setdefault((r.nazwa, r.adres or ""), r.id)
+    nowe = [k for k in klucze if k not in res]
+    ids: List[Optional[int]] = [None] * len(nowe)
+    _dodaj_wiele(session, Miejsce,
+                 [(nr, {"nazwa": n, "adres": a or None})
+                  for nr, (n, a) in enumerate(nowe)], ids, rozmiar)
+    res.update((k, id) for k, id in zip(nowe, ids) if id is not None)
+    return res
+
 
+def _wstaw_osoby(session: Any, osoby: Dict[str, str],
+                 rozmiar: Optional[int]) -> Dict[str, int]:
+    """Return the IDs of the people with the given email addresses,
+    inserting those that do not exist. Names are given by address;
+    existing people whose name differs are renamed."""
+    res: Dict[str, int] = {}
+    zmiany = []
+    for paczka in _paczki(list(osoby), rozmiar):
+        for r in session.execute(select(Osoba.id, Osoba.email, Osoba.imie)
+                                 .where(Osoba.email.in_(paczka))):
+            res[r.email] = r.id
+            if r.imie != osoby[r.email]:
+                zmiany.append({"id": r.id, "imie": osoby[r.email]})
+    for paczka in _paczki(zmiany, rozmiar):
+        session.execute(update(Osoba), paczka)
+    nowe = [e for e in osoby if e not in res]
+    ids: List[Optional[int]] = [None] * len(nowe)
+    _dodaj_wiele(session, Osoba,
+                 [(nr, {"imie": osoby[e], "email": e})
+                  for nr, e in enumerate(nowe)], ids, rozmiar)
+    res.update((e, id) for e, id in zip(nowe, ids) if id is not None)
+    return res
+
+
+def importuj(engine: Lacze, rekordy: List[Dict[str, Any]],
+             scisle: bool = False, rozmiar: Optional[int] = None,
+             postep: Optional[str] = None, od: int = 0,
+             koniec: bool = False) -> Dict[str, Any]:
+    """Insert many events together with their locations and participants
+    in one transaction. Used to import calendars from files
+    -- see wymiana.py.
 
-def wypisz(engine: Engine, email: str, id_wydarzenia: int) -> None:
+    Locations are identified by name and address, people by email
+    address: those that do not exist are inserted, existing people
+    are given the name from the record.
+    Returns a dictionary -- see dodaj_wydarzenia; field id holds the IDs
+    of the inserted events and field pominiete the number of records
+    skipped as written before -- see postep.
+
+    Positional arguments:
+    rekordy -- list of dictionaries with the fields of a record
+    of dodaj_wydarzenia except id_miejsca, and optionally:
+    miejsce, adres -- name and address of the event's location;
+    uczestnicy -- list of dictionaries with the fields imie and email;
+    powtarzanie -- dictionary with the field czestotliwosc and optionally
+    interwal, liczba and do, the arguments of ustaw_powtarzanie,
+    making the event a series;
+    odwolane -- starting moments RRRR-MM-DD GG:MM of the cancelled
+    occurrences of the series -- see odwolaj_wystapienie;
+    zastepuje -- starting moment of the occurrence of some series that
+    the event replaces. Such records are rejected, as the series cannot
+    be identified.
+
+    Keyword arguments: see dodaj_wydarzenia, and:
+    postep -- key of a resumable import, under which the number
+    of its records written so far is kept in the table of metadata
+    -- see Metadane, by the same transaction as the records.
+    The first records of rekordy that some earlier call already wrote
+    are skipped, so that an import interrupted before its caller saved
+    the progress does not insert them again. `None` if not resumable.
+    od -- number of the records of the import preceding rekordy.
+    koniec -- set to `True` iff the import is done and its progress
+    should be removed.
+    """
+    wiersze, bledy = _sprawdz_wsad(rekordy, _wiersz_importu, scisle)
+    ids: List[Optional[int]] = [None] * len(rekordy)
+    pominiete = 0
+    with Session(bind=engine) as session:
+        if postep is not None:
+            zapisane = session.scalar(select(Metadane.wartosc)
+                                      .where(Metadane.klucz == postep))
+            pominiete = max(0, min(len(rekordy), (zapisane or 0) - od))
+            wiersze = [(nr, w) for nr, w in wiersze if nr >= pominiete]
+            bledy = [b for b in bledy if b["nr"] >= pominiete]
+        miejsca = _wstaw_miejsca(
+            session, list(dict.fromkeys(w["miejsce"] for _, w in wiersze
+                                        if w["miejsce"] is not None)),
+            rozmiar)
+        osoby: Dict[str, str] = {}
+        for _, w in wiersze:
+            osoby.update(w["uczestnicy"])
+        id_osob = _wstaw_osoby(session, osoby, rozmiar)
+        for _, w in wiersze:
+            w["wydarzenie"]["miejsce_id"] = miejsca.get(w["miejsce"])
+        _dodaj_wiele(session, Wydarzenie,
+                     [(nr, w["wydarzenie"]) for nr, w in wiersze], ids,
+                     rozmiar)
+        zapisy = [{"osoba_id": id_osob[e], "wydarzenie_id": ids[nr]}
+                  for nr, w in wiersze for e in w["uczestnicy"]]
+        for paczka in _paczki(zapisy, rozmiar):
+            session.execute(insert(uczestnictwa), paczka)
+        reguly = [{**w["powtarzanie"], "wydarzenie_id": ids[nr]}
+                  for nr, w in wiersze if w["powtarzanie"] is not None]
+        for paczka in _paczki(reguly, rozmiar):
+            session.execute(insert(Powtorzenie), paczka)
+        odwolane = [{"wydarzenie_id": ids[nr], "poczatek": p}
+                    for nr, w in wiersze for p in w["odwolane"]]
+        for paczka in _paczki(odwolane, rozmiar):
+            session.execute(insert(wyjatki), paczka)
+        if postep is not None and koniec:
+            session.execute(delete(Metadane)
+                            .where(Metadane.klucz == postep))
+        elif postep is not None:
+            session.execute(insert(Metadane).prefix_with("OR REPLACE")
+                            .values(klucz=postep, wartosc=od + len(rekordy)))
+        session.commit()
+    return {"id": ids, "bledy": bledy, "pominiete": pominiete}
+
+
+def wypisz(engine: Lacze, email: str, id_wydarzenia: int) -> None:
     """Remove a person from an event.
 
-    Deletes a row from the table of participations (see uczestnictwa).
-    Modifies the person row's wydarzenia field
-    and the event row's uczestnicy field.
-    Assumes that the people's email addresses are unique.
+    Deletes a row from the table of participations (see uczestnictwa)
+    with a single DELETE that resolves the email address,
+    so the cost does not depend on the number of participants.
+    People's email addresses are unique -- see Osoba.
+    Throws NoResultFound if no person has the email address,
+    NotFoundError if no event with given ID exists
+    and ValueError if the person is not signed up for the event.
 
     Positional arguments:
     email -- email address used to query the table of people.
     id_wydarzenia -- the event's ID.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        os = session.scalars(select(Osoba).where(Osoba.email == email)).one()
-        if wyd is None:
-            raise NotFoundError(NotFoundError.wydarzenie_msg)
-        wyd.uczestnicy.remove(os)
-        session.commit()
-        session.close()
+    stmt = (delete(uczestnictwa)
+            .where(uczestnictwa.c.wydarzenie_id == id_wydarzenia,
+                   uczestnictwa.c.osoba_id
+                   == select(Osoba.id).where(Osoba.email == email)
+                   .scalar_subquery()))
+    with transakcja(engine) as conn:
+        if conn.execute(stmt).rowcount == 0:
+            _sprawdz_uczestnictwo(conn, email, id_wydarzenia)
+            raise ValueError("Osoba nie jest zapisana na wydarzenie.")
+
+
+def _sprawdz_uczestnictwo(conn: Connection, email: str,
+                          id_wydarzenia: int) -> None:
+    """Find out why a participation could not be written.
+
+    Throws NoResultFound if no person has the email address
+    and NotFoundError if no event with given ID exists.
+    """
+    conn.execute(select(Osoba.id).where(Osoba.email == email)).one()
+    if conn.scalar(select(Wydarzenie.id)
+                   .where(Wydarzenie.id == id_wydarzenia)) is None:
+        raise NotFoundError(NotFoundError.wydarzenie_msg)
 
 
-def znajdz_wydarzenia_osoby(engine: Engine,
-                            email: str) -> List[Dict[str, Union[int, str]]]:
+def znajdz_wydarzenia_osoby(engine: Lacze, email: str,
+                            limit: Optional[int] = None,
+                            po_id: Optional[int] = None
+                            ) -> List[AnsDict]:
     """Find events that a person participates in.
 
-    Returns a list of dictionaries with fields id and nazwa.
-    Assumes that the people's email addresses are unique.
+    Returns a list of dictionaries with fields id and nazwa,
+    ordered by ID.
+    People's email addresses are unique -- see Osoba.
 
     Positional arguments:
     email -- email address used to query the table of people.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        stmt = ((select(Osoba.imie, Wydarzenie.id, Wydarzenie.nazwa)
-                 .join(Osoba.wydarzenia))
-                .where(Osoba.email == email))
-        rows = session.execute(stmt)
-        res: List[Dict[str, Union[int, str]]] \
-            = list(map(lambda row: {"id": row.id, "nazwa": row.nazwa}, rows))
-        session.close()
+    stmt = (select(Wydarzenie.id, Wydarzenie.nazwa)
+            .join(uczestnictwa,
+                  uczestnictwa.c.wydarzenie_id == Wydarzenie.id)
+            .join(Osoba, Osoba.id == uczestnictwa.c.osoba_id)
+            .where(Osoba.email == email).order_by(Wydarzenie.id))
+    return _odczytaj(engine, stronicuj(stmt, Wydarzenie.id, limit, po_id))
+
+
+def znajdz_zapisanych_na_wydarzenie(engine: Lacze, id_wydarzenia: int,
+                                    limit: Optional[int] = None,
+                                    po_id: Optional[int] = None
+                                    ) -> List[AnsDict]:
+    """Find the participants of an event.
+
+    Returns a list of dictionaries -- see dict_of_osoba, ordered by ID.
+    Throws NotFoundError if no event with given ID exists.
+
+    Positional arguments:
+    id_wydarzenia -- the event's ID.
+
+    Keyword arguments:
+    limit, po_id -- see stronicuj.
+    """
+    stmt = (select(Osoba.id, Osoba.imie, Osoba.email)
+            .join(uczestnictwa, uczestnictwa.c.osoba_id == Osoba.id)
+            .where(uczestnictwa.c.wydarzenie_id == id_wydarzenia)
+            .order_by(Osoba.id))
+    res = _odczytaj(engine, stronicuj(stmt, Osoba.id, limit, po_id))
+    if not res:
+        _sprawdz_wydarzenie(engine, id_wydarzenia)
     return res
 
 
-def znajdz_zapisanych_na_wydarzenie(engine: Engine,
-                                    id_wydarzenia: int) -> List[AnsDict]:
-    """Find the participants of an event.
+def wspolny_wolny_czas(engine: Lacze, emaile: List[str], od: str, do: str,
+                       min_dlugosc: int = 0, limit: Optional[int] = None
+                       ) -> List[Dict[str, Union[int, str]]]:
+    """Return the ranges of time in [od, do) when none of a group
+    of people takes part in any event.
+
+    Reads the events of all the people that overlap the range, each
+    once, and the occurrences of their series, by one query -- see
+    _zajetosc, merges them by the starting moment and returns the gaps
+    between them, found in one pass.
 
-    Returns a list of dictionaries -- see dict_of_osoba.
+    Returns a list of dictionaries with keys od and do -- moments
+    in the format of parsuj_chwile, and minuty -- the length in minutes,
+    longest first, then by the starting moment.
+    Throws NotFoundError if no person has some of the email addresses.
 
     Positional arguments:
-    id_wydarzenia -- the event's ID.
+    emaile -- email addresses of the people.
+    od, do -- moments in the format of parsuj_chwile.
+
+    Keyword arguments:
+    min_dlugosc -- the least length of a returned range, in minutes.
+    limit -- the greatest number of returned ranges; `None` for all.
     """
-    Session = sessionmaker(engine)
-    with Session() as session:
-        wyd = session.get(Wydarzenie, id_wydarzenia)
-        if wyd is None:
+    od_, do_ = parsuj_chwile(od), parsuj_chwile(do)
+    if min_dlugosc < 0:
+        raise ValueError("Niepoprawna długość.")
+    emaile = list(set(emaile))
+    with polaczenie(engine) as conn:
+        znane = set(conn.scalars(select(Osoba.email)
+                                 .where(Osoba.email.in_(emaile))))
+        if len(znane) < len(emaile):
+            raise NotFoundError(NotFoundError.osoba_msg + " Nieznane adresy: "
+                                + ", ".join(sorted(set(emaile) - znane)))
+        grupy = (select(uczestnictwa.c.wydarzenie_id)
+                 .join(Osoba, Osoba.id == uczestnictwa.c.osoba_id)
+                 .where(Osoba.email.in_(emaile)))
+        zajete = _zajetosc(conn, od_, do_, Wydarzenie.id.in_(grupy))
+        luki = _luki(zajete, od_, do_,
+                     datetime.timedelta(minutes=min_dlugosc))
+        ranking = (sorted(luki, key=_ranga_luki) if limit is None
+                   else heapq.nsmallest(limit, luki, key=_ranga_luki))
+    return [{"od": _tekst_chwili(p), "do": _tekst_chwili(k),
+             "minuty": (k - p) // _MINUTA} for p, k in ranking]
+
+
+def _ranga_luki(luka: Tuple[datetime.datetime, datetime.datetime]
+                ) -> Tuple[datetime.timedelta, datetime.datetime]:
+    """Return the key ordering ranges of time longest first,
+    then by the starting moment -- see wspolny_wolny_czas."""
+    return luka[0] - luka[1], luka[0]
+
+
+def _sprawdz_wydarzenie(engine: Lacze, id_wydarzenia: int) -> None:
+    """Throw NotFoundError if no event with given ID exists."""
+    with polaczenie(engine) as conn:
+        if conn.scalar(select(Wydarzenie.id)
+                       .where(Wydarzenie.id == id_wydarzenia)) is None:
             raise NotFoundError(NotFoundError.wydarzenie_msg)
-        res = list(map(dict_of_osoba, wyd.uczestnicy))
-        session.close()
-    return res
+
+
+def zapytanie_pelnotekstowe(tekst: str) -> str:
+    """Return an FTS5 query matching rows that contain, for every word
+    of tekst, a word starting with it. Returns "" if tekst has no words.
+    """
+    return " ".join('"{0}"*'.format(slowo)
+                    for slowo in findall(r"\w+", tekst))
+
+
+def szukaj(engine: Lacze, tekst: str,
+           limit: int = 20) -> List[Dict[str, Any]]:
+    """Search events, locations and people by words or their prefixes.
+
+    Searches names and descriptions of events, names and addresses
+    of locations, and names of people -- see INDEKSY_PELNOTEKSTOWE
+    and zapytanie_pelnotekstowe.
+    Returns a list of at most limit dictionaries, best matches first,
+    with fields:
+    rodzaj -- "wydarzenia", "miejsca" or "osoby": the table of the row.
+    id -- the row's ID.
+    nazwa -- the row's name.
+    ranga -- BM25 rank of the match; lower is better.
+    """
+    zapytanie = zapytanie_pelnotekstowe(tekst)
+    if zapytanie == "":
+        return []
+    czesci = ["SELECT * FROM (SELECT '{0}' AS rodzaj, {0}.id AS id,"
+              " {0}.{1} AS nazwa, {0}_fts.rank AS ranga"
+              " FROM {0}_fts JOIN {0} ON {0}.id = {0}_fts.rowid"
+              " WHERE {0}_fts MATCH :zapytanie"
+              " ORDER BY {0}_fts.rank LIMIT :limit)"
+              .format(tabela, nazwa)
+              for tabela, nazwa, _ in INDEKSY_PELNOTEKSTOWE]
+    stmt = text(" UNION ALL ".join(czesci) + " ORDER BY ranga LIMIT :limit")
+    with polaczenie(engine) as conn:
+        return [dict(row._mapping)
+                for row in conn.execute(stmt, {"zapytanie": zapytanie,
+                                               "limit": limit})]
+
+
+def rewizja(engine: Lacze) -> int:
+    """Return the revision of the database -- see Metadane.
+
+    The revision changes whenever data that can be read changes, so that
+    it can tell clients whether results they hold are still up to date,
+    at the cost of reading one row.
+    """
+    with polaczenie(engine) as conn:
+        res = conn.scalar(select(Metadane.wartosc)
+                          .where(Metadane.klucz == "rewizja"))
+    return int(res or 0)
+
+
+def zmiany_od(engine: Lacze, rewizja: int,
+              limit: Optional[int] = None) -> Dict[str, Any]:
+    """Return the changes made after a given revision -- see rewizja,
+    from the log of changes -- see zmiany, so that a client holding data
+    read at that revision can bring it up to date.
+
+    Every change is logged, so a row changed many times may appear
+    many times, until konserwuj compacts the log to the latest change
+    of each row. The changes are ordered by revision.
+    Returns a dictionary with fields:
+    zmiany -- list of dictionaries with fields rewizja, tabela (name
+    in ZRODLA_ZMIAN), id (ID of the row, or of the event
+    for participations), id_osoby (ID of the person for participations,
+    `None` otherwise) and usuniete (whether the row was deleted).
+    rewizja -- revision that the client holds after applying the changes;
+    pass it to the next call.
+    od_nowa -- `True` if the log no longer holds the changes made after
+    the given revision -- see konserwuj; then zmiany is empty,
+    and the client should read all data again, after this call.
+
+    Keyword arguments:
+    limit -- maximum number of changes returned; `None` if not limited.
+    """
+    stmt = (select(zmiany).where(zmiany.c.rewizja > rewizja)
+            .order_by(zmiany.c.rewizja).limit(limit))
+    with polaczenie(engine) as conn:
+        wiersze = conn.execute(stmt).all()
+        wartosci = dict(conn.execute(
+            select(Metadane.klucz, Metadane.wartosc)
+            .where(Metadane.klucz.in_(["rewizja", "poczatek_zmian"])))
+            .all())
+    if rewizja < wartosci.get("poczatek_zmian", 0):
+        return {"zmiany": [], "rewizja": wartosci.get("rewizja", 0),
+                "od_nowa": True}
+    return {"zmiany": [{"rewizja": r.rewizja, "tabela": r.tabela,
+                        "id": r.klucz, "id_osoby": r.klucz2,
+                        "usuniete": bool(r.usuniete)} for r in wiersze],
+            "rewizja": wiersze[-1].rewizja if wiersze else rewizja,
+            "od_nowa": False}
+
+
+PACZKA_EKSPORTU = 500
+"""Number of events fetched from the cursor at a time by eksport."""
+
+
+def eksport(engine: Lacze, email: Optional[str] = None,
+            id_miejsca: Optional[int] = None, od: Optional[str] = None,
+            do: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Return an iterator over the events of a calendar feed, ordered
+    by the starting moment and ID, with their participants.
+
+    Events are read by a server-side cursor, PACZKA_EKSPORTU at a time,
+    and the participants and exceptions of each chunk by two more
+    queries, so that memory does not grow with the number of events.
+    The arguments are checked at once, raising ValueError, the database
+    is read while iterating.
+    Each event is a dictionary with the fields of dict_of_wydarzenie and:
+    poczatek, koniec -- moments of the event (datetime.datetime).
+    uczestnicy -- list of dictionaries -- see dict_of_osoba.
+    powtarzanie -- dictionary with the fields czestotliwosc, interwal,
+    liczba and do_kiedy of the rule of a series -- see Powtorzenie;
+    `None` for single events.
+    odwolane -- starting moments of the cancelled occurrences
+    of a series.
+    zastepuje -- pair (ID of a series, starting moment) of the occurrence
+    that the event replaces -- see mod_wystapienie; `None` if none.
+
+    Keyword arguments, restricting the events; `None` if not needed:
+    email -- email address of a participant.
+    id_miejsca -- ID of the location.
+    od, do -- time range that the events, or some occurrences of series,
+    overlap, RRRR-MM-DD GG:MM -- see parsuj_chwile; both must be given.
+    """
+    stmt = (_wydarzenia_select()
+            .add_columns(Wydarzenie.poczatek, Wydarzenie.koniec,
+                         Powtorzenie.czestotliwosc, Powtorzenie.interwal,
+                         Powtorzenie.liczba, Powtorzenie.do_kiedy)
+            .outerjoin(Powtorzenie,
+                       Powtorzenie.wydarzenie_id == Wydarzenie.id)
+            .order_by(Wydarzenie.poczatek, Wydarzenie.id))
+    if email is not None:
+        stmt = stmt.where(Wydarzenie.id.in_(
+            select(uczestnictwa.c.wydarzenie_id)
+            .join(Osoba, Osoba.id == uczestnictwa.c.osoba_id)
+            .where(Osoba.email == email)))
+    if id_miejsca is not None:
+        stmt = stmt.where(Wydarzenie.miejsce_id == id_miejsca)
+    if od is not None or do is not None:
+        if od is None or do is None:
+            raise ValueError("Podaj oba końce przedziału.")
+        od_, do_ = parsuj_chwile(od), parsuj_chwile(do)
+        stmt = stmt.where(or_(
+            and_(Powtorzenie.wydarzenie_id.is_(None),
+                 w_przedziale(od_, do_)),
+            and_(Powtorzenie.wydarzenie_id.is_not(None),
+                 Wydarzenie.poczatek < do_,
+                 or_(Powtorzenie.koniec.is_(None),
+                     Powtorzenie.koniec > od_))))
+    return _strumien_eksportu(engine, stmt)
+
+
+def _strumien_eksportu(engine: Lacze,
+                       stmt: Any) -> Iterator[Dict[str, Any]]:
+    """Yield the events selected by a statement built by eksport."""
+    osoby = (select(uczestnictwa.c.wydarzenie_id, Osoba.id, Osoba.imie,
+                    Osoba.email)
+             .join(Osoba, Osoba.id == uczestnictwa.c.osoba_id)
+             .order_by(uczestnictwa.c.wydarzenie_id, Osoba.id))
+    with polaczenie(engine) as conn:
+        wynik = conn.execution_options(
+            stream_results=True, yield_per=PACZKA_EKSPORTU).execute(stmt)
+        for paczka in wynik.partitions():
+            ids = [w.id for w in paczka]
+            uczestnicy: Dict[int, List[Dict[str, Any]]] = {}
+            for r in conn.execute(osoby.where(
+                    uczestnictwa.c.wydarzenie_id.in_(ids))):
+                uczestnicy.setdefault(r.wydarzenie_id, []).append(
+                    {"id": r.id, "imie": r.imie, "email": r.email})
+            odwolane: Dict[int, List[datetime.datetime]] = {}
+            zastepuje = {}
+            for r in conn.execute(select(wyjatki).where(or_(
+                    wyjatki.c.wydarzenie_id.in_(ids),
+                    wyjatki.c.zastepstwo_id.in_(ids)))
+                    .order_by(wyjatki.c.poczatek)):
+                if r.zastepstwo_id is None:
+                    odwolane.setdefault(r.wydarzenie_id, []).append(
+                        r.poczatek)
+                else:
+                    zastepuje[r.zastepstwo_id] = (r.wydarzenie_id,
+                                                  r.poczatek)
+            for w in paczka:
+                yield {**_bez_chwil(w), "poczatek": w.poczatek,
+                       "koniec": w.koniec,
+                       "uczestnicy": uczestnicy.get(w.id, []),
+                       "powtarzanie": None if w.czestotliwosc is None
+                       else {"czestotliwosc": w.czestotliwosc,
+                             "interwal": w.interwal, "liczba": w.liczba,
+                             "do_kiedy": w.do_kiedy},
+                       "odwolane": odwolane.get(w.id, []),
+                       "zastepuje": zastepuje.get(w.id)}
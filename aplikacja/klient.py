@@ -1,12 +1,25 @@
 """Client script with command line user interface. Run with -h for help.
 Requires a help.txt file to exist in directory `projekt/aplikacja`.
 To learn the required format, see configure_parser.
+
+Module dbops, and with it SQLAlchemy, is imported only when an action
+is invoked without option -s, so that the remote path starts quickly.
 """
 
+from __future__ import annotations
 import argparse
-import aplikacja.dbops as dbops
+import json
+import marshal
+import os
+import shlex
+import sys
 import xmlrpc.client
-from typing import Iterable, Any
+from typing import Iterable, Iterator, Any, Callable, Dict, List, Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import aplikacja.dbops as dbops
 
 
 def format_id_output(tbl: str, id: int) -> str:
@@ -35,6 +48,12 @@ def format_wydarzenie_output(wyd_dict: dbops.AnsDict) -> str:
                      wyd_dict["opis"])
     if wyd_dict["nazwa_miejsca"] is not None:
         res += "\nmiejsce: {0}".format(wyd_dict["nazwa_miejsca"])
+    if wyd_dict.get("limit_miejsc") is not None:
+        res += "\nuczestnicy: {0}/{1}{2}".format(
+            wyd_dict["liczba_uczestnikow"], wyd_dict["limit_miejsc"],
+            " (brak miejsc)" if wyd_dict["pelne"] else "")
+    elif wyd_dict.get("liczba_uczestnikow"):
+        res += "\nuczestnicy: {0}".format(wyd_dict["liczba_uczestnikow"])
     return res
 
 
@@ -62,6 +81,45 @@ def format_miejsce_output(msc_dict: dbops.AnsDict) -> str:
                                                  msc_dict["adres"])
 
 
+RODZAJE = {"wydarzenia": "wydarzenie", "miejsca": "miejsce",
+           "osoby": "osoba"}
+"""Polish names of the kinds of search results -- see dbops.szukaj."""
+
+
+def format_trafienie_output(traf_dict: Dict[str, Any]) -> str:
+    """Return a string summarizing a search result.
+
+    Positional arguments:
+    traf_dict -- dictionary representing a search result --
+    see dbops.szukaj.
+    """
+    return "{0} nr {1} nazwa: {2}".format(RODZAJE[traf_dict["rodzaj"]],
+                                          traf_dict["id"],
+                                          traf_dict["nazwa"])
+
+
+def format_termin_output(termin: Dict[str, str]) -> str:
+    """Return a string summarizing a range of time -- see
+    dbops.wolne_terminy."""
+    return "od {0} do {1}".format(termin["od"], termin["do"])
+
+
+def format_wolny_czas_output(termin: Dict[str, Any]) -> str:
+    """Return a string summarizing a range of time with its length
+    -- see dbops.wspolny_wolny_czas."""
+    return "{0} ({1} min)".format(format_termin_output(termin),
+                                  termin["minuty"])
+
+
+def format_kolizja_output(kolizja: dbops.AnsDict) -> str:
+    """Return a string warning of an event that takes place in a location
+    at the same time as another -- see dbops.dodaj_miejsce_do_wydarzenia.
+    """
+    return ("Uwaga: miejsce jest zajęte przez wydarzenie nr {0}"
+            " od {1} do {2}.".format(kolizja["id"], kolizja["od"],
+                                     kolizja["do"]))
+
+
 def print_list_output(xs: Iterable[str]) -> None:
     """Print a list of strings, separated by double newline.
 
@@ -75,11 +133,164 @@ def print_list_output(xs: Iterable[str]) -> None:
     print(f"(liczba wyników: {num_of_results})")
 
 
+ROZMIAR_STRONY = 100
+"""Default number of results fetched by one call in streaming mode."""
+
+
+KURSORY: Dict[str, Callable[[Dict[str, Any]], List[Any]]] = {
+    "znajdz_wydarzenia_w_przedziale":
+    lambda w: [w["data_rozp"] + " " + w["godzina_rozp"]]}
+"""Functions returning the pagination parameters following po_id
+that identify the last result of a page, by API name of the action,
+for actions whose results are not identified by ID alone
+-- see dbops.znajdz_wydarzenia_w_przedziale."""
+
+
+def strony(action: str, action_args: List[Any], online: Any,
+           rozmiar: int, po_nr: Optional[int] = None) -> Iterator[Any]:
+    """Yield the results of a list-returning action page by page.
+
+    Each page is fetched by a separate call, with keyset pagination
+    parameters limit and po_id appended to action_args
+    -- see dbops.stronicuj, followed by those of KURSORY, and its results
+    are yielded before the next page is requested.
+
+    Positional arguments:
+    rozmiar -- number of results per page.
+    po_nr -- ID of the result after which the first page starts.
+    """
+    dalej: List[Any] = []
+    while True:
+        strona = invoke_action(action,
+                               action_args + [rozmiar, po_nr] + dalej,
+                               online)
+        yield from strona
+        if len(strona) < rozmiar:
+            return
+        po_nr = strona[-1]["id"]
+        if action in KURSORY:
+            dalej = KURSORY[action](strona[-1])
+
+
+def wyniki(action: str, action_args: List[Any],
+           args: argparse.Namespace) -> Iterable[Any]:
+    """Return the results of a list-returning action.
+
+    With option --strumien, results are fetched page by page -- see
+    strony; otherwise by one call, with at most --strona results.
+    """
+    rozmiar = int(args.strona) if args.strona is not None else None
+    po_nr = int(args.po_nr) if args.po_nr is not None else None
+    if args.strumien:
+        return strony(action, action_args, args.s,
+                      rozmiar or ROZMIAR_STRONY, po_nr)
+    return invoke_action(action, action_args + [rozmiar, po_nr], args.s)
+
+
+def format_wsad_output(tbl: str, wynik: Dict[str, List[Any]]) -> str:
+    """Return a string summarizing the result of a batch function.
+
+    Positional arguments:
+    tbl -- Polish name of the added entities in the nominative plural.
+    wynik -- result of the batch function -- see dbops.dodaj_wydarzenia.
+    """
+    dodane = sum(1 for id in wynik["id"] if id is not None)
+    res = "Dodano {0} z {1} ({2}).".format(dodane, len(wynik["id"]), tbl)
+    for blad in wynik["bledy"]:
+        res += "\nrekord nr {0}: {1}".format(blad["nr"], blad["blad"])
+    return res
+
+
+def format_import_output(wynik: Dict[str, int]) -> str:
+    """Return a string summarizing an import -- see wymiana.importuj."""
+    res = ("Wczytano {0} rekordów: dodano {1} wydarzeń, odrzucono {2}."
+           .format(wynik["rekordy"], wynik["dodane"], wynik["bledy"]))
+    if wynik["wznowiono"]:
+        res += "\nWznowiono po {0} rekordach.".format(wynik["wznowiono"])
+    return res
+
+
+WSADY = [("miejsca", "dodaj_miejsca"),
+         ("osoby", "dodaj_osoby"),
+         ("wydarzenia", "dodaj_wydarzenia"),
+         ("zapisy", "zapisz_wiele")]
+"""Keys of the file read by --dodaj-wiele, in the order in which they are
+processed, with the batch functions that handle them."""
+
+
+def wczytaj_wsad(plik: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a JSON file with lists of records for the batch functions.
+
+    The file holds an object whose keys are listed in WSADY.
+    Each key is optional.
+    """
+    with open(plik, "r", encoding="utf-8") as f:
+        res: Dict[str, List[Dict[str, Any]]] = json.load(f)
+    return res
+
+
 class BadParserConfigFileError(Exception):
     """Exception raised by configure_parser."""
     pass
 
 
+Specyfikacja = List[Tuple[str, str, str]]
+"""Arguments of the command line -- see wczytaj_specyfikacje."""
+PLIK_POMOCY = "help.txt"
+PAMIEC_SPECYFIKACJI = os.path.join("__pycache__", "help.txt.marshal")
+"""Path of the cached argument specification read from PLIK_POMOCY."""
+WERSJA_SPECYFIKACJI = 1
+"""Version of the format of the cached argument specification."""
+
+
+def wczytaj_specyfikacje(plik: str = PLIK_POMOCY,
+                         pamiec: Optional[str] = PAMIEC_SPECYFIKACJI
+                         ) -> Specyfikacja:
+    """Return the arguments of the command line described by a file
+    in the format of help.txt -- see configure_parser.
+
+    Returns a list of triples: section ("OPTIONS", "PARAMS" or "ACTIONS"),
+    name of the argument and help text.
+    The list is cached in file pamiec in marshal format, together with
+    the modification time and size of plik, and is read from there while
+    they do not change.
+
+    Keyword arguments:
+    pamiec -- path of the cache; `None` if the list is not to be cached.
+    """
+    stat = os.stat(plik)
+    klucz = [WERSJA_SPECYFIKACJI, stat.st_mtime_ns, stat.st_size]
+    if pamiec is not None:
+        try:
+            with open(pamiec, "rb") as f:
+                zapisane = marshal.load(f)
+            if zapisane[0] == klucz:
+                res: Specyfikacja = zapisane[1]
+                return res
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            pass
+    res = []
+    with open(plik, "r", encoding="utf-8") as f:
+        line = f.readline()
+        if line != "OPTIONS\n":
+            raise BadParserConfigFileError()
+        sekcja = "OPTIONS"
+        for line in f:
+            if line in ("PARAMS\n", "ACTIONS\n"):
+                sekcja = line[:-1]
+                continue
+            xs = line.split(" ", maxsplit=1)
+            res.append((sekcja, xs[0], xs[1]))
+    if pamiec is not None:
+        try:
+            os.makedirs(os.path.dirname(pamiec) or ".", exist_ok=True)
+            with open(pamiec, "wb") as f:
+                marshal.dump([klucz, res], f)
+        except OSError:
+            pass
+    return res
+
+
 def configure_parser(parser: argparse.ArgumentParser) -> None:
     r"""Configure the command line argument parser
     according to help.txt. Required format:
@@ -97,117 +308,507 @@ def configure_parser(parser: argparse.ArgumentParser) -> None:
     under ACTIONS.
 
     The first requirement is enforced by raising BadParserConfigFileError.
+    The file is parsed once per change -- see wczytaj_specyfikacje.
     """
-    with open("help.txt", "r", encoding="utf-8") as f:
-        line = f.readline()
-        if line != "OPTIONS\n":
-            raise BadParserConfigFileError()
-        line = f.readline()
-        while line != "PARAMS\n":
-            xs = line.split(" ", maxsplit=1)
-            parser.add_argument(xs[0], help=xs[1], action="store_true")
-            line = f.readline()
-        line = f.readline()
-        while line != "ACTIONS\n":
-            xs = line.split(" ", maxsplit=1)
-            parser.add_argument(xs[0], help=xs[1])
-            line = f.readline()
-        line = f.readline()
-        grp = parser.add_mutually_exclusive_group()
-        while line != "":
-            xs = line.split(" ", maxsplit=1)
-            grp.add_argument(xs[0], help=xs[1], action="store_true")
-            line = f.readline()
+    grp = None
+    for sekcja, flaga, pomoc in wczytaj_specyfikacje():
+        if sekcja == "OPTIONS":
+            parser.add_argument(flaga, help=pomoc, action="store_true")
+        elif sekcja == "PARAMS":
+            parser.add_argument(flaga, help=pomoc)
+        else:
+            if grp is None:
+                grp = parser.add_mutually_exclusive_group()
+            grp.add_argument(flaga, help=pomoc, action="store_true")
 
 
-def invoke_action(action: Any, action_args: Any, online: Any) -> Any:
+def zbuduj_parser() -> argparse.ArgumentParser:
+    """Return the command line argument parser -- see configure_parser."""
+    parser = argparse.ArgumentParser()
+    configure_parser(parser)
+    return parser
+
+
+ADRES_SERWERA = "http://localhost:8000"
+"""URL of the XML-RPC server used with option -s."""
+TRANSPORT = "auto"
+"""Transport used with option -s: "xmlrpc", "json", "msgpack" or "auto"
+-- see Serwer."""
+PROFIL: Optional[str] = None
+"""Profile of connections to the database used without option -s
+-- see dbops.PROFILE; `None` for dbops' default."""
+Wywolanie = Callable[[str, List[Any]], Any]
+"""Function calling a function of the API given its name and arguments
+-- see polacz."""
+_polaczenia: Dict[bool, Wywolanie] = {}
+
+
+class Serwer:
+    """Connection to the server, callable as a Wywolanie.
+
+    The transport is negotiated: the client tries the transports
+    acceptable for the requested one, in order -- see KOLEJNOSC, skipping
+    encodings not installed locally, and falls back to the next one when
+    the server does not accept a transport -- see transport.py. Either way
+    one HTTP connection is kept open between calls.
+    """
+
+    KOLEJNOSC = {"auto": ["msgpack", "json", "xmlrpc"],
+                 "msgpack": ["msgpack", "json", "xmlrpc"],
+                 "json": ["json", "xmlrpc"],
+                 "xmlrpc": ["xmlrpc"]}
+
+    def __init__(self, url: str, transport: str = "auto") -> None:
+        from aplikacja import transport as kompaktowy
+        self._kompaktowy = kompaktowy
+        self.url = url
+        self._kandydaci = [t for t in self.KOLEJNOSC[transport]
+                           if t == "xmlrpc" or t in kompaktowy.dostepne()]
+        self._otworz()
+
+    def _otworz(self) -> None:
+        self.transport = self._kandydaci[0]
+        if self.transport == "xmlrpc":
+            self._klient: Any = xmlrpc.client.ServerProxy(self.url,
+                                                          allow_none=True)
+        else:
+            self._klient = self._kompaktowy.Polaczenie(self.url,
+                                                       self.transport)
+
+    def _negocjuj(self, f: Callable[[Any], Any]) -> Any:
+        while True:
+            try:
+                return f(self._klient)
+            except self._kompaktowy.BrakTransportu:
+                if len(self._kandydaci) == 1:
+                    raise
+                self.zamknij()
+                self._kandydaci.pop(0)
+                self._otworz()
+
+    def __call__(self, action: str, action_args: List[Any]) -> Any:
+        if self.transport == "xmlrpc":
+            return getattr(self._klient, action)(*action_args)
+        return self._negocjuj(lambda k: k.wywolaj(action, action_args))
+
+    def wiele(self, wywolania: List[Tuple[str, List[Any]]]) -> List[Any]:
+        """Make many calls by one request -- with XML-RPC, by the server's
+        system.multicall. Returns a list holding, for every call in order,
+        its result or the exception it raised."""
+        if self.transport != "xmlrpc":
+            return self._negocjuj(lambda k: k.wiele(wywolania))
+        paczka = xmlrpc.client.MultiCall(self._klient)
+        for action, action_args in wywolania:
+            getattr(paczka, action)(*action_args)
+        odpowiedzi = paczka()
+        res: List[Any] = []
+        for i in range(len(wywolania)):
+            try:
+                res.append(odpowiedzi[i])
+            except xmlrpc.client.Fault as e:
+                res.append(e)
+        return res
+
+    def zamknij(self) -> None:
+        """Close the connection."""
+        if self.transport == "xmlrpc":
+            self._klient("close")()
+        else:
+            self._klient.zamknij()
+
+
+def polacz(online: Any) -> Wywolanie:
+    """Return a function that calls functions of the API by name.
+
+    Online, calls go through one connection to the server at ADRES_SERWERA
+    using TRANSPORT -- see Serwer; offline, functions of dbops are called
+    with the process-wide engine. The function is created once per
+    process and mode.
+    """
+    online = bool(online)
+    wywolaj = _polaczenia.get(online)
+    if wywolaj is not None:
+        return wywolaj
     if online:
-        server = xmlrpc.client.ServerProxy("http://localhost:8000",
-                                           allow_none=True)
-        return eval("server." + action + "(*action_args)",
-                    globals(), {"server": server, "action_args": action_args})
+        wywolaj = Serwer(ADRES_SERWERA, TRANSPORT)
     else:
-        return eval("dbops.with_engine(dbops." + action + ", *action_args)",
-                    globals(), {"dbops": dbops, "action_args": action_args})
+        import aplikacja.dbops as dbops
+        if PROFIL is not None:
+            dbops.profil = PROFIL
 
+        def wywolaj(action: str, action_args: List[Any]) -> Any:
+            return getattr(dbops, action)(dbops.get_engine(), *action_args)
+    _polaczenia[online] = wywolaj
+    return wywolaj
 
-def main():
-    parser = argparse.ArgumentParser()
-    configure_parser(parser)
-    args = parser.parse_args()
-
-    if args.dodaj_wydarzenie:
-        id = invoke_action("dodaj_wydarzenie", [args.nazwa,
-                                                args.data_rozp, args.godz_rozp,
-                                                args.data_zak, args.godz_zak,
-                                                args.opis], args.s)
-        print(format_id_output("wydarzenie", id))
-    elif args.usun_wydarzenie:
-        invoke_action("usun_wydarzenie", [args.nr_wydarzenia], args.s)
-    elif args.mod_wydarzenie:
-        invoke_action("mod_wydarzenie", [args.nr_wydarzenia, args.nazwa,
-                                         args.data_rozp, args.godz_rozp,
-                                         args.data_zak, args.godz_zak,
-                                         args.opis], args.s)
-    elif args.znajdz_wydarzenie:
-        print_list_output(map(format_wydarzenie_output,
-                              invoke_action("znajdz_wydarzenie",
-                                            [args.nazwa], args.s)))
-    elif args.utworz_miejsce:
-        print(format_id_output("miejsce",
-                               invoke_action("dodaj_miejsce",
-                                             [args.nazwa, args.adres],
-                                             args.s)))
-    elif args.zapomnij_miejsce:
-        invoke_action("usun_miejsce", [args.nr_miejsca], args.s)
-    elif args.mod_miejsce:
-        invoke_action("mod_miejsce", [args.nr_miejsca,
-                                      args.nazwa,
-                                      args.adres],
-                      args.s)
-    elif args.znajdz_miejsce:
-        print_list_output(map(format_miejsce_output,
-                              invoke_action("znajdz_miejsce",
-                                            [args.nazwa], args.s)))
-    elif args.dodaj_miejsce:
-        invoke_action("dodaj_miejsce_do_wydarzenia",
-                      [args.nr_miejsca, args.nr_wydarzenia], args.s)
-    elif args.usun_miejsce:
-        invoke_action("usun_miejsce_z_wydarzenia",
-                      [args.nr_wydarzenia], args.s)
-    elif args.wydarzenia_w:
-        print_list_output(map(format_wydarzenie_output,
-                              invoke_action("znajdz_wydarzenia_w_miejscu",
-                                            [args.nazwa], args.s)))
-    elif args.utworz_osobe:
-        print(format_id_output("osobę",
-                               invoke_action("dodaj_osoba",
-                                             [args.imie, args.email], args.s)))
-    elif args.zapomnij_osobe:
-        invoke_action("usun_osoba", [args.nr_osoby], args.s)
-    elif args.mod_osoba:
-        invoke_action("mod_osoba", [args.nr_osoby,
-                                    args.imie,
-                                    args.email],
-                      args.s)
-    elif args.znajdz_osobe:
-        print_list_output(map(format_osoba_output,
-                              invoke_action("znajdz_osoba",
-                                            [args.imie], args.s)))
-    elif args.zapisz:
-        invoke_action("zapisz", [args.email, args.nr_wydarzenia], args.s)
-    elif args.wypisz:
-        invoke_action("wypisz", [args.email, args.nr_wydarzenia], args.s)
-    elif args.gdzie_idzie:
-        print_list_output(map(format_wydarzenie_output,
-                              invoke_action("znajdz_wydarzenia_osoby",
-                                            [args.email], args.s)))
-    elif args.kto_idzie:
-        print_list_output(map(format_osoba_output,
-                              invoke_action("znajdz_zapisanych_na_wydarzenie",
-                                            [args.nr_wydarzenia], args.s)))
+
+def rozlacz() -> None:
+    """Close the connections opened by polacz."""
+    for wywolaj in _polaczenia.values():
+        if isinstance(wywolaj, Serwer):
+            wywolaj.zamknij()
+    _polaczenia.clear()
+
+
+def invoke_action(action: Any, action_args: Any, online: Any) -> Any:
+    """Call the function of the API with the given name -- see polacz."""
+    return polacz(online)(action, list(action_args))
+
+
+def _wypisz_id(tbl: str) -> Callable[[int], None]:
+    """Return a function printing the ID of an added entity
+    -- see format_id_output."""
+    return lambda id: print(format_id_output(tbl, id))
+
+
+def _wypisz_liste(f: Callable[[Any], str]) -> Callable[[Iterable[Any]], None]:
+    """Return a function printing a list of results formatted by f."""
+    return lambda xs: print_list_output(map(f, xs))
+
+
+def _wypisz_kolizje(kolizje: Iterable[dbops.AnsDict]) -> None:
+    """Print a warning for each conflicting event
+    -- see format_kolizja_output."""
+    for kolizja in kolizje:
+        print(format_kolizja_output(kolizja))
+
+
+def _nic(wynik: Any) -> None:
+    """Print nothing; for actions that return nothing."""
+    pass
+
+
+AKCJE: Dict[str, Tuple[str, Callable[[argparse.Namespace], List[Any]],
+                       Callable[[Any], None], bool]] = {
+    "dodaj_wydarzenie":
+    ("dodaj_wydarzenie",
+     lambda a: [a.nazwa, a.data_rozp, a.godz_rozp,
+                a.data_zak, a.godz_zak, a.opis],
+     _wypisz_id("wydarzenie"), False),
+    "usun_wydarzenie":
+    ("usun_wydarzenie", lambda a: [a.nr_wydarzenia], _nic, False),
+    "mod_wydarzenie":
+    ("mod_wydarzenie",
+     lambda a: [a.nr_wydarzenia, a.nazwa, a.data_rozp, a.godz_rozp,
+                a.data_zak, a.godz_zak, a.opis],
+     _nic, False),
+    "znajdz_wydarzenie":
+    ("znajdz_wydarzenie", lambda a: [a.nazwa],
+     _wypisz_liste(format_wydarzenie_output), True),
+    "wydarzenia_miedzy":
+    ("znajdz_wydarzenia_w_przedziale", lambda a: [a.od, a.do],
+     _wypisz_liste(format_wydarzenie_output), True),
+    "utworz_miejsce":
+    ("dodaj_miejsce", lambda a: [a.nazwa, a.adres],
+     _wypisz_id("miejsce"), False),
+    "zapomnij_miejsce":
+    ("usun_miejsce", lambda a: [a.nr_miejsca], _nic, False),
+    "mod_miejsce":
+    ("mod_miejsce", lambda a: [a.nr_miejsca, a.nazwa, a.adres],
+     _nic, False),
+    "znajdz_miejsce":
+    ("znajdz_miejsce", lambda a: [a.nazwa],
+     _wypisz_liste(format_miejsce_output), True),
+    "dodaj_miejsce":
+    ("dodaj_miejsce_do_wydarzenia",
+     lambda a: [a.nr_miejsca, a.nr_wydarzenia, a.konflikty],
+     _wypisz_kolizje, False),
+    "usun_miejsce":
+    ("usun_miejsce_z_wydarzenia", lambda a: [a.nr_wydarzenia],
+     _nic, False),
+    "wydarzenia_w":
+    ("znajdz_wydarzenia_w_miejscu", lambda a: [a.nazwa],
+     _wypisz_liste(format_wydarzenie_output), True),
+    "wolne_terminy":
+    ("wolne_terminy",
+     lambda a: [a.nr_miejsca, a.od, a.do,
+                int(a.dlugosc) if a.dlugosc is not None else 0],
+     _wypisz_liste(format_termin_output), False),
+    "utworz_osobe":
+    ("dodaj_osoba", lambda a: [a.imie, a.email], _wypisz_id("osobę"),
+     False),
+    "zapomnij_osobe":
+    ("usun_osoba", lambda a: [a.nr_osoby], _nic, False),
+    "mod_osoba":
+    ("mod_osoba", lambda a: [a.nr_osoby, a.imie, a.email], _nic, False),
+    "znajdz_osobe":
+    ("znajdz_osoba", lambda a: [a.imie],
+     _wypisz_liste(format_osoba_output), True),
+    "limit_miejsc":
+    ("ustaw_limit_miejsc",
+     lambda a: [a.nr_wydarzenia, int(a.ile) if a.ile is not None else None],
+     _nic, False),
+    "zapisz":
+    ("zapisz", lambda a: [a.email, a.nr_wydarzenia], _nic, False),
+    "wypisz":
+    ("wypisz", lambda a: [a.email, a.nr_wydarzenia], _nic, False),
+    "gdzie_idzie":
+    ("znajdz_wydarzenia_osoby", lambda a: [a.email],
+     _wypisz_liste(format_wydarzenie_output), True),
+    "kto_idzie":
+    ("znajdz_zapisanych_na_wydarzenie", lambda a: [a.nr_wydarzenia],
+     _wypisz_liste(format_osoba_output), True),
+    "wspolny_czas":
+    ("wspolny_wolny_czas",
+     lambda a: [[e.strip() for e in a.email.split(",") if e.strip()],
+                a.od, a.do, int(a.dlugosc) if a.dlugosc is not None else 0,
+                int(a.strona) if a.strona is not None else None],
+     _wypisz_liste(format_wolny_czas_output), False),
+    "szukaj":
+    ("szukaj",
+     lambda a: [a.tekst] + ([int(a.strona)] if a.strona is not None
+                            else []),
+     _wypisz_liste(format_trafienie_output), False),
+    "powtarzaj":
+    ("ustaw_powtarzanie",
+     lambda a: [a.nr_wydarzenia, a.czestotliwosc,
+                int(a.co) if a.co is not None else 1,
+                int(a.ile) if a.ile is not None else None, a.do],
+     _nic, False),
+    "odwolaj":
+    ("odwolaj_wystapienie", lambda a: [a.nr_wydarzenia, a.wystapienie],
+     _nic, False),
+    "mod_wystapienie":
+    ("mod_wystapienie",
+     lambda a: [a.nr_wydarzenia, a.wystapienie, a.nazwa, a.data_rozp,
+                a.godz_rozp, a.data_zak, a.godz_zak, a.opis],
+     _wypisz_id("wydarzenie"), False)}
+"""Actions of the command line that make a single call, by attribute
+name of the parsed arguments, with: the API name of the called function,
+a function returning its arguments, a function printing its result,
+and whether it returns a list -- see wyniki. Actions not listed here
+are handled by wykonaj."""
+
+
+def akcja(args: argparse.Namespace) -> Optional[str]:
+    """Return the attribute name of the action chosen in args,
+    or `None` if no action was chosen."""
+    for nazwa, wartosc in vars(args).items():
+        if wartosc is True and (nazwa in AKCJE
+                                or nazwa in ("dodaj_wiele", "importuj",
+                                             "eksport", "polecenia")):
+            return nazwa
+    return None
+
+
+def przygotuj(args: argparse.Namespace
+              ) -> Optional[Tuple[str, List[Any], Callable[[Any], None]]]:
+    """Return the call made by the action chosen in args, if it consists
+    of exactly one call: its function's API name, its arguments
+    and a function printing its result. Returns `None` otherwise."""
+    nazwa = akcja(args)
+    if nazwa is None:
+        return "utworz", [], _nic
+    if nazwa not in AKCJE:
+        return None
+    api, argumenty, wypisz, lista = AKCJE[nazwa]
+    action_args = argumenty(args)
+    if lista:
+        if args.strumien:
+            return None
+        action_args += [int(args.strona) if args.strona is not None
+                        else None,
+                        int(args.po_nr) if args.po_nr is not None else None]
+    return api, action_args, wypisz
+
+
+def wykonaj(args: argparse.Namespace, online: Any) -> None:
+    """Perform the action chosen in parsed arguments of the command line.
+    """
+    wywolanie = przygotuj(args)
+    if wywolanie is not None:
+        api, action_args, wypisz = wywolanie
+        wypisz(invoke_action(api, action_args, online))
+        return
+    nazwa = akcja(args)
+    if nazwa == "dodaj_wiele":
+        wsad = wczytaj_wsad(args.plik)
+        paczka = int(args.paczka) if args.paczka is not None else None
+        for klucz, akcja_wsadu in WSADY:
+            if klucz in wsad:
+                print(format_wsad_output(klucz,
+                                         invoke_action(akcja_wsadu,
+                                                       [wsad[klucz],
+                                                        args.scisle,
+                                                        paczka],
+                                                       online)))
+    elif nazwa == "importuj":
+        from aplikacja import wymiana
+        paczka = (int(args.paczka) if args.paczka is not None
+                  else wymiana.PACZKA)
+        print(format_import_output(wymiana.importuj(
+            polacz(online), args.plik, paczka,
+            zglos=lambda nr, blad: print("linia {0}: {1}".format(nr,
+                                                                 blad)))))
+    elif nazwa == "eksport":
+        eksportuj(args, online)
+    elif nazwa == "polecenia":
+        raise ValueError("Polecenia nie mogą wywoływać --polecenia.")
+    else:
+        api, argumenty, wypisz, _ = AKCJE[str(nazwa)]
+        wypisz(wyniki(api, argumenty(args), args))
+
+
+def eksportuj(args: argparse.Namespace, online: Any) -> None:
+    """Write the iCalendar feed chosen in parsed arguments of the command
+    line to the file args.plik, or to the standard output if it is `None`.
+
+    Online, the feed is copied from the server as it arrives -- see
+    serwer.ObslugaZapytan.eksport; offline, it is generated from
+    dbops.eksport.
+    """
+    from aplikacja import wymiana
+    wyjscie = (open(args.plik, "wb") if args.plik is not None
+               else sys.stdout.buffer)
+    try:
+        if online:
+            import shutil
+            import urllib.error
+            import urllib.parse
+            import urllib.request
+            parametry = {k: v for k, v in [
+                ("email", args.email), ("miejsce", args.nr_miejsca),
+                ("od", args.od), ("do", args.do)] if v is not None}
+            try:
+                with urllib.request.urlopen(
+                        ADRES_SERWERA + wymiana.SCIEZKA_EKSPORTU + "?"
+                        + urllib.parse.urlencode(parametry)) as odp:
+                    shutil.copyfileobj(odp, wyjscie)
+            except urllib.error.HTTPError as e:
+                raise ValueError(e.read().decode("utf-8", "replace"))
+        else:
+            wydarzenia = polacz(False)("eksport", [
+                args.email,
+                int(args.nr_miejsca) if args.nr_miejsca is not None
+                else None, args.od, args.do])
+            for kawalek in wymiana.ics(wydarzenia):
+                wyjscie.write(kawalek.encode("utf-8"))
+    finally:
+        if args.plik is not None:
+            wyjscie.close()
+        else:
+            wyjscie.flush()
+
+
+PACZKA_POLECEN = 100
+"""Maximum number of commands sent by one system.multicall call
+-- see wykonaj_polecenia."""
+ZACHETA = "kalendarz> "
+"""Prompt shown when commands are read from a terminal."""
+
+
+def wczytaj_polecenia(plik: Optional[str]) -> Iterator[str]:
+    """Yield commands read from a file, or from the standard input
+    if plik is `None`, one per line; with a prompt if the standard input
+    is a terminal. Empty lines and lines starting with # are skipped."""
+    if plik is not None:
+        with open(plik, "r", encoding="utf-8") as f:
+            linie: Iterable[str] = list(f)
+    elif sys.stdin.isatty():
+        def konsola() -> Iterator[str]:
+            while True:
+                try:
+                    yield input(ZACHETA)
+                except EOFError:
+                    print()
+                    return
+        linie = konsola()
+    else:
+        linie = sys.stdin
+    for linia in linie:
+        linia = linia.strip()
+        if linia and not linia.startswith("#"):
+            yield linia
+
+
+def wykonaj_polecenia(polecenia: Iterable[str],
+                      parser: argparse.ArgumentParser, online: Any,
+                      multicall: bool = False) -> int:
+    """Perform commands given in the syntax of the command line,
+    without the program's name, and return the number of commands
+    that failed.
+
+    Commands are performed over one connection -- see polacz, in the mode
+    given by online, whatever their option -s. Errors are reported
+    on the standard error, and do not stop the following commands.
+
+    Keyword arguments:
+    multicall -- set to `True` iff consecutive commands that make
+    a single call each should be sent together, PACZKA_POLECEN at a time,
+    by one request -- see Serwer.wiele. Their output is then printed
+    when the whole group is done.
+    """
+    bledy = 0
+    oczekujace: List[Tuple[int, str, List[Any], Callable[[Any], None]]] = []
+    wiele = getattr(polacz(online), "wiele", None) if multicall else None
+
+    def zglos(nr: int, blad: BaseException) -> None:
+        nonlocal bledy
+        bledy += 1
+        opis = (blad.faultString if isinstance(blad, xmlrpc.client.Fault)
+                else blad)
+        print("Błąd w poleceniu nr {0}: {1}".format(nr, opis),
+              file=sys.stderr)
+
+    def wyslij() -> None:
+        if not oczekujace or wiele is None:
+            return
+        try:
+            odpowiedzi = wiele([(api, action_args)
+                                for _, api, action_args, _ in oczekujace])
+        except Exception as e:
+            odpowiedzi = [e] * len(oczekujace)
+        for (nr, _, _, wypisz), wynik in zip(oczekujace, odpowiedzi):
+            try:
+                if isinstance(wynik, Exception):
+                    raise wynik
+                wypisz(wynik)
+            except Exception as e:
+                zglos(nr, e)
+        oczekujace.clear()
+
+    for nr, polecenie in enumerate(polecenia, 1):
+        try:
+            args = parser.parse_args(shlex.split(polecenie))
+            args.s = online
+            wywolanie = przygotuj(args) if wiele is not None else None
+            if wywolanie is None:
+                wyslij()
+                wykonaj(args, online)
+                continue
+            api, action_args, wypisz = wywolanie
+            oczekujace.append((nr, api, action_args, wypisz))
+            if len(oczekujace) >= PACZKA_POLECEN:
+                wyslij()
+        except SystemExit as e:
+            bledy += bool(e.code)
+        except Exception as e:
+            zglos(nr, e)
+    wyslij()
+    return bledy
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    global TRANSPORT, PROFIL
+    parser = zbuduj_parser()
+    args = parser.parse_args(argv)
+    if args.transport is not None:
+        if args.transport not in Serwer.KOLEJNOSC:
+            parser.error("Nieznany transport: {0}.".format(args.transport))
+        TRANSPORT = args.transport
+    if args.profil is not None and not args.s:
+        import aplikacja.dbops as dbops
+        if args.profil not in dbops.PROFILE:
+            parser.error("Nieznany profil: {0}.".format(args.profil))
+        PROFIL = args.profil
+    if args.polecenia:
+        bledy = wykonaj_polecenia(wczytaj_polecenia(args.plik), parser,
+                                  args.s, args.multicall)
+        rozlacz()
+        if bledy:
+            sys.exit(1)
     else:
-        invoke_action("utworz", [], args.s)
+        wykonaj(args, args.s)
 
 
 if __name__ == "__main__":
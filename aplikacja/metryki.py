@@ -0,0 +1,158 @@
+"""Instrumentation of the server's methods: call and error counts,
+latency histograms, and numbers and durations of SQL statements
+executed by each method, counted with SQLAlchemy's engine events.
+
+In mode procesy every worker process keeps its own metrics.
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from sqlalchemy import Engine, event
+from typing import Callable, Any, Dict, List, Optional
+
+
+PROGI = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+         0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+"""Upper bounds, in seconds, of the buckets of latency histograms;
+the last bucket is unbounded."""
+
+
+class Metryki:
+    """Metrics of the calls of the server's methods.
+
+    While it exists, the statements executed by every engine are counted
+    and attributed to the method being called in the executing thread,
+    or context -- see mierz. Call zamknij to stop counting.
+    """
+
+    def __init__(self) -> None:
+        self._metody: Dict[str, Dict[str, Any]] = {}
+        self._blokada = threading.Lock()
+        self._biezace: "contextvars.ContextVar[Optional[List[Any]]]" = \
+            contextvars.ContextVar("metryki_sql", default=None)
+        event.listen(Engine, "before_cursor_execute", self._przed_sql)
+        event.listen(Engine, "after_cursor_execute", self._po_sql)
+
+    def zamknij(self) -> None:
+        """Stop counting SQL statements."""
+        event.remove(Engine, "before_cursor_execute", self._przed_sql)
+        event.remove(Engine, "after_cursor_execute", self._po_sql)
+
+    def _przed_sql(self, conn: Any, *args: Any) -> None:
+        if self._biezace.get() is not None:
+            conn.info.setdefault("metryki_start", []).append(
+                time.perf_counter())
+
+    def _po_sql(self, conn: Any, *args: Any) -> None:
+        sql = self._biezace.get()
+        starty = conn.info.get("metryki_start")
+        if sql is not None and starty:
+            sql[0] += 1
+            sql[1] += time.perf_counter() - starty.pop()
+
+    def mierz(self, f: Callable[..., Any], name: str) -> Callable[..., Any]:
+        """Return f, the server's method with the given name,
+        wrapped so that its calls are measured."""
+        def res(*args: Any) -> Any:
+            sql: List[Any] = [0, 0.0]
+            znacznik = self._biezace.set(sql)
+            blad = False
+            start = time.perf_counter()
+            try:
+                return f(*args)
+            except BaseException:
+                blad = True
+                raise
+            finally:
+                self._biezace.reset(znacznik)
+                self._zapisz(name, time.perf_counter() - start, blad, sql)
+        return res
+
+    def _zapisz(self, name: str, czas: float, blad: bool,
+                sql: List[Any]) -> None:
+        with self._blokada:
+            m = self._metody.get(name)
+            if m is None:
+                m = {"wywolania": 0, "bledy": 0, "czas": 0.0,
+                     "kubelki": [0] * (len(PROGI) + 1),
+                     "zapytania_sql": 0, "czas_sql": 0.0}
+                self._metody[name] = m
+            m["wywolania"] += 1
+            m["bledy"] += blad
+            m["czas"] += czas
+            m["kubelki"][bisect.bisect_left(PROGI, czas)] += 1
+            m["zapytania_sql"] += sql[0]
+            m["czas_sql"] += sql[1]
+
+    def stan(self) -> Dict[str, Dict[str, Any]]:
+        """Return the metrics of the methods called so far, by name.
+
+        The metrics of a method are a dictionary with fields:
+        wywolania, bledy -- numbers of calls and of calls that failed.
+        czas -- total duration of the calls, in seconds.
+        histogram -- dictionary mapping the upper bounds of PROGI,
+        as strings, and "+Inf" to the numbers of calls that lasted
+        at most that long.
+        zapytania_sql, czas_sql -- number and total duration
+        of the SQL statements executed by the calls.
+        """
+        with self._blokada:
+            res = {}
+            for name, m in self._metody.items():
+                narastajaco = 0
+                histogram = {}
+                for prog, n in zip(PROGI + [float("inf")], m["kubelki"]):
+                    narastajaco += n
+                    histogram[_prog(prog)] = narastajaco
+                res[name] = {"wywolania": m["wywolania"],
+                             "bledy": m["bledy"], "czas": m["czas"],
+                             "histogram": histogram,
+                             "zapytania_sql": m["zapytania_sql"],
+                             "czas_sql": m["czas_sql"]}
+            return res
+
+    def prometheus(self) -> str:
+        """Return the metrics in Prometheus' text exposition format."""
+        stan = self.stan()
+        pid = os.getpid()
+        linie = []
+
+        def metryka(nazwa: str, typ: str, opis: str,
+                    wartosci: Callable[[str, Dict[str, Any]], List[str]]
+                    ) -> None:
+            linie.append("# HELP {0} {1}".format(nazwa, opis))
+            linie.append("# TYPE {0} {1}".format(nazwa, typ))
+            for name in sorted(stan):
+                linie.extend(wartosci('metoda="{0}",pid="{1}"'.format(
+                    name, pid), stan[name]))
+
+        def licznik(nazwa: str, pole: str, opis: str) -> None:
+            metryka(nazwa, "counter", opis, lambda etykiety, m: [
+                "{0}{{{1}}} {2}".format(nazwa, etykiety, m[pole])])
+
+        licznik("kalendarz_rpc_wywolania_total", "wywolania",
+                "Liczba wywołań metody.")
+        licznik("kalendarz_rpc_bledy_total", "bledy",
+                "Liczba wywołań metody zakończonych błędem.")
+        metryka("kalendarz_rpc_czas_sekundy", "histogram",
+                "Czas wykonania metody.", lambda etykiety, m: [
+                    'kalendarz_rpc_czas_sekundy_bucket{{{0},le="{1}"}} {2}'
+                    .format(etykiety, prog, n)
+                    for prog, n in m["histogram"].items()] + [
+                    "kalendarz_rpc_czas_sekundy_sum{{{0}}} {1}"
+                    .format(etykiety, m["czas"]),
+                    "kalendarz_rpc_czas_sekundy_count{{{0}}} {1}"
+                    .format(etykiety, m["wywolania"])])
+        licznik("kalendarz_sql_zapytania_total", "zapytania_sql",
+                "Liczba poleceń SQL wykonanych przez metodę.")
+        licznik("kalendarz_sql_czas_sekundy_total", "czas_sql",
+                "Łączny czas poleceń SQL wykonanych przez metodę.")
+        return "\n".join(linie) + "\n"
+
+
+def _prog(prog: float) -> str:
+    """Return the label of a bucket's upper bound."""
+    return "+Inf" if prog == float("inf") else repr(prog)
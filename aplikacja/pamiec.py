@@ -0,0 +1,325 @@
+"""In-process LRU cache of results of the lookup functions of dbops,
+used by the server when started with option --pamiec.
+
+Every cached result is labelled with tags -- pairs (kind, value) naming
+the data it was computed from, e.g. ("wydarzenie", 5) for the event
+with ID 5 or ("email", "a@b.pl") for the person with that address.
+Tags of a result are derived from its arguments and its rows -- see
+ODCZYTY. Every function that modifies the database names the tags it
+may affect -- see ZAPISY -- and the results labelled with any of them
+are dropped once the function returns, or, if it ran in a transaction
+left open for its caller, once the caller commits it -- see odlozone.
+"""
+
+import aplikacja.dbops as dbops
+import threading
+from collections import OrderedDict
+from sqlalchemy import Connection, select
+from typing import Callable, Any, Dict, Iterable, List, Optional, \
+    Sequence, Set, Tuple
+
+
+Tag = Tuple[str, Any]
+Klucz = Tuple[str, Tuple[Any, ...]]
+ODLOZONE = "pamiec.odlozone"
+"""Key of Connection.info under which invalidations wait
+for the connection's transaction to be committed -- see odlozone."""
+
+
+class Pamiec:
+    """Least-recently-used cache bounded by the number of entries
+    and by their total size.
+
+    The size of an entry is approximated by the length of the repr
+    of its value. All methods are thread-safe.
+    """
+
+    def __init__(self, wpisy: int, bajty: int) -> None:
+        self.max_wpisy = wpisy
+        self.max_bajty = bajty
+        self._wpisy: "OrderedDict[Klucz, Tuple[Any, int, Set[Tag]]]" \
+            = OrderedDict()
+        self._indeks: Dict[Tag, Set[Klucz]] = {}
+        self._blokada = threading.Lock()
+        self._bajty = 0
+        self._pokolenie = 0
+        self.trafienia = 0
+        self.chybienia = 0
+        self.wyeksmitowane = 0
+        self.uniewaznione = 0
+
+    def pobierz(self, klucz: Klucz) -> Tuple[bool, Any]:
+        """Return (True, value) if klucz is cached, (False, None)
+        otherwise."""
+        with self._blokada:
+            wpis = self._wpisy.get(klucz)
+            if wpis is None:
+                self.chybienia += 1
+                return False, None
+            self._wpisy.move_to_end(klucz)
+            self.trafienia += 1
+            return True, wpis[0]
+
+    def pokolenie(self) -> int:
+        """Return the number of invalidations so far -- see wstaw."""
+        with self._blokada:
+            return self._pokolenie
+
+    def wstaw(self, klucz: Klucz, wartosc: Any, tagi: Iterable[Tag],
+              pokolenie: int) -> None:
+        """Cache a value labelled with the given tags,
+        evicting least recently used entries if needed.
+
+        The value is not cached if some entries were invalidated since
+        pokolenie was read, as it might have been computed from data
+        modified in the meantime, or if it alone exceeds the size bound.
+        """
+        rozmiar = len(repr(wartosc))
+        with self._blokada:
+            if pokolenie != self._pokolenie or rozmiar > self.max_bajty:
+                return
+            self._usun(klucz)
+            tagi = set(tagi)
+            self._wpisy[klucz] = (wartosc, rozmiar, tagi)
+            self._bajty += rozmiar
+            for tag in tagi:
+                self._indeks.setdefault(tag, set()).add(klucz)
+            while (len(self._wpisy) > self.max_wpisy
+                   or self._bajty > self.max_bajty):
+                self._usun(next(iter(self._wpisy)))
+                self.wyeksmitowane += 1
+
+    def uniewaznij(self, tagi: Optional[Iterable[Tag]]) -> None:
+        """Drop the entries labelled with any of the given tags;
+        all entries if tagi is `None`."""
+        with self._blokada:
+            self._pokolenie += 1
+            if tagi is None:
+                klucze = set(self._wpisy)
+            else:
+                klucze = set()
+                for tag in tagi:
+                    klucze |= self._indeks.get(tag, set())
+            for klucz in klucze:
+                self._usun(klucz)
+            self.uniewaznione += len(klucze)
+
+    def _usun(self, klucz: Klucz) -> None:
+        wpis = self._wpisy.pop(klucz, None)
+        if wpis is None:
+            return
+        self._bajty -= wpis[1]
+        for tag in wpis[2]:
+            klucze = self._indeks[tag]
+            klucze.discard(klucz)
+            if not klucze:
+                del self._indeks[tag]
+
+    def stan(self) -> Dict[str, int]:
+        """Return the number and total size of the entries,
+        and the numbers of hits, misses, evictions and invalidations."""
+        with self._blokada:
+            return {"wpisy": len(self._wpisy), "bajty": self._bajty,
+                    "trafienia": self.trafienia,
+                    "chybienia": self.chybienia,
+                    "wyeksmitowane": self.wyeksmitowane,
+                    "uniewaznione": self.uniewaznione}
+
+
+def _tagi_wydarzen(wynik: List[dbops.AnsDict]) -> List[Tag]:
+    """Return the tags of events listed in the format of
+    dict_of_wydarzenie, or with fields id and nazwa."""
+    return ([("wydarzenie", w["id"]) for w in wynik]
+            + [("zapisy", w["id"]) for w in wynik if "pelne" in w]
+            + [("nazwa_miejsca", w["nazwa_miejsca"]) for w in wynik
+               if w.get("nazwa_miejsca") is not None])
+
+
+ODCZYTY: Dict[str, Callable[[Sequence[Any], Any], List[Tag]]] = {
+    "znajdz_wydarzenie":
+    lambda args, wynik: ([("nazwa_wydarzenia", args[0])]
+                         + _tagi_wydarzen(wynik)),
+    "znajdz_wydarzenia_w_przedziale":
+    lambda args, wynik: [("przedzial", None)] + _tagi_wydarzen(wynik),
+    "znajdz_miejsce":
+    lambda args, wynik: [("nazwa_miejsca", args[0])],
+    "znajdz_wydarzenia_w_miejscu":
+    lambda args, wynik: ([("nazwa_miejsca", args[0])]
+                         + _tagi_wydarzen(wynik)),
+    "znajdz_osoba":
+    lambda args, wynik: [("imie", args[0])],
+    "znajdz_wydarzenia_osoby":
+    lambda args, wynik: [("email", args[0])] + _tagi_wydarzen(wynik),
+    "znajdz_zapisanych_na_wydarzenie":
+    lambda args, wynik: ([("uczestnicy", args[0]),
+                          ("wydarzenie", args[0])]
+                         + [("email", o["email"]) for o in wynik])}
+"""Cached functions, by API name, with functions returning
+the tags of a result given the call's arguments and the result."""
+
+
+def _nazwy_miejsc(engine: dbops.Lacze, ids: Iterable[Any]) -> List[Tag]:
+    """Return the tags of the names of locations with given IDs."""
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return []
+    m = dbops.Miejsce
+    with dbops.polaczenie(engine) as conn:
+        return [("nazwa_miejsca", n)
+                for n in conn.scalars(select(m.nazwa).where(m.id.in_(ids)))]
+
+
+def _dane_osoby(engine: dbops.Lacze, id_osoby: Any,
+                wydarzenia: bool = False) -> List[Tag]:
+    """Return the tags of the name and email of the person with given ID,
+    and optionally of the events that the person participates in."""
+    o = dbops.Osoba
+    u = dbops.uczestnictwa
+    with dbops.polaczenie(engine) as conn:
+        wiersz = conn.execute(select(o.imie, o.email)
+                              .where(o.id == id_osoby)).first()
+        if wiersz is None:
+            return []
+        res: List[Tag] = [("imie", wiersz.imie), ("email", wiersz.email)]
+        if wydarzenia:
+            res += [("zapisy", i) for i in conn.scalars(
+                select(u.c.wydarzenie_id).where(u.c.osoba_id == id_osoby))]
+    return res
+
+
+def _zmiana(**pola: Any) -> List[Tag]:
+    """Return the tags of the given values that are not `None`."""
+    return [(k, v) for k, v in pola.items() if v is not None]
+
+
+def _wydarzenie(args: Sequence[Any]) -> List[Tag]:
+    """Tags affected by mod_wydarzenie."""
+    res = [("wydarzenie", args[0])] + _zmiana(nazwa_wydarzenia=args[1])
+    if any(x is not None for x in args[2:6]):
+        res.append(("przedzial", None))
+    return res
+
+
+def _rekordy(args: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Return the records of a batch function's call
+    -- see dbops.dodaj_wydarzenia, skipping malformed ones."""
+    return [r for r in args[0] if isinstance(r, dict)]
+
+
+def _zapisy(rekordy: List[Dict[str, Any]]) -> List[Tag]:
+    """Tags affected by sign-ups -- see dbops.zapisz_wiele."""
+    return [t for r in rekordy
+            for t in [("email", r.get("email")),
+                      ("uczestnicy", r.get("id_wydarzenia")),
+                      ("zapisy", r.get("id_wydarzenia"))]]
+
+
+ZAPISY: Dict[str, Callable[[dbops.Lacze, Sequence[Any]],
+                           Optional[List[Tag]]]] = {
+    "utworz": lambda engine, args: None,
+    "dodaj_wydarzenie":
+    lambda engine, args: [("nazwa_wydarzenia", args[0]),
+                          ("przedzial", None)],
+    "dodaj_wydarzenia":
+    lambda engine, args: ([("nazwa_wydarzenia", r.get("nazwa"))
+                           for r in _rekordy(args)] + [("przedzial", None)]
+                          + _nazwy_miejsc(engine, [r.get("id_miejsca")
+                                                   for r in _rekordy(args)])),
+    "usun_wydarzenie": lambda engine, args: [("wydarzenie", args[0])],
+    "mod_wydarzenie": lambda engine, args: _wydarzenie(args),
+    "dodaj_miejsce": lambda engine, args: [("nazwa_miejsca", args[0])],
+    "dodaj_miejsca":
+    lambda engine, args: [("nazwa_miejsca", r.get("nazwa"))
+                          for r in _rekordy(args)],
+    "usun_miejsce": lambda engine, args: _nazwy_miejsc(engine, args[:1]),
+    "mod_miejsce":
+    lambda engine, args: (_nazwy_miejsc(engine, args[:1])
+                          + _zmiana(nazwa_miejsca=args[1])),
+    "dodaj_miejsce_do_wydarzenia":
+    lambda engine, args: ([("wydarzenie", args[1])]
+                          + _nazwy_miejsc(engine, args[:1])),
+    "usun_miejsce_z_wydarzenia":
+    lambda engine, args: [("wydarzenie", args[0])],
+    "dodaj_osoba":
+    lambda engine, args: [("imie", args[0]), ("email", args[1])],
+    "dodaj_osoby":
+    lambda engine, args: [t for r in _rekordy(args)
+                          for t in [("imie", r.get("imie")),
+                                    ("email", r.get("email"))]],
+    "usun_osoba":
+    lambda engine, args: _dane_osoby(engine, args[0], wydarzenia=True),
+    "mod_osoba":
+    lambda engine, args: (_dane_osoby(engine, args[0])
+                          + _zmiana(imie=args[1], email=args[2])),
+    "zapisz":
+    lambda engine, args: [("email", args[0]), ("uczestnicy", args[1]),
+                          ("zapisy", args[1])],
+    "zapisz_wiele": lambda engine, args: _zapisy(_rekordy(args)),
+    "wypisz":
+    lambda engine, args: [("email", args[0]), ("uczestnicy", args[1]),
+                          ("zapisy", args[1])],
+    "importuj": lambda engine, args: None,
+    "ustaw_powtarzanie":
+    lambda engine, args: [("wydarzenie", args[0]), ("przedzial", None)],
+    "odwolaj_wystapienie":
+    lambda engine, args: [("wydarzenie", args[0]), ("przedzial", None)],
+    "mod_wystapienie": lambda engine, args: None,
+    "ustaw_limit_miejsc": lambda engine, args: [("zapisy", args[0])]}
+"""Functions that modify the database, by API name, with functions
+returning the tags they may affect, or `None` for all tags, given
+the engine and the call's arguments. They are called before
+the modification, so that they can read the data it replaces."""
+
+
+def z_pamiecia(pamiec: Pamiec, f: Callable[..., Any],
+               name: str) -> Callable[..., Any]:
+    """Return f, a dbops function with API name name, wrapped so that
+    its results are cached in pamiec or invalidate the cached results,
+    according to ODCZYTY and ZAPISY. Other functions are returned
+    unchanged."""
+    if name in ODCZYTY:
+        tagi_odczytu = ODCZYTY[name]
+
+        def odczyt(engine: dbops.Lacze, *args: Any) -> Any:
+            klucz = (name, args)
+            jest, wynik = pamiec.pobierz(klucz)
+            if jest:
+                return wynik
+            pokolenie = pamiec.pokolenie()
+            wynik = f(engine, *args)
+            pamiec.wstaw(klucz, wynik, tagi_odczytu(args, wynik), pokolenie)
+            return wynik
+        return odczyt
+    if name in ZAPISY:
+        tagi_zapisu = ZAPISY[name]
+
+        def zapis(engine: dbops.Lacze, *args: Any) -> Any:
+            tagi = tagi_zapisu(engine, args)
+            try:
+                return f(engine, *args)
+            finally:
+                if (isinstance(engine, Connection)
+                        and engine.in_transaction()):
+                    engine.info.setdefault(ODLOZONE, []).append(
+                        (pamiec, tagi))
+                else:
+                    pamiec.uniewaznij(tagi)
+        return zapis
+    return f
+
+
+def odlozone(conn: Connection) -> Callable[[], None]:
+    """Remove the invalidations that functions wrapped by z_pamiecia
+    left on a connection, because they ran in its transaction,
+    and return a function performing them.
+
+    Call it after committing or rolling back the transaction: entries
+    invalidated before the commit could be cached again, with the data
+    from before it, by a lookup running in the meantime.
+    """
+    czekajace = conn.info.pop(ODLOZONE, [])
+
+    def uniewaznij() -> None:
+        for pamiec, tagi in czekajace:
+            pamiec.uniewaznij(tagi)
+    return uniewaznij
@@ -1,49 +1,557 @@
 """Server script that exposes XMLRPC API for functions
-found in dbops.py on localhost, port 8000. Once started, serves forever.
-Quit by keyboard interrupt.
+found in dbops.py, by default on localhost, port 8000. Once started,
+serves forever. Quit by keyboard interrupt. Run with -h for help.
+
+Modes of operation (option --tryb):
+prosty -- a single thread handles one request at a time.
+watki -- requests are handled by a bounded pool of worker threads.
+procesy -- pre-forked worker processes share the listening socket.
+
+In the last two modes functions that modify the database are serialized
+by a lock, so that concurrent writers never compete for SQLite's lock,
+and connections are kept open between requests -- see ObslugaPolaczen.
+
+With option --pamiec, results of lookups are cached in the server's
+process -- see pamiec.py. Not available in mode procesy.
+
+The same methods are also exposed over JSON-RPC, with JSON or msgpack
+bodies, at path /jsonrpc -- see transport.py.
+
+Calls of every method are measured -- see metryki.py, unless the server
+is started with option --bez-metryk. The metrics are returned by method
+metryki_serwera and, with option --prometheus, served in Prometheus'
+text format at path /metrics of the same port.
+
+Connections to the database use the SQLite profile chosen with option
+--profil -- see dbops.PROFILE. Between requests the server periodically
+checkpoints the write-ahead log and optimizes the database
+-- see Konserwacja and option --konserwacja.
+
+serwer_async.py is an alternative server with the same methods, serving
+every connection by a coroutine of an asyncio event loop.
 """
 
 import aplikacja.dbops as dbops
-from xmlrpc.server import SimpleXMLRPCServer
-from typing import Callable, Any
+import aplikacja.metryki as metryki
+import aplikacja.pamiec as pamiec
+import aplikacja.transport as transport
+import aplikacja.wymiana as wymiana
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import urllib.parse
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from typing import Callable, Any, Dict, List, Optional, Tuple
+
 
+FUNKCJE: List[Tuple[Callable[..., Any], str]] \
+    = [(dbops.utworz, "utworz"),
+       (dbops.dodaj_wydarzenie, "dodaj_wydarzenie"),
+       (dbops.dodaj_wydarzenia, "dodaj_wydarzenia"),
+       (dbops.usun_wydarzenie, "usun_wydarzenie"),
+       (dbops.mod_wydarzenie, "mod_wydarzenie"),
+       (dbops.znajdz_wydarzenie, "znajdz_wydarzenie"),
+       (dbops.znajdz_wydarzenia_w_przedziale,
+        "znajdz_wydarzenia_w_przedziale"),
+       (dbops.dodaj_miejsce, "dodaj_miejsce"),
+       (dbops.dodaj_miejsca, "dodaj_miejsca"),
+       (dbops.usun_miejsce, "usun_miejsce"),
+       (dbops.mod_miejsce, "mod_miejsce"),
+       (dbops.znajdz_miejsce, "znajdz_miejsce"),
+       (dbops.dodaj_miejsce_do_wydarzenia,
+        "dodaj_miejsce_do_wydarzenia"),
+       (dbops.usun_miejsce_z_wydarzenia,
+        "usun_miejsce_z_wydarzenia"),
+       (dbops.znajdz_wydarzenia_w_miejscu,
+        "znajdz_wydarzenia_w_miejscu"),
+       (dbops.wolne_terminy, "wolne_terminy"),
+       (dbops.dodaj_osoba, "dodaj_osoba"),
+       (dbops.dodaj_osoby, "dodaj_osoby"),
+       (dbops.usun_osoba, "usun_osoba"),
+       (dbops.mod_osoba, "mod_osoba"),
+       (dbops.znajdz_osoba, "znajdz_osoba"),
+       (dbops.ustaw_limit_miejsc, "ustaw_limit_miejsc"),
+       (dbops.zapisz, "zapisz"),
+       (dbops.zapisz_wiele, "zapisz_wiele"),
+       (dbops.importuj, "importuj"),
+       (dbops.wypisz, "wypisz"),
+       (dbops.znajdz_wydarzenia_osoby,
+        "znajdz_wydarzenia_osoby"),
+       (dbops.znajdz_zapisanych_na_wydarzenie,
+        "znajdz_zapisanych_na_wydarzenie"),
+       (dbops.wspolny_wolny_czas, "wspolny_wolny_czas"),
+       (dbops.szukaj, "szukaj"),
+       (dbops.ustaw_powtarzanie, "ustaw_powtarzanie"),
+       (dbops.odwolaj_wystapienie, "odwolaj_wystapienie"),
+       (dbops.mod_wystapienie, "mod_wystapienie"),
+       (dbops.rewizja, "rewizja"),
+       (dbops.zmiany_od, "zmiany_od")]
+"""Functions of dbops exposed by the server, with their API names."""
 
-def app_with_engine(f: Callable[..., Any]) -> Callable[..., Any]:
+MODYFIKUJACE = {"utworz",
+                "dodaj_wydarzenie", "dodaj_wydarzenia",
+                "usun_wydarzenie", "mod_wydarzenie",
+                "dodaj_miejsce", "dodaj_miejsca",
+                "usun_miejsce", "mod_miejsce",
+                "dodaj_miejsce_do_wydarzenia", "usun_miejsce_z_wydarzenia",
+                "dodaj_osoba", "dodaj_osoby", "usun_osoba", "mod_osoba",
+                "ustaw_limit_miejsc", "zapisz", "zapisz_wiele", "wypisz",
+                "importuj",
+                "ustaw_powtarzanie", "odwolaj_wystapienie",
+                "mod_wystapienie"}
+"""API names of the functions that modify the database."""
+ROZMIAR_KAWALKA = 65536
+"""Approximate size in bytes of the chunks in which feeds are sent."""
+
+
+def app_with_engine(f: Callable[..., Any],
+                    blokada: Any = None) -> Callable[..., Any]:
+    """Return a function that calls f with the process-wide engine.
+
+    Keyword arguments:
+    blokada -- lock held for the duration of each call;
+    `None` if calls need not be serialized.
+    """
     def res(*args: Any) -> Any:
-        return dbops.with_engine(f, *args)
+        if blokada is None:
+            return dbops.with_engine(f, *args)
+        with blokada:
+            return dbops.with_engine(f, *args)
     return res
 
 
-def main():
-    server = SimpleXMLRPCServer(("localhost", 8000), allow_none=True)
-    for f, name in [(dbops.utworz, "utworz"),
-                    (dbops.dodaj_wydarzenie, "dodaj_wydarzenie"),
-                    (dbops.usun_wydarzenie, "usun_wydarzenie"),
-                    (dbops.mod_wydarzenie, "mod_wydarzenie"),
-                    (dbops.znajdz_wydarzenie, "znajdz_wydarzenie"),
-                    (dbops.dodaj_miejsce, "dodaj_miejsce"),
-                    (dbops.usun_miejsce, "usun_miejsce"),
-                    (dbops.mod_miejsce, "mod_miejsce"),
-                    (dbops.znajdz_miejsce, "znajdz_miejsce"),
-                    (dbops.dodaj_miejsce_do_wydarzenia,
-                    "dodaj_miejsce_do_wydarzenia"),
-                    (dbops.usun_miejsce_z_wydarzenia,
-                     "usun_miejsce_z_wydarzenia"),
-                    (dbops.znajdz_wydarzenia_w_miejscu,
-                    "znajdz_wydarzenia_w_miejscu"),
-                    (dbops.dodaj_osoba, "dodaj_osoba"),
-                    (dbops.usun_osoba, "usun_osoba"),
-                    (dbops.mod_osoba, "mod_osoba"),
-                    (dbops.znajdz_osoba, "znajdz_osoba"),
-                    (dbops.zapisz, "zapisz"),
-                    (dbops.wypisz, "wypisz"),
-                    (dbops.znajdz_wydarzenia_osoby,
-                     "znajdz_wydarzenia_osoby"),
-                    (dbops.znajdz_zapisanych_na_wydarzenie,
-                    "znajdz_zapisanych_na_wydarzenie")]:
-        server.register_function(app_with_engine(f), name)
-
-    server.serve_forever()
+class ObslugaZapytan(SimpleXMLRPCRequestHandler):
+    """Handler of XML-RPC requests that also answers JSON-RPC requests
+    at path transport.SCIEZKA -- see transport.py, and GET requests
+    for path /metrics, if the server has attribute prometheus set
+    to an instance of metryki.Metryki, and for iCalendar feeds at path
+    wymiana.SCIEZKA_EKSPORTU -- see eksport.
+
+    Every connection is closed after one request, so that a client
+    cannot hold the only worker of SerwerProsty between its requests
+    -- see ObslugaPolaczen.
+    """
+
+    def do_POST(self) -> None:
+        if self.path == transport.SCIEZKA:
+            transport.odpowiedz(self)
+        else:
+            super().do_POST()
+
+    def do_GET(self) -> None:
+        sciezka = urllib.parse.urlsplit(self.path).path
+        if sciezka == wymiana.SCIEZKA_EKSPORTU:
+            self.eksport()
+            return
+        prometheus = getattr(self.server, "prometheus", None)
+        if self.path != "/metrics" or prometheus is None:
+            self.report_404()
+            return
+        tresc = prometheus.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(tresc)))
+        self.end_headers()
+        self.wfile.write(tresc)
+
+    def _odpowiedz_krotko(self, status: int, tresc: str = "",
+                          naglowki: Optional[Dict[str, str]] = None) -> None:
+        dane = tresc.encode("utf-8")
+        self.send_response(status)
+        for k, v in (naglowki or {}).items():
+            self.send_header(k, v)
+        if status != 304:
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(dane)))
+        self.end_headers()
+        self.wfile.write(dane)
+
+    def eksport(self) -> None:
+        """Answer a request for an iCalendar feed -- see dbops.eksport.
+
+        The query string may hold parameters email, miejsce (ID
+        of a location), od and do. The feed is sent in chunks
+        as it is generated. Its ETag is the revision of the database
+        -- see dbops.rewizja, so that a request with a current ETag
+        in header If-None-Match is answered with status 304
+        without running the query.
+        """
+        zapytanie = dict(urllib.parse.parse_qsl(
+            urllib.parse.urlsplit(self.path).query))
+        engine = dbops.get_engine()
+        etag = 'W/"{0}"'.format(dbops.rewizja(engine))
+        naglowki = {"ETag": etag, "Cache-Control": "no-cache"}
+        znane = [t.strip() for t in
+                 self.headers.get("If-None-Match", "").split(",")]
+        if etag in znane or "*" in znane:
+            self._odpowiedz_krotko(304, naglowki=naglowki)
+            return
+        try:
+            miejsce = zapytanie.get("miejsce")
+            wydarzenia = dbops.eksport(
+                engine, zapytanie.get("email"),
+                int(miejsce) if miejsce is not None else None,
+                zapytanie.get("od"), zapytanie.get("do"))
+        except ValueError as e:
+            self._odpowiedz_krotko(400, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        self._kawalki = (self.protocol_version == "HTTP/1.1"
+                         and self.request_version == "HTTP/1.1")
+        if self._kawalki:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.close_connection = True
+        for k, v in naglowki.items():
+            self.send_header(k, v)
+        self.end_headers()
+        bufor: List[bytes] = []
+        dlugosc = 0
+        for kawalek in wymiana.ics(wydarzenia):
+            bufor.append(kawalek.encode("utf-8"))
+            dlugosc += len(bufor[-1])
+            if dlugosc >= ROZMIAR_KAWALKA:
+                self._wyslij_kawalek(b"".join(bufor))
+                bufor, dlugosc = [], 0
+        if bufor:
+            self._wyslij_kawalek(b"".join(bufor))
+        self._wyslij_kawalek(b"")
+
+    def _wyslij_kawalek(self, dane: bytes) -> None:
+        """Write a chunk of a response in chunked transfer encoding;
+        an empty one ends the response. Without chunked encoding,
+        the data is written as it is and the end of the response
+        is marked by closing the connection."""
+        if self._kawalki:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(dane), dane))
+        else:
+            self.wfile.write(dane)
+
+
+class ObslugaPolaczen(ObslugaZapytan):
+    """Handler of ObslugaZapytan that keeps connections open between
+    requests (HTTP/1.1 keep-alive), until the client closes them
+    or stays idle for timeout seconds. Used by the servers with many
+    workers, where an idle connection holds only one of them.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = 2
+
+
+class Konserwacja:
+    """Maintenance task: a callable that runs dbops.konserwuj if at least
+    okres seconds passed since it last did, in any process forked after
+    its creation.
+
+    Keyword arguments:
+    blokada -- lock held while the task runs, so that it does not
+    compete with writers; `None` if not needed.
+    """
+
+    def __init__(self, okres: float, blokada: Any = None) -> None:
+        self.okres = okres
+        self.blokada = blokada
+        self._ostatnia = multiprocessing.Value("d", time.monotonic())
+
+    def __call__(self) -> None:
+        teraz = time.monotonic()
+        with self._ostatnia.get_lock():
+            if teraz - self._ostatnia.value < self.okres:
+                return
+            self._ostatnia.value = teraz
+        try:
+            with self.blokada or nullcontext():
+                dbops.with_engine(dbops.konserwuj)
+        except Exception as e:
+            print("Konserwacja nie powiodła się: {0}".format(e),
+                  file=sys.stderr)
+
+
+class SerwerProsty(SimpleXMLRPCServer):
+    """XML-RPC server that handles one request at a time and, between
+    requests, runs the maintenance task konserwacja, if it is set
+    -- see Konserwacja."""
+
+    logRequests: bool
+    konserwacja: Optional[Callable[[], None]] = None
+
+    def service_actions(self) -> None:
+        super().service_actions()
+        if self.konserwacja is not None:
+            self.konserwacja()
+
+
+class SerwerPuliWatkow(SerwerProsty):
+    """XML-RPC server that handles requests in a bounded pool of threads.
+
+    Accepted connections wait in a queue of bounded length
+    for a free worker thread. When the queue is full, the server stops
+    accepting connections until some request is done.
+    """
+
+    def __init__(self, addr: Tuple[str, int], robotnicy: int,
+                 kolejka: int, **kwargs: Any) -> None:
+        super().__init__(addr, **kwargs)
+        self.robotnicy = robotnicy
+        self._pula = ThreadPoolExecutor(max_workers=robotnicy,
+                                        thread_name_prefix="serwer")
+        self._miejsca = threading.BoundedSemaphore(robotnicy + kolejka)
+        self._licznik_blokada = threading.Lock()
+        self._przyjete = 0
+        self._zajeci = 0
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self._miejsca.acquire()
+        with self._licznik_blokada:
+            self._przyjete += 1
+        self._pula.submit(self._obsluz, request, client_address)
+
+    def _obsluz(self, request: Any, client_address: Any) -> None:
+        with self._licznik_blokada:
+            self._zajeci += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._licznik_blokada:
+                self._zajeci -= 1
+                self._przyjete -= 1
+            self._miejsca.release()
+
+    def stan(self) -> Dict[str, Any]:
+        """Return the mode, the number of workers, the number of busy
+        workers and the number of requests waiting in the queue."""
+        with self._licznik_blokada:
+            return {"tryb": "watki", "robotnicy": self.robotnicy,
+                    "zajeci": self._zajeci,
+                    "kolejka": self._przyjete - self._zajeci}
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._pula.shutdown(wait=True)
+
+
+class SerwerProcesow(SerwerProsty):
+    """XML-RPC server whose listening socket is shared
+    by pre-forked worker processes -- see serve_forever.
+
+    Each worker handles one request at a time. Counters of busy workers
+    and of writers waiting for the write lock are kept in shared memory.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, addr: Tuple[str, int], robotnicy: int,
+                 **kwargs: Any) -> None:
+        super().__init__(addr, **kwargs)
+        self.robotnicy = robotnicy
+        self.blokada_zapisu = multiprocessing.Lock()
+        self._zajeci = multiprocessing.Value("i", 0)
+        self._czekajacy = multiprocessing.Value("i", 0)
+        self._dzieci: List[int] = []
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        with self._zajeci.get_lock():
+            self._zajeci.value += 1
+        try:
+            super().process_request(request, client_address)
+        finally:
+            with self._zajeci.get_lock():
+                self._zajeci.value -= 1
+
+    def zapis(self, f: Callable[..., Any]) -> Callable[..., Any]:
+        """Return f wrapped so that calls hold the shared write lock."""
+        def res(*args: Any) -> Any:
+            with self._czekajacy.get_lock():
+                self._czekajacy.value += 1
+            self.blokada_zapisu.acquire()
+            with self._czekajacy.get_lock():
+                self._czekajacy.value -= 1
+            try:
+                return f(*args)
+            finally:
+                self.blokada_zapisu.release()
+        return res
+
+    def stan(self) -> Dict[str, Any]:
+        """Return the mode, the number of workers, the number of busy
+        workers and the number of writers waiting for the write lock."""
+        return {"tryb": "procesy", "robotnicy": self.robotnicy,
+                "zajeci": self._zajeci.value,
+                "kolejka": self._czekajacy.value,
+                "pid": os.getpid()}
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        """Fork the workers and wait for them to finish.
+
+        Every worker opens its own database engine after the fork.
+        """
+        for _ in range(self.robotnicy):
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                dbops.dispose_engines()
+                try:
+                    super().serve_forever(poll_interval)
+                finally:
+                    os._exit(0)
+            self._dzieci.append(pid)
+        try:
+            for pid in self._dzieci:
+                os.waitpid(pid, 0)
+        finally:
+            for pid in self._dzieci:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    os.waitpid(pid, 0)
+                except (ProcessLookupError, ChildProcessError):
+                    pass
+
+
+def zbuduj_serwer(host: str = "localhost", port: int = 8000,
+                  tryb: str = "prosty", robotnicy: int = 4,
+                  kolejka: int = 64,
+                  podreczna: Optional[pamiec.Pamiec] = None,
+                  pomiary: Optional[metryki.Metryki] = None,
+                  prometheus: bool = False,
+                  konserwacja: float = 0) -> SerwerProsty:
+    """Create an XML-RPC server exposing FUNKCJE, plus stan_serwera,
+    system.multicall, stan_pamieci if podreczna is given
+    and metryki_serwera if pomiary is given.
+
+    Keyword arguments:
+    host, port -- address to listen on.
+    tryb -- mode of operation: "prosty", "watki" or "procesy".
+    robotnicy -- number of worker threads or processes.
+    kolejka -- maximum number of requests waiting for a worker thread.
+    podreczna -- cache of results of lookups; `None` for no caching.
+    pomiary -- metrics of the calls of the server's methods;
+    `None` if calls are not to be measured.
+    prometheus -- set to `True` iff the metrics should be served
+    at path /metrics.
+    konserwacja -- period of the maintenance task in seconds
+    -- see Konserwacja; 0 if it should not run.
+    """
+    if podreczna is not None and tryb == "procesy":
+        raise ValueError("Pamięć podręczna nie działa w trybie procesy.")
+    server: SerwerProsty
+    blokada: Any = None
+    if tryb == "watki":
+        server = SerwerPuliWatkow((host, port), robotnicy, kolejka,
+                                  requestHandler=ObslugaPolaczen,
+                                  allow_none=True)
+        blokada = threading.Lock()
+    elif tryb == "procesy":
+        server = SerwerProcesow((host, port), robotnicy,
+                                requestHandler=ObslugaPolaczen,
+                                allow_none=True)
+    elif tryb == "prosty":
+        server = SerwerProsty((host, port), requestHandler=ObslugaZapytan,
+                              allow_none=True)
+    else:
+        raise ValueError("Nieznany tryb serwera.")
+
+    if konserwacja > 0:
+        server.konserwacja = Konserwacja(
+            konserwacja, server.blokada_zapisu
+            if isinstance(server, SerwerProcesow) else blokada)
+
+    for f, name in FUNKCJE:
+        if podreczna is not None:
+            f = pamiec.z_pamiecia(podreczna, f, name)
+        g = app_with_engine(f, blokada if name in MODYFIKUJACE else None)
+        if isinstance(server, SerwerProcesow) and name in MODYFIKUJACE:
+            g = server.zapis(g)
+        if pomiary is not None:
+            g = pomiary.mierz(g, name)
+        server.register_function(g, name)
+
+    def stan_serwera() -> Dict[str, Any]:
+        """Return the server's mode, worker count and queue depth."""
+        if isinstance(server, (SerwerPuliWatkow, SerwerProcesow)):
+            return server.stan()
+        return {"tryb": "prosty", "robotnicy": 1, "zajeci": 1, "kolejka": 0}
+    server.register_function(stan_serwera, "stan_serwera")
+    server.register_multicall_functions()
+    if podreczna is not None:
+        server.register_function(podreczna.stan, "stan_pamieci")
+    if pomiary is not None:
+        server.register_function(pomiary.stan, "metryki_serwera")
+        if prometheus:
+            setattr(server, "prometheus", pomiary)
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost",
+                        help="Adres, na którym serwer nasłuchuje.")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="Port, na którym serwer nasłuchuje.")
+    parser.add_argument("--tryb", choices=["prosty", "watki", "procesy"],
+                        default="prosty", help="Tryb pracy serwera.")
+    parser.add_argument("--robotnicy", type=int, default=os.cpu_count(),
+                        help="Liczba wątków lub procesów obsługujących"
+                        " zapytania.")
+    parser.add_argument("--kolejka", type=int, default=64,
+                        help="Maksymalna liczba zapytań czekających"
+                        " na wolny wątek.")
+    parser.add_argument("--pamiec", type=int, default=0,
+                        help="Maksymalna liczba wyników wyszukiwania"
+                        " przechowywanych w pamięci podręcznej;"
+                        " 0 wyłącza pamięć podręczną.")
+    parser.add_argument("--pamiec-bajty", type=int, default=32 * 2**20,
+                        help="Maksymalny łączny rozmiar wyników"
+                        " w pamięci podręcznej.")
+    parser.add_argument("--bez-metryk", action="store_true",
+                        help="Wyłącza pomiary wywołań metod serwera.")
+    parser.add_argument("--prometheus", action="store_true",
+                        help="Udostępnia pomiary w formacie Prometheusa"
+                        " pod ścieżką /metrics.")
+    parser.add_argument("--profil", choices=list(dbops.PROFILE),
+                        default=dbops.profil,
+                        help="Profil połączeń z bazą SQLite.")
+    parser.add_argument("--konserwacja", type=float, default=300,
+                        help="Co ile sekund wykonywać punkt kontrolny"
+                        " dziennika i optymalizację bazy; 0 wyłącza.")
+    args = parser.parse_args(argv)
+    dbops.profil = args.profil
+    if args.pamiec > 0 and args.tryb == "procesy":
+        parser.error("--pamiec nie działa w trybie procesy.")
+    if args.prometheus and args.bez_metryk:
+        parser.error("--prometheus wymaga pomiarów.")
+
+    robotnicy = 1 if args.tryb == "prosty" else args.robotnicy or 1
+    podreczna = (pamiec.Pamiec(args.pamiec, args.pamiec_bajty)
+                 if args.pamiec > 0 else None)
+    pomiary = None if args.bez_metryk else metryki.Metryki()
+    server = zbuduj_serwer(args.host, args.port, args.tryb,
+                           robotnicy, args.kolejka, podreczna,
+                           pomiary, args.prometheus, args.konserwacja)
+    print("Serwer {0}:{1}, tryb {2}, robotnicy: {3}, profil {4}.".format(
+        args.host, args.port, args.tryb, robotnicy, args.profil))
+
+    if args.tryb != "procesy":
+        dbops.get_engine()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pomiary is not None:
+            pomiary.zamknij()
+        dbops.dispose_engines()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,616 @@
+"""Asynchronous server script: an alternative to serwer.py exposing
+the same methods -- see serwer.FUNKCJE, over XML-RPC and, at path
+transport.SCIEZKA, over JSON-RPC, by default on localhost, port 8000.
+Quit by keyboard interrupt or SIGTERM. Run with -h for help.
+
+Every connection is served by a coroutine of a single event loop rather
+than by a thread, so that thousands of idle keep-alive clients cost
+little. Functions of dbops run on the synchronous facade
+of the connections of SQLAlchemy's asynchronous engine with driver
+aiosqlite -- see AsyncConnection.run_sync, each call in a transaction
+of its own. Without packages greenlet and aiosqlite -- see dostepny,
+they run on the connections of a synchronous engine in threads
+instead -- see SilnikWatkow.
+
+At most --rownolegle requests are handled at a time and at most
+--kolejka more wait for their turn; further requests are answered
+with status 503 at once. Functions that modify the database are
+serialized, as in modes watki and procesy of serwer.py, and responses
+are written no faster than the client reads them.
+
+On shutdown the server stops accepting connections, closes the idle
+ones, lets the requests in progress finish for at most --wygaszanie
+seconds, and then closes the rest.
+
+Caching, metrics, iCalendar feeds and maintenance work as in serwer.py.
+"""
+
+import aplikacja.dbops as dbops
+import aplikacja.metryki as metryki
+import aplikacja.pamiec as pamiec
+import aplikacja.serwer as serwer
+import aplikacja.transport as transport
+import aplikacja.wymiana as wymiana
+import argparse
+import asyncio
+import gzip
+import http
+import inspect
+import signal
+import sys
+import traceback
+import urllib.parse
+import xmlrpc.client
+from contextlib import asynccontextmanager, nullcontext
+from sqlalchemy import Connection, Engine, create_engine
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List
+from typing import Optional, Set
+
+try:
+    import aiosqlite  # noqa: F401
+    import greenlet  # noqa: F401
+    from sqlalchemy.ext.asyncio import create_async_engine
+    STEROWNIKI = True
+except ImportError:
+    STEROWNIKI = False
+"""Whether the packages of SQLAlchemy's asynchronous engine with driver
+aiosqlite are installed."""
+
+
+SCIEZKI_XMLRPC = ("/", "/RPC2")
+"""Paths at which the server accepts XML-RPC requests."""
+MAX_TRESC = 64 * 2**20
+"""Maximum length in bytes of the body of a request."""
+
+
+def dostepny() -> bool:
+    """Return whether the packages of the asynchronous engine
+    are installed; if not, zbuduj_silnik returns a SilnikWatkow."""
+    return STEROWNIKI
+
+
+def url_async(url: str) -> str:
+    """Return the URL of an SQLite database for driver aiosqlite."""
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+
+def zbuduj_silnik(url: Optional[str] = None) -> Any:
+    """Return an asynchronous engine of the database with the given URL,
+    dbops.dbpath by default, created with the parameters dbops.echo
+    and dbops.pula and the profile dbops.profil; a SilnikWatkow
+    if the asynchronous engine is not available -- see dostepny."""
+    url = url or dbops.dbpath
+    engine: Any
+    if STEROWNIKI:
+        engine = create_async_engine(url_async(url), echo=dbops.echo,
+                                     **dbops.pula)
+    else:
+        engine = SilnikWatkow(create_engine(url, echo=dbops.echo,
+                                            **dbops.pula))
+    if dbops.profil is not None:
+        dbops.ustaw_profil(engine.sync_engine, dbops.profil)
+    return engine
+
+
+class SilnikWatkow:
+    """Stand-in for SQLAlchemy's asynchronous engine, with the methods
+    used by SerwerAsync, that runs functions on the connections
+    of a synchronous engine in the threads of the event loop's default
+    executor -- see asyncio.to_thread.
+
+    Positional arguments:
+    sync_engine -- the synchronous engine.
+    """
+
+    def __init__(self, sync_engine: Engine) -> None:
+        self.sync_engine = sync_engine
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator["PolaczenieWatkow"]:
+        """Yield a connection, closed on exit."""
+        conn = await asyncio.to_thread(self.sync_engine.connect)
+        try:
+            yield PolaczenieWatkow(conn)
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    @asynccontextmanager
+    async def begin(self) -> AsyncIterator["PolaczenieWatkow"]:
+        """Yield a connection in a transaction, committed on exit
+        and rolled back on error."""
+        async with self.connect() as conn:
+            await asyncio.to_thread(conn.sync_connection.begin)
+            try:
+                yield conn
+            except BaseException:
+                await asyncio.to_thread(conn.sync_connection.rollback)
+                raise
+            await asyncio.to_thread(conn.sync_connection.commit)
+
+    async def dispose(self) -> None:
+        """Close the connections of the pool."""
+        await asyncio.to_thread(self.sync_engine.dispose)
+
+
+class PolaczenieWatkow:
+    """Connection of SilnikWatkow."""
+
+    def __init__(self, sync_connection: Connection) -> None:
+        self.sync_connection = sync_connection
+
+    async def run_sync(self, f: Callable[..., Any], *args: Any) -> Any:
+        """Call f with the synchronous connection and args in a thread."""
+        return await asyncio.to_thread(f, self.sync_connection, *args)
+
+
+class Przeciazenie(Exception):
+    """Exception raised when a request does not fit in the queue."""
+
+
+def _porcja(kawalki: Iterator[str], rozmiar: int) -> str:
+    """Return the next pieces of a feed, of at least rozmiar characters
+    unless the feed ends; an empty string once it has ended."""
+    bufor: List[str] = []
+    dlugosc = 0
+    for kawalek in kawalki:
+        bufor.append(kawalek)
+        dlugosc += len(kawalek)
+        if dlugosc >= rozmiar:
+            break
+    return "".join(bufor)
+
+
+class SerwerAsync:
+    """HTTP/1.1 server of the API, serving every connection
+    by a coroutine -- see serwuj.
+
+    Positional arguments:
+    engine -- asynchronous engine of the database -- see zbuduj_silnik.
+
+    Keyword arguments:
+    rownolegle -- maximum number of requests handled at a time.
+    kolejka -- maximum number of requests waiting for their turn.
+    podreczna, pomiary, prometheus, konserwacja -- see
+    serwer.zbuduj_serwer.
+    wygaszanie -- how many seconds requests in progress may take
+    to finish once the server is stopped.
+    """
+
+    bezczynnosc = 60
+    """Idle connections are closed after this many seconds."""
+
+    def __init__(self, engine: Any, rownolegle: int = 64,
+                 kolejka: int = 1024,
+                 podreczna: Optional[pamiec.Pamiec] = None,
+                 pomiary: Optional[metryki.Metryki] = None,
+                 prometheus: bool = False, konserwacja: float = 0,
+                 wygaszanie: float = 30) -> None:
+        self.engine = engine
+        self.rownolegle = rownolegle
+        self.kolejka = kolejka
+        self.pomiary = pomiary
+        self.prometheus = prometheus
+        self.konserwacja = konserwacja
+        self.wygaszanie = wygaszanie
+        self._miejsca = asyncio.Semaphore(rownolegle)
+        self._blokada_zapisu = asyncio.Lock()
+        self._czekajace = 0
+        self._zajete = 0
+        self._polaczenia: Dict[asyncio.StreamWriter, "asyncio.Task[Any]"] \
+            = {}
+        self._bezczynne: Set[asyncio.StreamWriter] = set()
+        self._zamykanie = False
+        self._stop: Optional[asyncio.Event] = None
+        self.funkcje: Dict[str, Callable[..., Any]] = {}
+        for f, name in serwer.FUNKCJE:
+            if podreczna is not None:
+                f = pamiec.z_pamiecia(podreczna, f, name)
+            if pomiary is not None:
+                f = pomiary.mierz(f, name)
+            self.funkcje[name] = self._w_bazie(
+                f, name in serwer.MODYFIKUJACE)
+        self.funkcje["stan_serwera"] = self.stan
+        self.funkcje["system.multicall"] = self._multicall
+        if podreczna is not None:
+            self.funkcje["stan_pamieci"] = podreczna.stan
+        if pomiary is not None:
+            self.funkcje["metryki_serwera"] = pomiary.stan
+
+    def _w_bazie(self, f: Callable[..., Any],
+                 zapis: bool) -> Callable[..., Any]:
+        """Return a coroutine function calling f, a function of dbops,
+        on a connection of the engine, in a transaction; holding
+        the write lock if zapis is set. Cached results that f
+        invalidates are dropped once the transaction is committed
+        -- see pamiec.odlozone."""
+        async def res(*args: Any) -> Any:
+            async with self._blokada_zapisu if zapis else nullcontext():
+                uniewaznij: Callable[[], None] = lambda: None
+                try:
+                    async with self.engine.begin() as conn:
+                        try:
+                            return await conn.run_sync(f, *args)
+                        finally:
+                            uniewaznij = pamiec.odlozone(
+                                conn.sync_connection)
+                finally:
+                    uniewaznij()
+        return res
+
+    def stan(self) -> Dict[str, Any]:
+        """Return the mode, the limit of requests handled at a time,
+        the numbers of requests in progress and waiting, and the number
+        of open connections."""
+        return {"tryb": "asyncio", "robotnicy": self.rownolegle,
+                "zajeci": self._zajete, "kolejka": self._czekajace,
+                "polaczenia": len(self._polaczenia)}
+
+    async def wywolaj(self, metoda: str, params: List[Any]) -> Any:
+        """Call the method with the given name and parameters."""
+        f = self.funkcje.get(metoda)
+        if f is None:
+            raise Exception('method "{0}" is not supported'.format(metoda))
+        wynik = f(*params)
+        if inspect.isawaitable(wynik):
+            wynik = await wynik
+        return wynik
+
+    async def _multicall(self, wywolania: List[Dict[str, Any]]) -> List[Any]:
+        """Make many calls, like system.multicall of XML-RPC servers."""
+        res: List[Any] = []
+        for w in wywolania:
+            try:
+                res.append([await self.wywolaj(w["methodName"],
+                                               w["params"])])
+            except xmlrpc.client.Fault as e:
+                res.append({"faultCode": e.faultCode,
+                            "faultString": e.faultString})
+            except Exception as e:
+                res.append({"faultCode": 1,
+                            "faultString": "{0}:{1}".format(type(e), e)})
+        return res
+
+    @asynccontextmanager
+    async def _kolej(self) -> AsyncIterator[None]:
+        """Wait for a free slot for a request and hold it.
+
+        Raises Przeciazenie if the queue is full."""
+        if self._miejsca.locked() and self._czekajace >= self.kolejka:
+            raise Przeciazenie()
+        self._czekajace += 1
+        try:
+            await self._miejsca.acquire()
+        finally:
+            self._czekajace -= 1
+        self._zajete += 1
+        try:
+            yield
+        finally:
+            self._zajete -= 1
+            self._miejsca.release()
+
+    async def serwuj(self, host: str = "localhost", port: int = 8000,
+                     gotowy: Optional[Callable[[int], None]] = None
+                     ) -> None:
+        """Serve until zatrzymaj is called, then shut down gracefully.
+
+        Keyword arguments:
+        gotowy -- function called with the port once the server listens;
+        `None` if not needed.
+        """
+        self._stop = asyncio.Event()
+        gniazdo = await asyncio.start_server(self._obsluz, host, port)
+        zadania = []
+        if self.konserwacja > 0:
+            zadania.append(asyncio.create_task(self._konserwuj()))
+        if gotowy is not None:
+            gotowy(gniazdo.sockets[0].getsockname()[1])
+        try:
+            await self._stop.wait()
+        finally:
+            gniazdo.close()
+            self._zamykanie = True
+            for w in list(self._bezczynne):
+                self._polaczenia[w].cancel()
+            petla = asyncio.get_running_loop()
+            koniec = petla.time() + self.wygaszanie
+            while ((self._zajete or self._czekajace)
+                   and petla.time() < koniec):
+                await asyncio.sleep(0.05)
+            zadania.extend(self._polaczenia.values())
+            for z in zadania:
+                z.cancel()
+            await asyncio.gather(*zadania, return_exceptions=True)
+            await gniazdo.wait_closed()
+            await self.engine.dispose()
+
+    def zatrzymaj(self) -> None:
+        """Make serwuj shut the server down."""
+        if self._stop is not None:
+            self._stop.set()
+
+    async def _konserwuj(self) -> None:
+        """Run dbops.konserwuj every konserwacja seconds."""
+        while True:
+            await asyncio.sleep(self.konserwacja)
+            try:
+                async with self._blokada_zapisu:
+                    async with self.engine.connect() as conn:
+                        await conn.run_sync(dbops.konserwuj)
+            except Exception as e:
+                print("Konserwacja nie powiodła się: {0}".format(e),
+                      file=sys.stderr)
+
+    async def _obsluz(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of a connection until it is closed."""
+        zadanie = asyncio.current_task()
+        assert zadanie is not None
+        self._polaczenia[writer] = zadanie
+        self._bezczynne.add(writer)
+        try:
+            while not self._zamykanie:
+                try:
+                    naglowek = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), self.bezczynnosc)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ConnectionError):
+                    return
+                self._bezczynne.discard(writer)
+                if not await self._zapytanie(naglowek, reader, writer):
+                    return
+                self._bezczynne.add(writer)
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.CancelledError):
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._polaczenia.pop(writer, None)
+            self._bezczynne.discard(writer)
+            writer.close()
+
+    async def _zapytanie(self, naglowek: bytes,
+                         reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> bool:
+        """Answer a request whose head was read. Returns whether
+        the connection should be kept open.
+
+        Bodies must be given by Content-Length, which POST requests
+        cannot omit, like in transport.odpowiedz: other requests
+        are answered with 411 or 400 and the connection is closed,
+        as the end of their bodies is unknown."""
+        linie = naglowek.decode("latin-1").split("\r\n")
+        try:
+            metoda, sciezka, wersja = linie[0].split(" ", 2)
+            naglowki = {k.strip().lower(): v.strip() for k, _, v in
+                        (linia.partition(":") for linia in linie[1:]
+                         if linia)}
+        except ValueError:
+            await self._odpowiedz(writer, 400, zostaw=False)
+            return False
+        if "transfer-encoding" in naglowki or (
+                metoda == "POST" and "content-length" not in naglowki):
+            await self._odpowiedz(writer, 411, zostaw=False)
+            return False
+        try:
+            dlugosc = int(naglowki.get("content-length", "0"))
+        except ValueError:
+            dlugosc = -1
+        if dlugosc < 0:
+            await self._odpowiedz(writer, 400, zostaw=False)
+            return False
+        if dlugosc > MAX_TRESC:
+            await self._odpowiedz(writer, 413, zostaw=False)
+            return False
+        tresc = await reader.readexactly(dlugosc)
+        if naglowki.get("content-encoding") == "gzip":
+            try:
+                tresc = gzip.decompress(tresc)
+            except (OSError, EOFError):
+                await self._odpowiedz(writer, 400, zostaw=False)
+                return False
+        zostaw = (wersja == "HTTP/1.1" and not self._zamykanie
+                  and naglowki.get("connection", "").lower() != "close")
+        try:
+            async with self._kolej():
+                await self._rozdziel(metoda, sciezka, wersja, naglowki,
+                                     tresc, writer, zostaw)
+        except Przeciazenie:
+            await self._odpowiedz(writer, 503, b"", {"Retry-After": "1"},
+                                  zostaw)
+        return zostaw
+
+    async def _rozdziel(self, metoda: str, sciezka: str, wersja: str,
+                        naglowki: Dict[str, str], tresc: bytes,
+                        writer: asyncio.StreamWriter, zostaw: bool) -> None:
+        """Answer a request according to its method and path."""
+        czesci = urllib.parse.urlsplit(sciezka)
+        gzip_ok = "gzip" in naglowki.get("accept-encoding", "")
+        if metoda == "POST" and sciezka == transport.SCIEZKA:
+            kodowanie = transport.kodowanie_typu(
+                naglowki.get("content-type"))
+            if kodowanie is None:
+                await self._odpowiedz(writer, 415, zostaw=zostaw)
+                return
+            odp = await transport.odpowiedz_async(
+                self.funkcje, self.wywolaj, tresc, kodowanie)
+            if odp is None:
+                await self._odpowiedz(writer, 204, None, zostaw=zostaw)
+                return
+            await self._odpowiedz(writer, 200, odp,
+                                  {"Content-Type": transport.TYPY[kodowanie]},
+                                  zostaw, gzip_ok)
+        elif metoda == "POST" and sciezka in SCIEZKI_XMLRPC:
+            odp = (await self._xmlrpc(tresc)).encode("utf-8")
+            await self._odpowiedz(writer, 200, odp,
+                                  {"Content-Type": "text/xml"}, zostaw,
+                                  gzip_ok)
+        elif metoda == "GET" and czesci.path == wymiana.SCIEZKA_EKSPORTU:
+            await self._eksport(czesci.query, naglowki, writer, zostaw,
+                                wersja == "HTTP/1.1")
+        elif (metoda == "GET" and sciezka == "/metrics" and self.prometheus
+              and self.pomiary is not None):
+            await self._odpowiedz(
+                writer, 200, self.pomiary.prometheus().encode("utf-8"),
+                {"Content-Type": "text/plain; version=0.0.4"}, zostaw)
+        else:
+            await self._odpowiedz(writer, 404, zostaw=zostaw)
+
+    async def _xmlrpc(self, tresc: bytes) -> str:
+        """Return the response to an XML-RPC request."""
+        try:
+            params, metoda = xmlrpc.client.loads(tresc)
+            if metoda is None:
+                raise ValueError("Brak nazwy metody.")
+            wynik = await self.wywolaj(metoda, list(params))
+            res: str = xmlrpc.client.dumps((wynik,), methodresponse=True,
+                                           allow_none=True,
+                                           encoding="utf-8")
+        except xmlrpc.client.Fault as e:
+            res = xmlrpc.client.dumps(e, allow_none=True, encoding="utf-8")
+        except Exception as e:
+            res = xmlrpc.client.dumps(
+                xmlrpc.client.Fault(1, "{0}:{1}".format(type(e), e)),
+                allow_none=True, encoding="utf-8")
+        return res
+
+    async def _eksport(self, zapytanie: str, naglowki: Dict[str, str],
+                       writer: asyncio.StreamWriter, zostaw: bool,
+                       kawalki: bool) -> None:
+        """Answer a request for an iCalendar feed, like
+        serwer.ObslugaZapytan.eksport: in chunks if kawalki is set,
+        i.e. to HTTP/1.1 clients, otherwise up to the end
+        of the connection, which zostaw must not keep open."""
+        parametry = dict(urllib.parse.parse_qsl(zapytanie))
+        async with self.engine.connect() as conn:
+            etag = 'W/"{0}"'.format(await conn.run_sync(dbops.rewizja))
+            dodatkowe = {"ETag": etag, "Cache-Control": "no-cache"}
+            znane = [t.strip() for t in
+                     naglowki.get("if-none-match", "").split(",")]
+            if etag in znane or "*" in znane:
+                await self._odpowiedz(writer, 304, None, dodatkowe, zostaw)
+                return
+            try:
+                miejsce = parametry.get("miejsce")
+                wydarzenia = await conn.run_sync(
+                    dbops.eksport, parametry.get("email"),
+                    int(miejsce) if miejsce is not None else None,
+                    parametry.get("od"), parametry.get("do"))
+            except ValueError as e:
+                await self._odpowiedz(
+                    writer, 400, str(e).encode("utf-8"),
+                    {"Content-Type": "text/plain; charset=utf-8"}, zostaw)
+                return
+            dodatkowe["Content-Type"] = "text/calendar; charset=utf-8"
+            if kawalki:
+                dodatkowe["Transfer-Encoding"] = "chunked"
+            await self._odpowiedz(writer, 200, None, dodatkowe, zostaw)
+            czesci = wymiana.ics(wydarzenia)
+            while True:
+                porcja = await conn.run_sync(
+                    lambda _: _porcja(czesci, serwer.ROZMIAR_KAWALKA))
+                dane = porcja.encode("utf-8")
+                if kawalki:
+                    writer.write(b"%x\r\n%s\r\n" % (len(dane), dane))
+                else:
+                    writer.write(dane)
+                await writer.drain()
+                if not dane:
+                    return
+
+    async def _odpowiedz(self, writer: asyncio.StreamWriter, status: int,
+                         tresc: Optional[bytes] = b"",
+                         naglowki: Optional[Dict[str, str]] = None,
+                         zostaw: bool = True, gzip_ok: bool = False) -> None:
+        """Write a response and wait until the client reads enough of it.
+
+        Pass tresc `None` to write only the head, e.g. of a response
+        sent in chunks. Bodies longer than transport.PROG_KOMPRESJI
+        are compressed if gzip_ok is set."""
+        naglowki = dict(naglowki or {})
+        if tresc is not None:
+            if gzip_ok and len(tresc) > transport.PROG_KOMPRESJI:
+                tresc = gzip.compress(tresc, compresslevel=1)
+                naglowki["Content-Encoding"] = "gzip"
+            if status != 304:
+                naglowki["Content-Length"] = str(len(tresc))
+        if not zostaw:
+            naglowki["Connection"] = "close"
+        glowa = ["HTTP/1.1 {0} {1}".format(status,
+                                           http.HTTPStatus(status).phrase)]
+        glowa.extend("{0}: {1}".format(k, v) for k, v in naglowki.items())
+        writer.write(("\r\n".join(glowa) + "\r\n\r\n").encode("latin-1")
+                     + (tresc or b""))
+        await writer.drain()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost",
+                        help="Adres, na którym serwer nasłuchuje.")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="Port, na którym serwer nasłuchuje.")
+    parser.add_argument("--rownolegle", type=int, default=64,
+                        help="Maksymalna liczba zapytań obsługiwanych"
+                        " jednocześnie.")
+    parser.add_argument("--kolejka", type=int, default=1024,
+                        help="Maksymalna liczba zapytań czekających"
+                        " na obsłużenie; kolejne dostają odpowiedź 503.")
+    parser.add_argument("--wygaszanie", type=float, default=30,
+                        help="Ile sekund po zatrzymaniu serwera czekać"
+                        " na dokończenie obsługiwanych zapytań.")
+    parser.add_argument("--pamiec", type=int, default=0,
+                        help="Maksymalna liczba wyników wyszukiwania"
+                        " przechowywanych w pamięci podręcznej;"
+                        " 0 wyłącza pamięć podręczną.")
+    parser.add_argument("--pamiec-bajty", type=int, default=32 * 2**20,
+                        help="Maksymalny łączny rozmiar wyników"
+                        " w pamięci podręcznej.")
+    parser.add_argument("--bez-metryk", action="store_true",
+                        help="Wyłącza pomiary wywołań metod serwera.")
+    parser.add_argument("--prometheus", action="store_true",
+                        help="Udostępnia pomiary w formacie Prometheusa"
+                        " pod ścieżką /metrics.")
+    parser.add_argument("--profil", choices=list(dbops.PROFILE),
+                        default=dbops.profil,
+                        help="Profil połączeń z bazą SQLite.")
+    parser.add_argument("--konserwacja", type=float, default=300,
+                        help="Co ile sekund wykonywać punkt kontrolny"
+                        " dziennika i optymalizację bazy; 0 wyłącza.")
+    args = parser.parse_args(argv)
+    if not dostepny():
+        print("Brak pakietów greenlet lub aiosqlite: funkcje bazy danych"
+              " będą wykonywane w wątkach.", file=sys.stderr)
+    if args.prometheus and args.bez_metryk:
+        parser.error("--prometheus wymaga pomiarów.")
+    dbops.profil = args.profil
+    podreczna = (pamiec.Pamiec(args.pamiec, args.pamiec_bajty)
+                 if args.pamiec > 0 else None)
+    pomiary = None if args.bez_metryk else metryki.Metryki()
+    try:
+        asyncio.run(_serwuj(args, podreczna, pomiary))
+    finally:
+        if pomiary is not None:
+            pomiary.zamknij()
+
+
+async def _serwuj(args: argparse.Namespace,
+                  podreczna: Optional[pamiec.Pamiec],
+                  pomiary: Optional[metryki.Metryki]) -> None:
+    """Run the server configured by the command line arguments
+    until SIGINT or SIGTERM."""
+    server = SerwerAsync(zbuduj_silnik(), args.rownolegle, args.kolejka,
+                         podreczna, pomiary, args.prometheus,
+                         args.konserwacja, args.wygaszanie)
+    petla = asyncio.get_running_loop()
+    for sygnal in (signal.SIGINT, signal.SIGTERM):
+        petla.add_signal_handler(sygnal, server.zatrzymaj)
+    print("Serwer {0}:{1}, tryb asyncio, zapytania jednocześnie: {2},"
+          " profil {3}.".format(args.host, args.port, args.rownolegle,
+                                args.profil))
+    await server.serwuj(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Compact transport of the server's API: JSON-RPC 2.0 over HTTP/1.1,
+with bodies encoded as JSON or, if package msgpack is installed,
+as MessagePack (Content-Type application/msgpack).
+
+The server accepts it at path SCIEZKA of its XML-RPC port -- see
+serwer.ObslugaZapytan, and calls the same functions as through XML-RPC.
+Responses longer than PROG_KOMPRESJI bytes are compressed with gzip
+if the client accepts it. klient.py chooses the transport with
+option --transport -- see Polaczenie.
+"""
+
+import gzip
+import http.client
+import json
+import urllib.parse
+import xmlrpc.client
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+SCIEZKA = "/jsonrpc"
+"""Path at which the server accepts JSON-RPC requests."""
+TYPY = {"json": "application/json", "msgpack": "application/msgpack"}
+"""Content types of the encodings."""
+PROG_KOMPRESJI = 1400
+"""Responses longer than this many bytes are compressed."""
+
+NIEPOPRAWNE_ZAPYTANIE = -32600
+BRAK_METODY = -32601
+BLAD_PARSOWANIA = -32700
+BLAD_SERWERA = -32000
+"""JSON-RPC error codes."""
+
+
+class BrakTransportu(Exception):
+    """Exception raised by Polaczenie if the server does not accept
+    the transport: status 404 if it has no JSON-RPC endpoint, 415 if it
+    does not support the encoding."""
+
+    def __init__(self, status: int) -> None:
+        super().__init__("Serwer nie obsługuje transportu ({0}).".format(
+            status))
+        self.status = status
+
+
+def dostepne() -> List[str]:
+    """Return the encodings available in this process."""
+    return ["json"] + (["msgpack"] if msgpack is not None else [])
+
+
+def kodowanie_typu(typ: Optional[str]) -> Optional[str]:
+    """Return the encoding with the given content type, or `None`
+    if it is not available."""
+    typ = (typ or "").split(";")[0].strip().lower()
+    for kodowanie, t in TYPY.items():
+        if t == typ and kodowanie in dostepne():
+            return kodowanie
+    return None
+
+
+def koduj(obj: Any, kodowanie: str) -> bytes:
+    """Encode an object as "json" or "msgpack"."""
+    if kodowanie == "msgpack":
+        res: bytes = msgpack.packb(obj, use_bin_type=True)
+        return res
+    return json.dumps(obj, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def dekoduj(dane: bytes, kodowanie: str) -> Any:
+    """Decode an object encoded by koduj."""
+    if kodowanie == "msgpack":
+        return msgpack.unpackb(dane, raw=False)
+    return json.loads(dane)
+
+
+def _blad(id: Any, kod: int, komunikat: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": id,
+            "error": {"code": kod, "message": komunikat}}
+
+
+def wykonaj(funkcje: Dict[str, Callable[..., Any]],
+            dispatch: Callable[[str, Any], Any], zapytanie: Any) -> Any:
+    """Perform a JSON-RPC request, or a batch of requests, and return
+    the response, or `None` if nothing is to be sent back:
+    notifications, i.e. requests without member id, are not answered,
+    also within batches.
+
+    Positional arguments:
+    funkcje -- functions that can be called, by name.
+    dispatch -- function calling one of them given its name
+    and the list of arguments.
+    zapytanie -- the decoded request.
+    """
+    if isinstance(zapytanie, list):
+        if not zapytanie:
+            return _blad(None, NIEPOPRAWNE_ZAPYTANIE, "Pusta paczka.")
+        return _paczka([_wykonaj_jedno(funkcje, dispatch, z)
+                        for z in zapytanie])
+    return _wykonaj_jedno(funkcje, dispatch, zapytanie)
+
+
+def _paczka(odpowiedzi: List[Optional[Dict[str, Any]]]
+            ) -> Optional[List[Dict[str, Any]]]:
+    """Return the responses to a batch but those to notifications,
+    or `None` if there are none."""
+    res = [o for o in odpowiedzi if o is not None]
+    return res or None
+
+
+def _powiadomienie(zapytanie: Any) -> bool:
+    """Return whether a request is a valid notification,
+    which is performed but not answered."""
+    return (isinstance(zapytanie, dict) and "id" not in zapytanie
+            and isinstance(zapytanie.get("method"), str)
+            and isinstance(zapytanie.get("params", []), list))
+
+
+def _sprawdz(funkcje: Dict[str, Any], zapytanie: Any
+             ) -> Tuple[Optional[Dict[str, Any]], Any, str, List[Any]]:
+    """Return the error response to a malformed request, or `None`,
+    and the request's ID, method and parameters."""
+    if not isinstance(zapytanie, dict):
+        return (_blad(None, NIEPOPRAWNE_ZAPYTANIE, "Zapytanie nie jest"
+                      " obiektem."), None, "", [])
+    id = zapytanie.get("id")
+    metoda = zapytanie.get("method")
+    params = zapytanie.get("params", [])
+    if not isinstance(metoda, str) or not isinstance(params, list):
+        return (_blad(id, NIEPOPRAWNE_ZAPYTANIE, "Niepoprawne zapytanie."),
+                id, "", [])
+    if metoda not in funkcje:
+        return (_blad(id, BRAK_METODY,
+                      'method "{0}" is not supported'.format(metoda)),
+                id, metoda, params)
+    return None, id, metoda, params
+
+
+def _wykonaj_jedno(funkcje: Dict[str, Callable[..., Any]],
+                   dispatch: Callable[[str, Any], Any],
+                   zapytanie: Any) -> Optional[Dict[str, Any]]:
+    blad, id, metoda, params = _sprawdz(funkcje, zapytanie)
+    if blad is None:
+        try:
+            wynik = dispatch(metoda, params)
+        except Exception as e:
+            blad = _blad(id, BLAD_SERWERA, "{0}:{1}".format(type(e), e))
+    if _powiadomienie(zapytanie):
+        return None
+    return blad or {"jsonrpc": "2.0", "id": id, "result": wynik}
+
+
+async def wykonaj_async(funkcje: Dict[str, Any],
+                        dispatch: Callable[[str, Any], Awaitable[Any]],
+                        zapytanie: Any) -> Any:
+    """Perform a JSON-RPC request, or a batch of requests, like wykonaj,
+    with a coroutine function dispatch. The requests of a batch
+    are performed one by one, in order."""
+    if isinstance(zapytanie, list):
+        if not zapytanie:
+            return _blad(None, NIEPOPRAWNE_ZAPYTANIE, "Pusta paczka.")
+        return _paczka([await _wykonaj_jedno_async(funkcje, dispatch, z)
+                        for z in zapytanie])
+    return await _wykonaj_jedno_async(funkcje, dispatch, zapytanie)
+
+
+async def _wykonaj_jedno_async(funkcje: Dict[str, Any],
+                               dispatch: Callable[[str, Any],
+                                                  Awaitable[Any]],
+                               zapytanie: Any) -> Optional[Dict[str, Any]]:
+    blad, id, metoda, params = _sprawdz(funkcje, zapytanie)
+    if blad is None:
+        try:
+            wynik = await dispatch(metoda, params)
+        except Exception as e:
+            blad = _blad(id, BLAD_SERWERA, "{0}:{1}".format(type(e), e))
+    if _powiadomienie(zapytanie):
+        return None
+    return blad or {"jsonrpc": "2.0", "id": id, "result": wynik}
+
+
+async def odpowiedz_async(funkcje: Dict[str, Any],
+                          dispatch: Callable[[str, Any], Awaitable[Any]],
+                          dane: bytes, kodowanie: str) -> Optional[bytes]:
+    """Return the response to a JSON-RPC request encoded as kodowanie,
+    encoded the same way, or `None` if nothing is to be sent back
+    -- see wykonaj_async."""
+    try:
+        zapytanie = dekoduj(dane, kodowanie)
+    except Exception as e:
+        odp: Any = _blad(None, BLAD_PARSOWANIA, str(e))
+    else:
+        odp = await wykonaj_async(funkcje, dispatch, zapytanie)
+    return None if odp is None else koduj(odp, kodowanie)
+
+
+def odpowiedz(handler: Any) -> None:
+    """Answer a JSON-RPC request received by an XML-RPC request handler
+    of the standard library, using the functions registered
+    in its server.
+
+    Requests without a body length are answered with status 411,
+    and those with an invalid one with status 400. Requests with nothing
+    to be sent back -- see wykonaj, are answered with status 204.
+    """
+    dlugosc = handler.headers.get("Content-Length")
+    if dlugosc is None:
+        _odmow(handler, 411)
+        return
+    try:
+        n = int(dlugosc)
+        if n < 0:
+            raise ValueError(dlugosc)
+    except ValueError:
+        _odmow(handler, 400)
+        return
+    dane = handler.rfile.read(n)
+    kodowanie = kodowanie_typu(handler.headers.get("Content-Type"))
+    if kodowanie is None:
+        _odmow(handler, 415)
+        return
+    dane = handler.decode_request_content(dane)
+    if dane is None:
+        return
+    try:
+        zapytanie = dekoduj(dane, kodowanie)
+    except Exception as e:
+        odp: Any = _blad(None, BLAD_PARSOWANIA, str(e))
+    else:
+        server = handler.server
+        odp = wykonaj(server.funcs, server._dispatch, zapytanie)
+    if odp is None:
+        handler.send_response(204)
+        handler.end_headers()
+        return
+    tresc = koduj(odp, kodowanie)
+    handler.send_response(200)
+    handler.send_header("Content-Type", TYPY[kodowanie])
+    if (len(tresc) > PROG_KOMPRESJI
+            and "gzip" in handler.headers.get("Accept-Encoding", "")):
+        tresc = gzip.compress(tresc, compresslevel=1)
+        handler.send_header("Content-Encoding", "gzip")
+    handler.send_header("Content-Length", str(len(tresc)))
+    handler.end_headers()
+    handler.wfile.write(tresc)
+
+
+def _odmow(handler: Any, status: int) -> None:
+    """Answer a request with an empty response with the given status
+    and close the connection."""
+    handler.send_response(status)
+    handler.send_header("Content-Length", "0")
+    handler.send_header("Connection", "close")
+    handler.end_headers()
+    handler.close_connection = True
+
+
+class Polaczenie:
+    """JSON-RPC client keeping one HTTP/1.1 connection open.
+
+    Failed calls raise xmlrpc.client.Fault, as with XML-RPC, and calls
+    that the server does not accept raise BrakTransportu.
+    """
+
+    def __init__(self, url: str, kodowanie: str = "json") -> None:
+        if kodowanie not in dostepne():
+            raise ValueError("Kodowanie niedostępne: {0}.".format(
+                kodowanie))
+        adres = urllib.parse.urlsplit(url)
+        self.host = adres.netloc
+        self.kodowanie = kodowanie
+        self._polaczenie: Optional[http.client.HTTPConnection] = None
+        self._nr = 0
+
+    def _wyslij(self, zapytanie: Any) -> Any:
+        tresc = koduj(zapytanie, self.kodowanie)
+        naglowki = {"Content-Type": TYPY[self.kodowanie],
+                    "Accept-Encoding": "gzip"}
+        for proba in (0, 1):
+            if self._polaczenie is None:
+                self._polaczenie = http.client.HTTPConnection(self.host)
+            try:
+                self._polaczenie.request("POST", SCIEZKA, tresc, naglowki)
+                odp = self._polaczenie.getresponse()
+                dane = odp.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                self.zamknij()
+                if proba:
+                    raise
+        if odp.status in (404, 415):
+            raise BrakTransportu(odp.status)
+        if odp.status != 200:
+            raise xmlrpc.client.ProtocolError(self.host + SCIEZKA,
+                                              odp.status, odp.reason,
+                                              dict(odp.getheaders()))
+        if odp.getheader("Content-Encoding") == "gzip":
+            dane = gzip.decompress(dane)
+        return dekoduj(dane, self.kodowanie)
+
+    def _zapytanie(self, metoda: str, params: List[Any]) -> Dict[str, Any]:
+        self._nr += 1
+        return {"jsonrpc": "2.0", "id": self._nr, "method": metoda,
+                "params": params}
+
+    def wywolaj(self, metoda: str, params: List[Any]) -> Any:
+        """Call a function of the API and return its result."""
+        return _wynik(self._wyslij(self._zapytanie(metoda, params)))
+
+    def wiele(self, wywolania: List[Tuple[str, List[Any]]]) -> List[Any]:
+        """Make many calls by one request. Returns a list holding,
+        for every call in order, its result or the Fault it raised."""
+        zapytania = [self._zapytanie(m, p) for m, p in wywolania]
+        odpowiedzi = self._wyslij(zapytania)
+        if isinstance(odpowiedzi, dict):
+            return [_fault(odpowiedzi)] * len(zapytania)
+        po_id = {o.get("id"): o for o in odpowiedzi}
+        res = []
+        for z in zapytania:
+            try:
+                res.append(_wynik(po_id[z["id"]]))
+            except xmlrpc.client.Fault as e:
+                res.append(e)
+        return res
+
+    def zamknij(self) -> None:
+        """Close the connection."""
+        if self._polaczenie is not None:
+            self._polaczenie.close()
+            self._polaczenie = None
+
+
+def _fault(odpowiedz: Dict[str, Any]) -> xmlrpc.client.Fault:
+    blad = odpowiedz.get("error") or {}
+    return xmlrpc.client.Fault(blad.get("code", BLAD_SERWERA),
+                               blad.get("message", ""))
+
+
+def _wynik(odpowiedz: Dict[str, Any]) -> Any:
+    """Return the result of a JSON-RPC response; raise a Fault
+    if it reports an error."""
+    if "error" in odpowiedz:
+        raise _fault(odpowiedz)
+    return odpowiedz.get("result")
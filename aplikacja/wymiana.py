@@ -0,0 +1,449 @@
+"""Exchange of calendars with other systems: import of events from CSV
+and iCalendar (.ics) files, and export of iCalendar feeds.
+
+Files are read as streams of records of dbops.importuj, so that memory
+does not grow with their size, and written in chunks of PACZKA records,
+each in its own transaction -- see importuj. After every chunk
+the progress is saved to a checkpoint file, from which an interrupted
+import resumes. The database keeps the progress as well, written
+by the chunk's transaction, so that a chunk written just before
+an interruption is not written again.
+
+Feeds are generated event by event from the events yielded
+by dbops.eksport -- see ics, so that they need not be held in memory.
+
+Imports nothing from SQLAlchemy, so that klient.py starts quickly.
+"""
+
+import csv
+import datetime
+import itertools
+import json
+import os
+import re
+import zoneinfo
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List
+from typing import Optional, Tuple
+
+
+KOLUMNY_CSV = ["nazwa", "data_rozp", "godzina_rozp", "data_zak",
+               "godzina_zak", "opis", "miejsce", "adres", "uczestnicy"]
+"""Columns of imported CSV files, named in their first row. Only the
+first five are required. Column uczestnicy lists participants separated
+by semicolons, each as `Imię <email>` or a bare email address."""
+PACZKA = 500
+"""Number of records written by one transaction -- see importuj."""
+Rekord = Tuple[int, Dict[str, Any]]
+"""Record of dbops.importuj with the number of the line where it starts
+in the file."""
+
+
+def _osoba(s: str) -> Dict[str, str]:
+    """Return the participant described by `Imię <email>` or an address.
+    The name of a person given only by the address is the address."""
+    m = re.fullmatch(r"(.*?)\s*<([^>]*)>", s)
+    if m is None:
+        return {"imie": s, "email": s}
+    return {"imie": m.group(1) or m.group(2), "email": m.group(2)}
+
+
+def czytaj_csv(f: IO[str]) -> Iterator[Rekord]:
+    """Yield the records of a CSV file -- see KOLUMNY_CSV.
+
+    Throws ValueError if a required column is missing.
+    """
+    czytnik = csv.DictReader(f)
+    naglowek = czytnik.fieldnames or []
+    brak = [k for k in KOLUMNY_CSV[:5] if k not in naglowek]
+    if brak:
+        raise ValueError("Brak kolumn: {0}.".format(", ".join(brak)))
+    linia = czytnik.line_num + 1
+    for wiersz in czytnik:
+        rekord: Dict[str, Any] = {k: wiersz.get(k) or ""
+                                  for k in KOLUMNY_CSV[:8]}
+        rekord["uczestnicy"] = [_osoba(o.strip()) for o in
+                                (wiersz.get("uczestnicy") or "").split(";")
+                                if o.strip()]
+        yield linia, rekord
+        linia = czytnik.line_num + 1
+
+
+def _rozwin(f: IO[str]) -> Iterator[Tuple[int, str]]:
+    """Yield the unfolded content lines of an iCalendar file with their
+    numbers (RFC 5545, 3.1)."""
+    nr, linia = 0, None
+    for i, s in enumerate(f, 1):
+        s = s.rstrip("\r\n")
+        if s[:1] in (" ", "\t") and linia is not None:
+            linia += s[1:]
+            continue
+        if linia is not None:
+            yield nr, linia
+        nr, linia = i, s
+    if linia is not None:
+        yield nr, linia
+
+
+def _wlasciwosc(linia: str) -> Tuple[str, Dict[str, str], str]:
+    """Split a content line into its name, parameters and value.
+    Separators within quoted parameter values are not split on."""
+    cudzyslow = False
+    czesci, start = [], 0
+    for i, z in enumerate(linia):
+        if z == '"':
+            cudzyslow = not cudzyslow
+        elif z in ";:" and not cudzyslow:
+            czesci.append(linia[start:i])
+            start = i + 1
+            if z == ":":
+                break
+    else:
+        return linia.upper(), {}, ""
+    nazwa, *parametry = czesci
+    return (nazwa.upper(),
+            {k.upper(): v.strip('"') for k, _, v in
+             (p.partition("=") for p in parametry)},
+            linia[i + 1:])
+
+
+def _tekst(s: str) -> str:
+    """Return an iCalendar text value without escapes."""
+    return re.sub(r"\\([\\;,nN])",
+                  lambda m: "\n" if m.group(1) in "nN" else m.group(1), s)
+
+
+def _chwila(s: str, koniec: bool = False,
+            strefa: Optional[str] = None) -> Tuple[str, str]:
+    """Return the date RRRR-MM-DD and hour GG:MM of an iCalendar moment,
+    in local time.
+
+    Times in UTC (ending with Z) or in the time zone strefa (parameter
+    TZID, an IANA name) are converted to local time; other times
+    are local already. A date alone is the start of a day-long event,
+    or the day after its end if koniec; the end is then the last minute
+    of the previous day. Values in other formats, and times in unknown
+    time zones, are returned as the date, so that they are rejected
+    by the validation of dbops.
+    """
+    m = re.fullmatch(r"(\d{4})(\d\d)(\d\d)(?:T(\d\d)(\d\d)(\d\d)(Z?))?",
+                     s)
+    if m is None:
+        return s, "00:00"
+    r, mies, d, gg, mm, ss, utc = m.groups()
+    if gg is not None:
+        try:
+            t = datetime.datetime(int(r), int(mies), int(d), int(gg),
+                                  int(mm), int(ss))
+            if utc:
+                t = _lokalnie(t.replace(tzinfo=datetime.timezone.utc))
+            elif strefa is not None:
+                t = _lokalnie(t.replace(tzinfo=zoneinfo.ZoneInfo(strefa)))
+        except (ValueError, KeyError):
+            return s, "00:00"
+        return t.strftime("%Y-%m-%d"), t.strftime("%H:%M")
+    data = "{0}-{1}-{2}".format(r, mies, d)
+    if koniec:
+        try:
+            dzien = datetime.date.fromisoformat(data)
+        except ValueError:
+            return data, "00:00"
+        return str(dzien - datetime.timedelta(days=1)), "23:59"
+    return data, "00:00"
+
+
+def _lokalnie(t: datetime.datetime) -> datetime.datetime:
+    """Return an aware moment as a naive one in local time."""
+    return t.astimezone().replace(tzinfo=None)
+
+
+def _regula_ics(wartosc: str) -> Dict[str, Any]:
+    """Return the rule of a series of dbops.importuj given by the value
+    of RRULE. Parts other than FREQ, INTERVAL, COUNT, UNTIL and WKST
+    are kept under their names in lower case, and values that are
+    not understood as they are, so that the rule is rejected
+    by the validation of dbops."""
+    czestotliwosci = {v: k for k, v in CZESTOTLIWOSCI.items()}
+    regula: Dict[str, Any] = {}
+    for czesc in wartosc.split(";"):
+        klucz, _, v = czesc.partition("=")
+        klucz = klucz.upper()
+        if klucz == "FREQ":
+            regula["czestotliwosc"] = czestotliwosci.get(v.upper(), v)
+        elif klucz in ("INTERVAL", "COUNT"):
+            regula["interwal" if klucz == "INTERVAL" else "liczba"] = (
+                int(v) if v.isdigit() else v)
+        elif klucz == "UNTIL":
+            data, godzina = _chwila(v)
+            regula["do"] = "{0} {1}".format(
+                data, "23:59" if len(v) == 8 else godzina)
+        elif klucz != "WKST":
+            regula[klucz.lower()] = v
+    regula.setdefault("czestotliwosc", "")
+    return regula
+
+
+def _rekord_ics(wlasciwosci: List[Tuple[str, Dict[str, str], str]]
+                ) -> Dict[str, Any]:
+    """Return the record of a VEVENT with the given properties."""
+    rekord: Dict[str, Any] = {"nazwa": "", "opis": "", "uczestnicy": []}
+    poczatek: Optional[str] = None
+    koniec: Optional[str] = None
+    strefy: Dict[str, Optional[str]] = {}
+    for nazwa, parametry, wartosc in wlasciwosci:
+        if nazwa == "SUMMARY":
+            rekord["nazwa"] = _tekst(wartosc)
+        elif nazwa == "DESCRIPTION":
+            rekord["opis"] = _tekst(wartosc)
+        elif nazwa == "LOCATION":
+            rekord["miejsce"] = _tekst(wartosc)
+        elif nazwa == "DTSTART":
+            poczatek = wartosc
+            strefy[nazwa] = parametry.get("TZID")
+        elif nazwa == "DTEND":
+            koniec = wartosc
+            strefy[nazwa] = parametry.get("TZID")
+        elif nazwa == "ATTENDEE":
+            email = re.sub(r"(?i)^mailto:", "", wartosc)
+            rekord["uczestnicy"].append(
+                {"imie": parametry.get("CN") or email, "email": email})
+        elif nazwa == "RRULE":
+            rekord["powtarzanie"] = _regula_ics(wartosc)
+        elif nazwa == "EXDATE":
+            rekord.setdefault("odwolane", []).extend(
+                "{0} {1}".format(*_chwila(v, strefa=parametry.get("TZID")))
+                for v in wartosc.split(","))
+        elif nazwa == "RECURRENCE-ID":
+            rekord["zastepuje"] = "{0} {1}".format(
+                *_chwila(wartosc, strefa=parametry.get("TZID")))
+    rekord["data_rozp"], rekord["godzina_rozp"] = _chwila(
+        poczatek or "", strefa=strefy.get("DTSTART"))
+    if koniec is None:
+        koniec = poczatek or ""
+        strefy["DTEND"] = strefy.get("DTSTART")
+        if len(koniec) == 8:
+            rekord["data_zak"], rekord["godzina_zak"] = (
+                rekord["data_rozp"], "23:59")
+            return rekord
+    rekord["data_zak"], rekord["godzina_zak"] = _chwila(
+        koniec, True, strefy.get("DTEND"))
+    return rekord
+
+
+def czytaj_ics(f: IO[str]) -> Iterator[Rekord]:
+    """Yield the records of the events (VEVENT) of an iCalendar file.
+
+    Uses properties SUMMARY, DESCRIPTION, LOCATION (the name
+    of the location), DTSTART, DTEND (with parameter TZID -- see _chwila),
+    ATTENDEE (with parameter CN as the name), RRULE -- see _regula_ics,
+    EXDATE and RECURRENCE-ID; components nested in events are skipped.
+    Events with RECURRENCE-ID, which replace occurrences of series,
+    are rejected by dbops.importuj.
+    """
+    skladniki: List[str] = []
+    wlasciwosci: List[Tuple[str, Dict[str, str], str]] = []
+    poczatek = 0
+    for nr, linia in _rozwin(f):
+        nazwa, parametry, wartosc = _wlasciwosc(linia)
+        if nazwa == "BEGIN":
+            skladniki.append(wartosc.upper())
+            if skladniki == ["VCALENDAR", "VEVENT"]:
+                poczatek, wlasciwosci = nr, []
+        elif nazwa == "END":
+            if skladniki == ["VCALENDAR", "VEVENT"]:
+                yield poczatek, _rekord_ics(wlasciwosci)
+            if skladniki:
+                skladniki.pop()
+        elif skladniki == ["VCALENDAR", "VEVENT"]:
+            wlasciwosci.append((nazwa, parametry, wartosc))
+
+
+def czytaj(plik: str) -> Iterator[Rekord]:
+    """Yield the records of a file: iCalendar if its extension is .ics,
+    CSV otherwise."""
+    ics = plik.lower().endswith(".ics")
+    with open(plik, "r", encoding="utf-8-sig",
+              newline=None if ics else "") as f:
+        yield from (czytaj_ics(f) if ics else czytaj_csv(f))
+
+
+def _tozsamosc(plik: str) -> List[int]:
+    """Return what identifies the version of a file in a checkpoint."""
+    stat = os.stat(plik)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _wczytaj_punkt(punkt: str, plik: str) -> Dict[str, int]:
+    """Return the progress saved in a checkpoint file, or no progress
+    if it is missing or was saved for another version of plik."""
+    try:
+        with open(punkt, "r", encoding="utf-8") as f:
+            zapis = json.load(f)
+        if zapis["plik"] == _tozsamosc(plik):
+            return {k: int(zapis[k]) for k in ("rekordy", "dodane",
+                                               "bledy")}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {"rekordy": 0, "dodane": 0, "bledy": 0}
+
+
+def _klucz_postepu(plik: str) -> str:
+    """Return the key under which the database keeps the progress
+    of an import of the current version of a file
+    -- see dbops.importuj."""
+    return "import:{0}:{1}:{2}".format(os.path.abspath(plik),
+                                       *_tozsamosc(plik))
+
+
+def _zapisz_punkt(punkt: str, plik: str, stan: Dict[str, int]) -> None:
+    """Save the progress to a checkpoint file, atomically."""
+    tymczasowy = punkt + ".tmp"
+    with open(tymczasowy, "w", encoding="utf-8") as f:
+        json.dump({"plik": _tozsamosc(plik), **stan}, f)
+    os.replace(tymczasowy, punkt)
+
+
+def importuj(wywolaj: Callable[[str, List[Any]], Any], plik: str,
+             paczka: int = PACZKA, rozmiar: Optional[int] = None,
+             punkt: Optional[str] = None,
+             zglos: Callable[[int, str], None] = lambda nr, blad: None
+             ) -> Dict[str, int]:
+    """Import the events of a CSV or iCalendar file -- see czytaj,
+    calling dbops.importuj once per chunk of records.
+
+    Returns a dictionary with fields rekordy (number of records read),
+    dodane (number of events inserted), bledy (number of rejected
+    records) and wznowiono (number of records skipped, having been
+    imported before the last interruption). Events of records
+    that the database held although the checkpoint file did not
+    are not counted in dodane.
+
+    Positional arguments:
+    wywolaj -- function calling a function of the API by name
+    -- see klient.polacz.
+
+    Keyword arguments:
+    paczka -- number of records written by one transaction.
+    rozmiar -- number of rows inserted by one statement
+    -- see dbops.importuj.
+    punkt -- path of the checkpoint file, by default plik with extension
+    .postep added. It is removed once the import is done.
+    zglos -- function called with the line number and the error message
+    of every rejected record.
+    """
+    if punkt is None:
+        punkt = plik + ".postep"
+    klucz = _klucz_postepu(plik)
+    stan = _wczytaj_punkt(punkt, plik)
+    wznowiono = stan["rekordy"]
+    rekordy = itertools.islice(czytaj(plik), wznowiono, None)
+    while True:
+        porcja = list(itertools.islice(rekordy, paczka))
+        if not porcja:
+            break
+        wynik = wywolaj("importuj", [[r for _, r in porcja], False,
+                                     rozmiar, klucz, stan["rekordy"]])
+        for blad in wynik["bledy"]:
+            zglos(porcja[blad["nr"]][0], blad["blad"])
+        wznowiono += wynik["pominiete"]
+        stan["rekordy"] += len(porcja)
+        stan["dodane"] += sum(1 for id in wynik["id"] if id is not None)
+        stan["bledy"] += len(wynik["bledy"])
+        _zapisz_punkt(punkt, plik, stan)
+    if os.path.exists(punkt):
+        os.remove(punkt)
+    wywolaj("importuj", [[], False, rozmiar, klucz, stan["rekordy"], True])
+    return {**stan, "wznowiono": wznowiono}
+
+
+SCIEZKA_EKSPORTU = "/eksport.ics"
+"""Path at which the server sends iCalendar feeds -- see
+serwer.ObslugaZapytan.eksport."""
+PRODID = "-//py-calendar//kalendarz//PL"
+"""Identifier of the program that generated an exported feed."""
+
+
+def _ucieczka(s: str) -> str:
+    """Return an iCalendar text value with special characters escaped."""
+    return (s.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _zwin(linia: str) -> str:
+    """Return a content line folded into lines of at most 75 octets,
+    ending with CRLF (RFC 5545, 3.1)."""
+    if len(linia.encode("utf-8")) <= 75:
+        return linia + "\r\n"
+    czesci = []
+    czesc = ""
+    dlugosc = 0
+    for z in linia:
+        n = len(z.encode("utf-8"))
+        if dlugosc + n > 75:
+            czesci.append(czesc)
+            czesc, dlugosc = " ", 1
+        czesc += z
+        dlugosc += n
+    czesci.append(czesc)
+    return "\r\n".join(czesci) + "\r\n"
+
+
+CZESTOTLIWOSCI = {"dziennie": "DAILY", "tygodniowo": "WEEKLY",
+                  "miesiecznie": "MONTHLY"}
+"""iCalendar frequencies of the frequencies of dbops.CZESTOTLIWOSCI."""
+
+
+def _czas(t: datetime.datetime) -> str:
+    """Return an iCalendar local moment."""
+    return t.strftime("%Y%m%dT%H%M%S")
+
+
+def _regula(regula: Dict[str, Any]) -> str:
+    """Return the value of RRULE of a rule in the format
+    of dbops.eksport."""
+    res = "FREQ={0};INTERVAL={1}".format(
+        CZESTOTLIWOSCI[regula["czestotliwosc"]], regula["interwal"])
+    if regula["liczba"] is not None:
+        res += ";COUNT={0}".format(regula["liczba"])
+    if regula["do_kiedy"] is not None:
+        res += ";UNTIL=" + _czas(regula["do_kiedy"])
+    return res
+
+
+def ics(wydarzenia: Iterable[Dict[str, Any]],
+        teraz: Optional[datetime.datetime] = None) -> Iterator[str]:
+    """Yield an iCalendar feed with the given events, in pieces:
+    the header, one piece per event and the footer.
+
+    Positional arguments:
+    wydarzenia -- events in the format of dbops.eksport.
+
+    Keyword arguments:
+    teraz -- moment of the export, in UTC; the current moment if `None`.
+    """
+    if teraz is None:
+        teraz = datetime.datetime.now(datetime.timezone.utc)
+    znacznik = teraz.strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + _zwin("PRODID:" + PRODID)
+    for w in wydarzenia:
+        zastepuje = w.get("zastepuje")
+        linie = ["BEGIN:VEVENT", "UID:{0}@kalendarz".format(
+                     w["id"] if zastepuje is None else zastepuje[0]),
+                 "DTSTAMP:" + znacznik,
+                 "DTSTART:" + _czas(w["poczatek"]),
+                 "DTEND:" + _czas(w["koniec"]),
+                 "SUMMARY:" + _ucieczka(w["nazwa"])]
+        if zastepuje is not None:
+            linie.append("RECURRENCE-ID:" + _czas(zastepuje[1]))
+        if w.get("powtarzanie"):
+            linie.append("RRULE:" + _regula(w["powtarzanie"]))
+            linie.extend("EXDATE:" + _czas(p) for p in w.get("odwolane", []))
+        if w.get("opis"):
+            linie.append("DESCRIPTION:" + _ucieczka(w["opis"]))
+        if w.get("nazwa_miejsca"):
+            linie.append("LOCATION:" + _ucieczka(w["nazwa_miejsca"]))
+        for o in w.get("uczestnicy", []):
+            linie.append('ATTENDEE;CN="{0}":mailto:{1}'.format(
+                o["imie"].replace('"', "'"), o["email"]))
+        linie.append("END:VEVENT")
+        yield "".join(_zwin(linia) for linia in linie)
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,11 @@
+"""Performance benchmarks of the functions of dbops, called directly
+and through the XML-RPC server of serwer.py. Run with
+`python -m pomiary -h` for help.
+
+generator.py builds a synthetic calendar, operacje.py describes
+how each function exposed by the server is called, and pomiar.py
+times the calls, reports their latency and compares it with a baseline.
+start.py measures the startup time of klient.py
+(`python -m pomiary.start`), and kodowanie.py the cost of encoding
+results by each transport (`python -m pomiary.kodowanie`).
+"""
@@ -0,0 +1,5 @@
+import sys
+from pomiary import pomiar
+
+
+sys.exit(pomiar.main())
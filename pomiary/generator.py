@@ -0,0 +1,92 @@
+"""Seeded generator of synthetic calendars used by the benchmarks."""
+
+import aplikacja.dbops as dbops
+import datetime
+import random
+from sqlalchemy import Engine
+from typing import Any, Dict, List
+
+
+SLOWA = ["wykład", "seminarium", "spotkanie", "koncert", "trening",
+         "konsultacje", "egzamin", "warsztaty", "zebranie", "wycieczka"]
+"""Words from which names of events are built."""
+IMIONA = ["Anna", "Piotr", "Maria", "Jan", "Katarzyna", "Tomasz",
+          "Agnieszka", "Paweł", "Zofia", "Michał", "Ewa", "Krzysztof"]
+"""Names given to generated people."""
+ULICE = ["Banacha", "Pasteura", "Żwirki i Wigury", "Krakowskie Przedmieście",
+         "Dobra", "Hoża", "Joliot-Curie", "Kopernika"]
+"""Streets in the addresses of generated locations."""
+POCZATEK = datetime.date(2024, 1, 1)
+"""Date of the first day of generated calendars."""
+
+
+def generuj(engine: Engine, osoby: int = 1000, miejsca: int = 50,
+            wydarzenia: int = 5000, gestosc: float = 3.0, dni: int = 365,
+            ziarno: int = 0) -> Dict[str, Any]:
+    """Fill the database with a synthetic calendar.
+
+    The same arguments always produce the same calendar.
+    Returns a dictionary describing the calendar, used to choose
+    the arguments of benchmarked calls -- see operacje.py, with fields:
+    miejsca, osoby, wydarzenia -- lists of dictionaries with fields id
+    and nazwa (places, events) or id, imie and email (people).
+    dni -- number of days covered by the calendar.
+    licznik -- number used to make generated names and addresses unique.
+
+    Keyword arguments:
+    osoby, miejsca, wydarzenia -- numbers of generated rows.
+    gestosc -- mean number of events a person is signed up for.
+    dni -- events start within this many days from POCZATEK.
+    ziarno -- seed of the random number generator.
+    """
+    rng = random.Random(ziarno)
+    dbops.utworz(engine)
+
+    msc = [{"nazwa": "sala {0}".format(i),
+            "adres": "{0} {1}".format(rng.choice(ULICE), rng.randint(1, 99))}
+           for i in range(miejsca)]
+    msc_ids = dbops.dodaj_miejsca(engine, msc, True)["id"]
+
+    ludzie = [{"imie": rng.choice(IMIONA),
+               "email": "osoba{0}@przyklad.pl".format(i)}
+              for i in range(osoby)]
+    os_ids = dbops.dodaj_osoby(engine, ludzie, True)["id"]
+
+    wyd = [wydarzenie(rng, "{0} {1}".format(rng.choice(SLOWA), i % 100), dni)
+           for i in range(wydarzenia)]
+    for w in wyd:
+        if msc_ids and rng.random() < 0.8:
+            w["id_miejsca"] = rng.choice(msc_ids)
+    wyd_ids = dbops.dodaj_wydarzenia(engine, wyd, True)["id"]
+
+    zapisy: List[Dict[str, Any]] = []
+    if wyd_ids:
+        for czlowiek in ludzie:
+            k = min(len(wyd_ids), rng.randint(0, round(2 * gestosc)))
+            zapisy.extend({"email": czlowiek["email"], "id_wydarzenia": i}
+                          for i in rng.sample(wyd_ids, k))
+    dbops.zapisz_wiele(engine, zapisy, True)
+
+    return {"miejsca": [{"id": i, "nazwa": m["nazwa"]}
+                        for i, m in zip(msc_ids, msc)],
+            "osoby": [{"id": i, "imie": o["imie"], "email": o["email"]}
+                      for i, o in zip(os_ids, ludzie)],
+            "wydarzenia": [{"id": i, "nazwa": w["nazwa"]}
+                           for i, w in zip(wyd_ids, wyd)],
+            "dni": dni, "licznik": max(osoby, miejsca, wydarzenia)}
+
+
+def wydarzenie(rng: random.Random, nazwa: str, dni: int) -> Dict[str, Any]:
+    """Return a record of dbops.dodaj_wydarzenia describing an event
+    lasting from half an hour to four hours within some of the first dni
+    days from POCZATEK."""
+    dzien = POCZATEK + datetime.timedelta(days=rng.randrange(max(dni, 1)))
+    poczatek = datetime.datetime.combine(dzien, datetime.time(
+        rng.randint(6, 19), rng.choice([0, 15, 30, 45])))
+    koniec = poczatek + datetime.timedelta(minutes=rng.randint(2, 16) * 15)
+    return {"nazwa": nazwa,
+            "data_rozp": poczatek.strftime("%Y-%m-%d"),
+            "godzina_rozp": poczatek.strftime("%H:%M"),
+            "data_zak": koniec.strftime("%Y-%m-%d"),
+            "godzina_zak": koniec.strftime("%H:%M"),
+            "opis": "opis wydarzenia {0}".format(nazwa)}
@@ -0,0 +1,100 @@
+"""Benchmark of the encoding and decoding of results by each transport
+of the server -- see aplikacja/transport.py. Run with
+`python -m pomiary.kodowanie -h` for help.
+
+Results are lists of people in the format of dbops.dict_of_osoba,
+as returned by znajdz_zapisanych_na_wydarzenie.
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+import xmlrpc.client
+from aplikacja import transport
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _xmlrpc(wynik: Any) -> Tuple[Callable[[], bytes],
+                                 Callable[[bytes], Any]]:
+    """Return the encoder and decoder of a result sent by XML-RPC."""
+    return (lambda: xmlrpc.client.dumps((wynik,), methodresponse=True,
+                                        allow_none=True).encode("utf-8"),
+            lambda dane: xmlrpc.client.loads(dane)[0][0])
+
+
+def _kompaktowy(kodowanie: str) -> Callable[[Any], Tuple[
+        Callable[[], bytes], Callable[[bytes], Any]]]:
+    """Return _xmlrpc's counterpart for JSON-RPC with given encoding."""
+    def res(wynik: Any) -> Tuple[Callable[[], bytes],
+                                 Callable[[bytes], Any]]:
+        odp = {"jsonrpc": "2.0", "id": 1, "result": wynik}
+        return (lambda: transport.koduj(odp, kodowanie),
+                lambda dane: transport.dekoduj(dane, kodowanie)["result"])
+    return res
+
+
+TRANSPORTY = {"xmlrpc": _xmlrpc,
+              **{k: _kompaktowy(k) for k in transport.dostepne()}}
+"""Transports available in this process, with functions returning
+the encoder and decoder of a given result."""
+
+
+def osoby(n: int) -> List[Dict[str, Any]]:
+    """Return a result listing n people."""
+    return [{"id": i, "imie": "Katarzyna", "email":
+             "osoba{0}@przyklad.pl".format(i)} for i in range(n)]
+
+
+def zmierz(f: Callable[[], Any], powtorzenia: int) -> float:
+    """Return the median duration of calls of f, in microseconds."""
+    czasy = []
+    for _ in range(powtorzenia):
+        start = time.perf_counter()
+        f()
+        czasy.append(time.perf_counter() - start)
+    return 1e6 * sorted(czasy)[len(czasy) // 2]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pomiary.kodowanie")
+    parser.add_argument("--rozmiary", type=int, nargs="*",
+                        default=[1, 10, 100, 1000, 10000],
+                        help="Liczby wierszy wyników.")
+    parser.add_argument("--powtorzenia", type=int, default=50,
+                        help="Liczba pomiarów każdej operacji.")
+    parser.add_argument("--wynik", help="Ścieżka pliku JSON z wynikami.")
+    args = parser.parse_args(argv)
+
+    wyniki = []
+    print("{0:>7} {1:<8} {2:>9} {3:>9} {4:>11} {5:>11} {6:>9}".format(
+        "wiersze", "transp.", "bajty", "gzip", "kodowanie", "dekodowanie",
+        "gzip us"))
+    for n in args.rozmiary:
+        wynik = osoby(n)
+        for nazwa, kodeki in TRANSPORTY.items():
+            koduj, dekoduj = kodeki(wynik)
+            dane = koduj()
+            skompresowane = gzip.compress(dane, compresslevel=1)
+            w = {"wiersze": n, "transport": nazwa, "bajty": len(dane),
+                 "bajty_gzip": len(skompresowane),
+                 "kodowanie_us": zmierz(koduj, args.powtorzenia),
+                 "dekodowanie_us": zmierz(lambda: dekoduj(dane),
+                                          args.powtorzenia),
+                 "gzip_us": zmierz(lambda: gzip.compress(dane,
+                                                         compresslevel=1),
+                                   args.powtorzenia)}
+            wyniki.append(w)
+            print("{0:>7} {1:<8} {2:>9} {3:>9} {4:>11.1f} {5:>11.1f}"
+                  " {6:>9.1f}".format(n, nazwa, w["bajty"], w["bajty_gzip"],
+                                      w["kodowanie_us"], w["dekodowanie_us"],
+                                      w["gzip_us"]))
+    if args.wynik is not None:
+        with open(args.wynik, "w", encoding="utf-8") as f:
+            json.dump(wyniki, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
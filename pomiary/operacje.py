@@ -0,0 +1,198 @@
+"""Arguments of the benchmarked calls, one entry per function exposed
+by the server -- see serwer.FUNKCJE."""
+
+import aplikacja.dbops as dbops
+import datetime
+import random
+from pomiary import generator
+from sqlalchemy import Engine
+from typing import Callable, Any, Dict, List
+
+
+Operacja = Callable[[Engine, Dict[str, Any], random.Random], List[Any]]
+
+
+def _nowy(kal: Dict[str, Any]) -> int:
+    """Return a number not used yet in names of the calendar kal."""
+    kal["licznik"] += 1
+    res: int = kal["licznik"]
+    return res
+
+
+def _wydarzenie(kal: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    """Return a record of a new event -- see generator.wydarzenie."""
+    return generator.wydarzenie(rng, "nowe {0}".format(_nowy(kal)),
+                                kal["dni"])
+
+
+def _argumenty_wydarzenia(kal: Dict[str, Any],
+                          rng: random.Random) -> List[Any]:
+    """Return the arguments of dbops.dodaj_wydarzenie for a new event."""
+    w = _wydarzenie(kal, rng)
+    return [w["nazwa"], w["data_rozp"], w["godzina_rozp"],
+            w["data_zak"], w["godzina_zak"], w["opis"]]
+
+
+def _osoba(kal: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a record of a new person with a unique address."""
+    n = _nowy(kal)
+    return {"imie": "Nowa", "email": "nowa{0}@przyklad.pl".format(n)}
+
+
+def _id(kal: Dict[str, Any], rng: random.Random, tabela: str) -> int:
+    """Return the ID of a random row of the calendar from a given table
+    -- "miejsca", "osoby" or "wydarzenia"."""
+    res: int = rng.choice(kal[tabela])["id"]
+    return res
+
+
+def _przedzial(kal: Dict[str, Any], rng: random.Random) -> List[Any]:
+    """Return the bounds of a random day of the calendar."""
+    od = (generator.POCZATEK
+          + datetime.timedelta(days=rng.randrange(kal["dni"])))
+    do = od + datetime.timedelta(days=1)
+    return [od.strftime("%Y-%m-%d 00:00"), do.strftime("%Y-%m-%d 00:00")]
+
+
+def _usun_wydarzenie(engine: Engine, kal: Dict[str, Any],
+                     rng: random.Random) -> List[Any]:
+    return [dbops.dodaj_wydarzenie(engine, *_argumenty_wydarzenia(kal, rng))]
+
+
+def _usun_miejsce(engine: Engine, kal: Dict[str, Any],
+                  rng: random.Random) -> List[Any]:
+    return [dbops.dodaj_miejsce(engine, "nowa sala {0}".format(_nowy(kal)),
+                                "Banacha 2")]
+
+
+def _usun_osoba(engine: Engine, kal: Dict[str, Any],
+                rng: random.Random) -> List[Any]:
+    o = _osoba(kal)
+    return [dbops.dodaj_osoba(engine, o["imie"], o["email"])]
+
+
+def _zapisz(engine: Engine, kal: Dict[str, Any],
+            rng: random.Random) -> List[Any]:
+    o = _osoba(kal)
+    dbops.dodaj_osoba(engine, o["imie"], o["email"])
+    return [o["email"], _id(kal, rng, "wydarzenia")]
+
+
+def _zapisz_wiele(engine: Engine, kal: Dict[str, Any],
+                  rng: random.Random) -> List[Any]:
+    ludzie = [_osoba(kal) for _ in range(10)]
+    dbops.dodaj_osoby(engine, ludzie)
+    return [[{"email": o["email"],
+              "id_wydarzenia": _id(kal, rng, "wydarzenia")}
+             for o in ludzie]]
+
+
+def _importuj(engine: Engine, kal: Dict[str, Any],
+              rng: random.Random) -> List[Any]:
+    o = rng.choice(kal["osoby"])
+    return [[{**_wydarzenie(kal, rng),
+              "miejsce": rng.choice(kal["miejsca"])["nazwa"],
+              "uczestnicy": [{"imie": o["imie"], "email": o["email"]},
+                             _osoba(kal)]} for _ in range(10)]]
+
+
+def _wypisz(engine: Engine, kal: Dict[str, Any],
+            rng: random.Random) -> List[Any]:
+    args = _zapisz(engine, kal, rng)
+    dbops.zapisz(engine, *args)
+    return args
+
+
+def _seria(engine: Engine, kal: Dict[str, Any],
+           rng: random.Random) -> List[Any]:
+    """Add a weekly series of ten occurrences. Returns its ID
+    and the starting moment of a random occurrence."""
+    w = _wydarzenie(kal, rng)
+    id_wydarzenia = dbops.dodaj_wydarzenie(
+        engine, w["nazwa"], w["data_rozp"], w["godzina_rozp"],
+        w["data_zak"], w["godzina_zak"], w["opis"])
+    dbops.ustaw_powtarzanie(engine, id_wydarzenia, "tygodniowo", 1, 10)
+    poczatek = (dbops.parsuj_chwile(w["data_rozp"] + " " + w["godzina_rozp"])
+                + datetime.timedelta(weeks=rng.randrange(10)))
+    return [id_wydarzenia, poczatek.strftime("%Y-%m-%d %H:%M")]
+
+
+OPERACJE: Dict[str, Operacja] = {
+    "utworz": lambda engine, kal, rng: [],
+    "dodaj_wydarzenie":
+    lambda engine, kal, rng: _argumenty_wydarzenia(kal, rng),
+    "dodaj_wydarzenia":
+    lambda engine, kal, rng: [[_wydarzenie(kal, rng) for _ in range(10)]],
+    "usun_wydarzenie": _usun_wydarzenie,
+    "mod_wydarzenie":
+    lambda engine, kal, rng: [_id(kal, rng, "wydarzenia"),
+                              None, None, None, None, None,
+                              "zmieniony opis {0}".format(_nowy(kal))],
+    "znajdz_wydarzenie":
+    lambda engine, kal, rng: [rng.choice(kal["wydarzenia"])["nazwa"]],
+    "znajdz_wydarzenia_w_przedziale":
+    lambda engine, kal, rng: _przedzial(kal, rng),
+    "dodaj_miejsce":
+    lambda engine, kal, rng: ["nowa sala {0}".format(_nowy(kal)),
+                              "Pasteura 5"],
+    "dodaj_miejsca":
+    lambda engine, kal, rng: [[{"nazwa": "nowa sala {0}".format(_nowy(kal)),
+                                "adres": "Hoża 69"} for _ in range(10)]],
+    "usun_miejsce": _usun_miejsce,
+    "mod_miejsce":
+    lambda engine, kal, rng: [_id(kal, rng, "miejsca"), None,
+                              "Dobra {0}".format(_nowy(kal))],
+    "znajdz_miejsce":
+    lambda engine, kal, rng: [rng.choice(kal["miejsca"])["nazwa"]],
+    "dodaj_miejsce_do_wydarzenia":
+    lambda engine, kal, rng: [_id(kal, rng, "miejsca"),
+                              _id(kal, rng, "wydarzenia"), "ostrzez"],
+    "usun_miejsce_z_wydarzenia":
+    lambda engine, kal, rng: [_id(kal, rng, "wydarzenia")],
+    "znajdz_wydarzenia_w_miejscu":
+    lambda engine, kal, rng: [rng.choice(kal["miejsca"])["nazwa"]],
+    "wolne_terminy":
+    lambda engine, kal, rng: [_id(kal, rng, "miejsca"),
+                              *_przedzial(kal, rng), 30],
+    "dodaj_osoba":
+    lambda engine, kal, rng: list(_osoba(kal).values()),
+    "dodaj_osoby":
+    lambda engine, kal, rng: [[_osoba(kal) for _ in range(10)]],
+    "usun_osoba": _usun_osoba,
+    "mod_osoba":
+    lambda engine, kal, rng: [_id(kal, rng, "osoby"),
+                              rng.choice(generator.IMIONA), None],
+    "znajdz_osoba":
+    lambda engine, kal, rng: [rng.choice(generator.IMIONA)],
+    "zapisz": _zapisz,
+    "zapisz_wiele": _zapisz_wiele,
+    "wypisz": _wypisz,
+    "importuj": _importuj,
+    "znajdz_wydarzenia_osoby":
+    lambda engine, kal, rng: [rng.choice(kal["osoby"])["email"]],
+    "znajdz_zapisanych_na_wydarzenie":
+    lambda engine, kal, rng: [_id(kal, rng, "wydarzenia")],
+    "wspolny_wolny_czas":
+    lambda engine, kal, rng: [[o["email"] for o in
+                               rng.sample(kal["osoby"],
+                                          min(30, len(kal["osoby"])))],
+                              *_przedzial(kal, rng), 30],
+    "szukaj":
+    lambda engine, kal, rng: [rng.choice(generator.SLOWA)[:3]],
+    "rewizja": lambda engine, kal, rng: [],
+    "zmiany_od":
+    lambda engine, kal, rng: [max(0, dbops.rewizja(engine) - 100), 100],
+    "ustaw_powtarzanie":
+    lambda engine, kal, rng: (_usun_wydarzenie(engine, kal, rng)
+                              + ["tygodniowo", 1, 10, None]),
+    "ustaw_limit_miejsc":
+    lambda engine, kal, rng: _usun_wydarzenie(engine, kal, rng) + [20],
+    "odwolaj_wystapienie": _seria,
+    "mod_wystapienie":
+    lambda engine, kal, rng: (_seria(engine, kal, rng)
+                              + [None, None, "18:00", None, "19:00",
+                                 None])}
+"""Functions returning the arguments of a benchmarked call, except
+the engine, by API name. They take the engine, the calendar described
+by generator.generuj and a random number generator, and may modify
+the database to prepare the call, e.g. add the row it deletes."""
@@ -0,0 +1,213 @@
+"""Timing of the benchmarked calls, reports and comparison
+with a baseline. See main for the command line interface."""
+
+import aplikacja.dbops as dbops
+import aplikacja.serwer as serwer
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import xmlrpc.client
+from pomiary import generator
+from pomiary.operacje import OPERACJE
+from sqlalchemy import Engine
+from typing import Callable, Any, Dict, List, Optional
+
+
+Statystyki = Dict[str, float]
+Wyniki = Dict[str, Dict[str, Statystyki]]
+"""Statistics of calls by way of calling ("lokalnie" or "rpc")
+and by API name -- see statystyki."""
+PERCENTYLE = [50, 95, 99]
+
+
+def percentyl(posortowane: List[float], p: float) -> float:
+    """Return the p-th percentile of a non-empty sorted list,
+    by the nearest-rank method."""
+    k = max(math.ceil(p / 100 * len(posortowane)), 1)
+    return posortowane[k - 1]
+
+
+def statystyki(czasy: List[float]) -> Statystyki:
+    """Return statistics of the durations of calls, in seconds.
+
+    Returns a dictionary with fields:
+    liczba -- number of calls.
+    przepustowosc -- calls per second, one call at a time.
+    srednia, p50, p95, p99 -- mean latency and its percentiles,
+    in milliseconds.
+    """
+    posortowane = sorted(czasy)
+    suma = sum(czasy)
+    res = {"liczba": len(czasy),
+           "przepustowosc": len(czasy) / suma if suma > 0 else 0.0,
+           "srednia": 1000 * suma / len(czasy)}
+    for p in PERCENTYLE:
+        res["p{0}".format(p)] = 1000 * percentyl(posortowane, p)
+    return res
+
+
+def zmierz(wywolaj: Callable[[str, List[Any]], Any], engine: Engine,
+           kal: Dict[str, Any], nazwy: List[str], powtorzenia: int,
+           ziarno: int = 0) -> Dict[str, Statystyki]:
+    """Time calls of the given functions.
+
+    Arguments of each call are chosen -- see OPERACJE -- before its
+    timing starts. Returns statistics by API name -- see statystyki.
+
+    Positional arguments:
+    wywolaj -- function that makes a call given the API name of the
+    function and its arguments except the engine.
+    engine -- engine used to prepare the calls.
+    kal -- the calendar in the database -- see generator.generuj.
+    nazwy -- API names of the functions.
+    powtorzenia -- number of calls of each function.
+
+    Keyword arguments:
+    ziarno -- seed of the random number generator choosing arguments.
+    """
+    rng = random.Random(ziarno)
+    res = {}
+    for nazwa in nazwy:
+        czasy = []
+        for _ in range(powtorzenia):
+            args = OPERACJE[nazwa](engine, kal, rng)
+            start = time.perf_counter()
+            wywolaj(nazwa, args)
+            czasy.append(time.perf_counter() - start)
+        res[nazwa] = statystyki(czasy)
+    return res
+
+
+def porownaj(wyniki: Wyniki, bazowe: Wyniki,
+             tolerancja: float) -> List[Dict[str, Any]]:
+    """Return the regressions of wyniki with respect to bazowe.
+
+    A call regressed if its median or 95th percentile of latency grew
+    by more than the fraction tolerancja. Returns a list of dictionaries
+    with fields tryb (way of calling), nazwa (API name), miara
+    (the percentile), bylo and jest (baseline and current latency).
+    """
+    res = []
+    for tryb, funkcje in wyniki.items():
+        for nazwa, stat in funkcje.items():
+            baza = bazowe.get(tryb, {}).get(nazwa)
+            if baza is None:
+                continue
+            for miara in ["p50", "p95"]:
+                if stat[miara] > baza[miara] * (1 + tolerancja):
+                    res.append({"tryb": tryb, "nazwa": nazwa,
+                                "miara": miara, "bylo": baza[miara],
+                                "jest": stat[miara]})
+    return res
+
+
+def wypisz_wyniki(wyniki: Wyniki) -> None:
+    """Print a table of the statistics."""
+    print("{0:<8} {1:<32} {2:>9} {3:>9} {4:>9} {5:>9}".format(
+        "tryb", "funkcja", "wyw./s", "p50 ms", "p95 ms", "p99 ms"))
+    for tryb, funkcje in wyniki.items():
+        for nazwa, s in funkcje.items():
+            print("{0:<8} {1:<32} {2:>9.1f} {3:>9.3f} {4:>9.3f} {5:>9.3f}"
+                  .format(tryb, nazwa, s["przepustowosc"],
+                          s["p50"], s["p95"], s["p99"]))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Generate a calendar, time the calls, print and save the results.
+
+    Returns the exit status: 1 if a regression was found
+    with respect to the baseline, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(prog="python -m pomiary")
+    parser.add_argument("--osoby", type=int, default=1000,
+                        help="Liczba osób w kalendarzu.")
+    parser.add_argument("--miejsca", type=int, default=50,
+                        help="Liczba miejsc w kalendarzu.")
+    parser.add_argument("--wydarzenia", type=int, default=5000,
+                        help="Liczba wydarzeń w kalendarzu.")
+    parser.add_argument("--gestosc", type=float, default=3.0,
+                        help="Średnia liczba wydarzeń, na które"
+                        " zapisana jest osoba.")
+    parser.add_argument("--ziarno", type=int, default=0,
+                        help="Ziarno generatora liczb losowych.")
+    parser.add_argument("--powtorzenia", type=int, default=200,
+                        help="Liczba wywołań każdej funkcji.")
+    parser.add_argument("--funkcje", nargs="*",
+                        help="Nazwy mierzonych funkcji; domyślnie"
+                        " wszystkie udostępniane przez serwer.")
+    parser.add_argument("--tryb", choices=["prosty", "watki"],
+                        default="watki", help="Tryb pracy serwera.")
+    parser.add_argument("--bez-rpc", action="store_true",
+                        help="Mierzy tylko wywołania bezpośrednie.")
+    parser.add_argument("--baza", default="baza/pomiary.db",
+                        help="Ścieżka pliku bazy danych; plik jest"
+                        " usuwany przed pomiarem.")
+    parser.add_argument("--wynik", help="Ścieżka pliku JSON z wynikami.")
+    parser.add_argument("--porownaj",
+                        help="Ścieżka pliku JSON z wynikami bazowymi.")
+    parser.add_argument("--tolerancja", type=float, default=0.2,
+                        help="Dopuszczalny względny wzrost opóźnienia.")
+    args = parser.parse_args(argv)
+
+    nazwy = args.funkcje or [name for _, name in serwer.FUNKCJE]
+    for nazwa in nazwy:
+        if nazwa not in OPERACJE:
+            parser.error("Nieznana funkcja: {0}.".format(nazwa))
+
+    dbops.echo = False
+    dbops.path = args.baza
+    dbops.dbpath = "sqlite:///" + args.baza
+    if os.path.exists(args.baza):
+        os.remove(args.baza)
+    engine = dbops.get_engine()
+    parametry = {k: getattr(args, k) for k in
+                 ["osoby", "miejsca", "wydarzenia", "gestosc", "ziarno",
+                  "powtorzenia", "tryb"]}
+    kal = generator.generuj(engine, args.osoby, args.miejsca,
+                            args.wydarzenia, args.gestosc,
+                            ziarno=args.ziarno)
+
+    funkcje = {name: f for f, name in serwer.FUNKCJE}
+    wyniki: Wyniki = {}
+    wyniki["lokalnie"] = zmierz(
+        lambda nazwa, a: funkcje[nazwa](engine, *a),
+        engine, kal, nazwy, args.powtorzenia, args.ziarno)
+    if not args.bez_rpc:
+        server = serwer.zbuduj_serwer(port=0, tryb=args.tryb)
+        server.logRequests = False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        proxy = xmlrpc.client.ServerProxy(
+            "http://localhost:{0}".format(server.server_address[1]),
+            allow_none=True)
+        try:
+            wyniki["rpc"] = zmierz(
+                lambda nazwa, a: getattr(proxy, nazwa)(*a),
+                engine, kal, nazwy, args.powtorzenia, args.ziarno)
+        finally:
+            server.shutdown()
+            server.server_close()
+    dbops.dispose_engines()
+
+    wypisz_wyniki(wyniki)
+    if args.wynik is not None:
+        with open(args.wynik, "w", encoding="utf-8") as f:
+            json.dump({"parametry": parametry, "wyniki": wyniki}, f,
+                      indent=2, ensure_ascii=False)
+    if args.porownaj is not None:
+        with open(args.porownaj, "r", encoding="utf-8") as f:
+            bazowe = json.load(f)
+        if bazowe.get("parametry") != parametry:
+            print("Uwaga: parametry pomiaru bazowego są inne.",
+                  file=sys.stderr)
+        regresje = porownaj(wyniki, bazowe["wyniki"], args.tolerancja)
+        for r in regresje:
+            print("Regresja: {0} {1} {2}: {3:.3f} ms -> {4:.3f} ms".format(
+                r["tryb"], r["nazwa"], r["miara"], r["bylo"], r["jest"]))
+        if regresje:
+            return 1
+    return 0
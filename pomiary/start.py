@@ -0,0 +1,71 @@
+"""Benchmark of the startup time of klient.py. Run with
+`python -m pomiary.start -h` for help.
+
+Each measured command is run in a fresh interpreter, from the directory
+holding help.txt, and parses the arguments of a remote action (option
+-s) without calling the server.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pomiary import pomiar
+from typing import Dict, List, Optional
+
+
+KLIENT = ("import sys, aplikacja.klient as k;"
+          " k.zbuduj_parser().parse_args(['-s', '--szukaj', '--tekst', 'x']);"
+          " sys.exit('sqlalchemy' in sys.modules)")
+"""Code building the client's parser; exits with status 1
+if SQLAlchemy was imported."""
+POLECENIA = {"import aplikacja.dbops": "import aplikacja.dbops",
+             "klient -s": KLIENT}
+"""Measured commands, by name."""
+
+
+def uruchom(kod: str, katalog: str) -> float:
+    """Run Python code in a fresh interpreter and return its duration
+    in seconds. Throws CalledProcessError if it fails."""
+    env = dict(os.environ)
+    korzen = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(
+        [korzen] + [p for p in [env.get("PYTHONPATH")] if p])
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", kod], cwd=katalog, env=env,
+                   check=True)
+    return time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pomiary.start")
+    parser.add_argument("--powtorzenia", type=int, default=20,
+                        help="Liczba uruchomień każdego polecenia.")
+    parser.add_argument("--katalog", default=".",
+                        help="Katalog z plikiem help.txt.")
+    parser.add_argument("--wynik", help="Ścieżka pliku JSON z wynikami.")
+    args = parser.parse_args(argv)
+
+    pamiec = os.path.join(args.katalog, "__pycache__", "help.txt.marshal")
+    wyniki: Dict[str, pomiar.Statystyki] = {}
+    for nazwa, kod in POLECENIA.items():
+        wyniki[nazwa] = pomiar.statystyki(
+            [uruchom(kod, args.katalog) for _ in range(args.powtorzenia)])
+    czasy = []
+    for _ in range(args.powtorzenia):
+        if os.path.exists(pamiec):
+            os.remove(pamiec)
+        czasy.append(uruchom(KLIENT, args.katalog))
+    wyniki["klient -s, bez pamięci help.txt"] = pomiar.statystyki(czasy)
+
+    pomiar.wypisz_wyniki({"start": wyniki})
+    if args.wynik is not None:
+        with open(args.wynik, "w", encoding="utf-8") as f:
+            json.dump({"start": wyniki}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,24 @@
 import unittest
+import asyncio
+import contextlib
+import datetime
+import http.client
+import io
 import os
-from aplikacja import dbops
-from sqlalchemy import create_engine
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import xmlrpc.client
+from aplikacja import dbops, serwer, klient, pamiec, metryki
+from aplikacja import serwer_async, transport, wymiana
+from pomiary import generator, pomiar
+from pomiary.operacje import OPERACJE
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.exc import IntegrityError, NoResultFound
+from unittest import mock
 
 
 class TestWydarzenie(unittest.TestCase):
@@ -75,6 +92,38 @@ class TestWydarzenie(unittest.TestCase):
                          "błędna modyfikacja rekordu")
         eng.dispose()
 
+    def testJednoPolecenie(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        id = dbops.dodaj_wydarzenie(eng, "wykład", "2024-01-14", "14:15",
+                                    "2024-01-14", "16:00", "")
+        polecenia = []
+        event.listen(eng, "before_cursor_execute",
+                     lambda *args: polecenia.append(args[2].split()[0]))
+        dbops.mod_wydarzenie(eng, id, None, None, "15:00", None, None, None)
+        self.assertEqual(polecenia, ["UPDATE"])
+        self.assertRaises(ValueError, dbops.mod_wydarzenie, eng, id,
+                          None, "2024-01-15", None, None, None, None)
+        xs = dbops.znajdz_wydarzenia_w_przedziale(eng, "2024-01-14 14:30",
+                                                  "2024-01-14 15:30")
+        self.assertEqual([(x["godzina_rozp"], x["data_rozp"]) for x in xs],
+                         [("15:00", "2024-01-14")])
+        dbops.ustaw_powtarzanie(eng, id, "dziennie", 1, 2)
+        dbops.mod_wydarzenie(eng, id, None, None, None, "2024-01-15", None,
+                             None)
+        xs = dbops.znajdz_wydarzenia_w_przedziale(eng, "2024-01-16 10:00",
+                                                  "2024-01-16 11:00")
+        self.assertEqual([x["data_zak"] for x in xs], ["2024-01-16"])
+        for f, args in [(dbops.usun_wydarzenie, [id + 1]),
+                        (dbops.usun_miejsce, [1]),
+                        (dbops.usun_osoba, [1]),
+                        (dbops.mod_miejsce, [1, "aula", None]),
+                        (dbops.mod_osoba, [1, None, "ala@x.pl"])]:
+            self.assertRaises(dbops.NotFoundError, f, eng, *args)
+        polecenia.clear()
+        dbops.usun_wydarzenie(eng, id)
+        self.assertEqual(polecenia, ["DELETE"] * 4 + ["UPDATE"])
+        eng.dispose()
+
 
 class TestOsoba(unittest.TestCase):
     def setUp(self):
@@ -120,3 +169,1310 @@ class TestOsoba(unittest.TestCase):
         xs = dbops.znajdz_zapisanych_na_wydarzenie(eng, wyd_id)
         self.assertNotIn(osoba, xs, "nie usunięto")
         eng.dispose()
+
+    def testSignupErrors(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        wyd_id = dbops.dodaj_wydarzenie(eng, "libacja",
+                                        "2024-01-13", "20:00",
+                                        "2024-01-14", "05:00", "")
+        dbops.dodaj_osoby(eng, [{"imie": "Gość",
+                                 "email": "gosc{0}@x.pl".format(i)}
+                                for i in range(50)])
+        for i in range(50):
+            dbops.zapisz(eng, "gosc{0}@x.pl".format(i), wyd_id)
+        zapytania = []
+        event.listen(eng, "before_cursor_execute",
+                     lambda *args: zapytania.append(args[2]))
+        dbops.wypisz(eng, "gosc7@x.pl", wyd_id)
+        dbops.zapisz(eng, "gosc7@x.pl", wyd_id)
+        self.assertEqual(len(zapytania), 2, "zła liczba zapytań")
+        self.assertRaises(NoResultFound, dbops.zapisz, eng,
+                          "nikt@x.pl", wyd_id)
+        self.assertRaises(dbops.NotFoundError, dbops.zapisz, eng,
+                          "gosc1@x.pl", wyd_id + 1)
+        self.assertRaises(dbops.NotFoundError, dbops.wypisz, eng,
+                          "gosc1@x.pl", wyd_id + 1)
+        dbops.wypisz(eng, "gosc1@x.pl", wyd_id)
+        self.assertRaises(ValueError, dbops.wypisz, eng,
+                          "gosc1@x.pl", wyd_id)
+        xs = dbops.znajdz_zapisanych_na_wydarzenie(eng, wyd_id)
+        self.assertEqual(len(xs), 49)
+        eng.dispose()
+
+
+class TestSilnik(unittest.TestCase):
+    def setUp(self):
+        self.echo = dbops.echo
+        dbops.echo = False
+
+    def tearDown(self):
+        dbops.dispose_engines()
+        dbops.echo = self.echo
+        os.remove(dbops.path)
+
+    def testWspolnySilnik(self):
+        eng = dbops.get_engine()
+        self.assertIs(eng, dbops.get_engine(), "nowy silnik")
+        dbops.with_engine(dbops.utworz)
+        id = dbops.with_engine(dbops.dodaj_osoba,
+                               "Ferdynand Kiepski", "ferdek@kiepski.pl")
+        self.assertIs(eng, dbops.get_engine(), "nowy silnik")
+        xs = dbops.with_engine(dbops.znajdz_osoba, "Ferdynand Kiepski",
+                               dispose=True)
+        self.assertEqual(xs, [{"id": id, "imie": "Ferdynand Kiepski",
+                               "email": "ferdek@kiepski.pl"}])
+        self.assertIsNot(eng, dbops.get_engine(), "nie zwolniono silnika")
+
+    def testProfil(self):
+        profil = dbops.profil
+        dbops.profil = "szybki"
+        try:
+            eng = dbops.get_engine()
+        finally:
+            dbops.profil = profil
+        dbops.utworz(eng)
+        dbops.dodaj_osoba(eng, "Ferdynand Kiepski", "ferdek@kiepski.pl")
+        with eng.connect() as conn:
+            for pragma, wartosc in [("journal_mode", "wal"),
+                                    ("synchronous", 1),
+                                    ("temp_store", 2),
+                                    ("busy_timeout", 5000)]:
+                self.assertEqual(conn.exec_driver_sql(
+                    "PRAGMA " + pragma).scalar(), wartosc, pragma)
+        wynik = dbops.konserwuj(eng)
+        self.assertEqual(wynik["zajete"], 0)
+        self.assertEqual(wynik["strony_logu"], 0, "nie obcięto dziennika")
+
+    def testKonserwacja(self):
+        dbops.with_engine(dbops.utworz)
+        wywolania = []
+        konserwuj = dbops.konserwuj
+        dbops.konserwuj = lambda engine: wywolania.append(engine)
+        try:
+            zadanie = serwer.Konserwacja(3600)
+            zadanie()
+            self.assertEqual(wywolania, [], "za wcześnie")
+            zadanie.okres = 0
+            zadanie()
+            zadanie.okres = 3600
+            zadanie()
+        finally:
+            dbops.konserwuj = konserwuj
+        self.assertEqual(len(wywolania), 1)
+
+
+class TestSerwer(unittest.TestCase):
+    def setUp(self):
+        self.echo = dbops.echo
+        dbops.echo = False
+        self.server = serwer.zbuduj_serwer(port=0, tryb="watki",
+                                           robotnicy=2, kolejka=4)
+        self.server.logRequests = False
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.proxy = xmlrpc.client.ServerProxy(
+            "http://localhost:{0}".format(self.server.server_address[1]),
+            allow_none=True)
+
+    def tearDown(self):
+        self.proxy("close")()
+        self.server.shutdown()
+        self.server.server_close()
+        dbops.dispose_engines()
+        dbops.echo = self.echo
+        os.remove(dbops.path)
+
+    def testPulaWatkow(self):
+        self.proxy.utworz()
+        id = self.proxy.dodaj_miejsce("aula", "Joliot-Curie 15")
+        self.assertEqual(self.proxy.znajdz_miejsce("aula"),
+                         [{"id": id, "nazwa": "aula",
+                           "adres": "Joliot-Curie 15"}])
+        stan = self.proxy.stan_serwera()
+        self.assertEqual(stan["tryb"], "watki")
+        self.assertEqual(stan["robotnicy"], 2)
+        self.assertEqual(stan["kolejka"], 0)
+
+    def testEksport(self):
+        self.proxy.utworz()
+        self.proxy.importuj([{"nazwa": "wykład; część " + "ę" * 60,
+                              "data_rozp": "2024-01-14",
+                              "godzina_rozp": "14:15",
+                              "data_zak": "2024-01-14",
+                              "godzina_zak": "16:00", "miejsce": "aula",
+                              "uczestnicy": [{"imie": "Ala",
+                                              "email": "ala@x.pl"}]}])
+        url = "http://localhost:{0}/eksport.ics?email=ala%40x.pl".format(
+            self.server.server_address[1])
+        with urllib.request.urlopen(url) as odp:
+            etag = odp.headers["ETag"]
+            tresc = odp.read().decode("utf-8")
+        [(_, rekord)] = wymiana.czytaj_ics(io.StringIO(tresc))
+        self.assertEqual(rekord["nazwa"], "wykład; część " + "ę" * 60)
+        self.assertEqual(rekord["miejsce"], "aula")
+        self.assertEqual(rekord["uczestnicy"],
+                         [{"imie": "Ala", "email": "ala@x.pl"}])
+        zapytanie = urllib.request.Request(url,
+                                           headers={"If-None-Match": etag})
+        with self.assertRaises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(zapytanie)
+        self.assertEqual(e.exception.code, 304)
+        self.proxy.dodaj_miejsce("sala", "Banacha 2")
+        with urllib.request.urlopen(zapytanie) as odp:
+            self.assertNotEqual(odp.headers["ETag"], etag)
+        with self.assertRaises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(url + "&od=2024-01-01")
+        self.assertEqual(e.exception.code, 400)
+
+    def testProstyZamykaPolaczenia(self):
+        server = serwer.zbuduj_serwer(port=0)
+        server.logRequests = False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        adres = "localhost:{0}".format(server.server_address[1])
+        try:
+            self.proxy.utworz()
+            pierwszy = xmlrpc.client.ServerProxy("http://" + adres)
+            drugi = xmlrpc.client.ServerProxy("http://" + adres)
+            pierwszy.znajdz_miejsce("aula")
+            poczatek = time.monotonic()
+            drugi.znajdz_miejsce("aula")
+            self.assertLess(time.monotonic() - poczatek, 1)
+            polaczenie = http.client.HTTPConnection(adres)
+            polaczenie.request("GET", "/eksport.ics")
+            odp = polaczenie.getresponse()
+            tresc = odp.read().decode("utf-8")
+            self.assertTrue(odp.will_close)
+            self.assertIsNone(odp.getheader("Transfer-Encoding"))
+            self.assertIn("END:VCALENDAR", tresc)
+            polaczenie.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def testPolecenia(self):
+        adres, transport = klient.ADRES_SERWERA, klient.TRANSPORT
+        klient.ADRES_SERWERA = "http://localhost:{0}".format(
+            self.server.server_address[1])
+        self.proxy.utworz()
+        for nr, klient.TRANSPORT in enumerate(["xmlrpc", "json"]):
+            email = "ala{0}@x.pl".format(nr)
+            polecenia = ["--utworz-osobe --imie Ala --email " + email,
+                         "--znajdz-miejsce --nazwa aula",
+                         "--utworz-osobe --imie Ola --email " + email,
+                         "--znajdz-osobe --imie 'Ala'",
+                         "--znajdz-osobe --imie Ala --strumien"]
+            wyjscie, bledy = io.StringIO(), io.StringIO()
+            try:
+                with contextlib.redirect_stdout(wyjscie), \
+                        contextlib.redirect_stderr(bledy):
+                    n = klient.wykonaj_polecenia(polecenia,
+                                                 klient.zbuduj_parser(),
+                                                 True, multicall=True)
+                self.assertEqual(klient.polacz(True).transport,
+                                 klient.TRANSPORT)
+            finally:
+                klient.rozlacz()
+            self.assertEqual(n, 1, bledy.getvalue())
+            self.assertIn("nr 3", bledy.getvalue())
+            self.assertIn("DuplicateError", bledy.getvalue())
+            self.assertEqual(wyjscie.getvalue().count(email), 2)
+        klient.ADRES_SERWERA, klient.TRANSPORT = adres, transport
+
+    def testTransport(self):
+        self.proxy.utworz()
+        polaczenie = transport.Polaczenie("http://localhost:{0}".format(
+            self.server.server_address[1]))
+        ids = polaczenie.wywolaj("dodaj_osoby",
+                                 [[{"imie": "Gość",
+                                    "email": "g{0}@x.pl".format(i)}
+                                   for i in range(100)]])["id"]
+        xs = polaczenie.wywolaj("znajdz_osoba", ["Gość", None, None])
+        self.assertEqual([x["id"] for x in xs], ids)
+        wyniki = polaczenie.wiele([("znajdz_osoba", ["Gość", 1, None]),
+                                   ("nie_ma", [])])
+        self.assertEqual(wyniki[0][0]["email"], "g0@x.pl")
+        self.assertIsInstance(wyniki[1], xmlrpc.client.Fault)
+        with self.assertRaises(xmlrpc.client.Fault):
+            polaczenie.wywolaj("mod_osoba", [10**6, None, None])
+        polaczenie.zamknij()
+        for naglowki, status in [({}, 411), ({"Content-Length": "x"}, 400)]:
+            surowe = http.client.HTTPConnection(polaczenie.host)
+            surowe.putrequest("POST", transport.SCIEZKA)
+            surowe.putheader("Content-Type", transport.TYPY["json"])
+            for k, v in naglowki.items():
+                surowe.putheader(k, v)
+            surowe.endheaders()
+            self.assertEqual(surowe.getresponse().status, status)
+            surowe.close()
+        surowe = http.client.HTTPConnection(polaczenie.host)
+        for zapytanie in [{"jsonrpc": "2.0", "method": "znajdz_osoba",
+                           "params": ["Gość", None, None]},
+                          [{"jsonrpc": "2.0", "method": "nie_ma"}]]:
+            surowe.request("POST", transport.SCIEZKA,
+                           transport.koduj(zapytanie, "json"),
+                           {"Content-Type": transport.TYPY["json"]})
+            odp = surowe.getresponse()
+            self.assertEqual((odp.status, odp.read()), (204, b""))
+        surowe.close()
+
+
+class TestWsad(unittest.TestCase):
+    def setUp(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(eng)
+        eng.dispose()
+
+    def tearDown(self):
+        os.remove(dbops.path)
+
+    def testDodajOsoby(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        wynik = dbops.dodaj_osoby(eng, [{"imie": "Ferdynand Kiepski",
+                                         "email": "ferdek@kiepski.pl"},
+                                        {"imie": "Ferdynand",
+                                         "email": "ferdek"},
+                                        {"imie": "Halina Kiepska",
+                                         "email": "halina@kiepski.pl"}],
+                                  rozmiar=1)
+        self.assertEqual(wynik["bledy"],
+                         [{"nr": 1, "blad": "Niepoprawny adres email."}])
+        self.assertIsNone(wynik["id"][1], "dodano błędny rekord")
+        xs = dbops.znajdz_osoba(eng, "Halina Kiepska")
+        self.assertEqual(xs, [{"id": wynik["id"][2],
+                               "imie": "Halina Kiepska",
+                               "email": "halina@kiepski.pl"}])
+        eng.dispose()
+
+    def testScisle(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        rekordy = [{"nazwa": "wykład",
+                    "data_rozp": "2024-01-14", "godzina_rozp": "14:15",
+                    "data_zak": "2024-01-14", "godzina_zak": "16:00"},
+                   {"nazwa": "wykład",
+                    "data_rozp": "2024-01-14", "godzina_rozp": "24:15",
+                    "data_zak": "2024-01-14", "godzina_zak": "16:00"}]
+        self.assertRaises(ValueError, dbops.dodaj_wydarzenia, eng,
+                          rekordy, True)
+        self.assertEqual(dbops.znajdz_wydarzenie(eng, "wykład"), [],
+                         "dodano rekordy mimo błędu")
+        eng.dispose()
+
+    def testZapiszWiele(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        wyd_id = dbops.dodaj_wydarzenie(eng, "libacja",
+                                        "2024-01-13", "20:00",
+                                        "2024-01-14", "05:00", "")
+        os_id = dbops.dodaj_osoba(eng, "Marian Paździoch",
+                                  "marian@pazdzioch.pl")
+        wynik = dbops.zapisz_wiele(eng,
+                                   [{"email": "marian@pazdzioch.pl",
+                                     "id_wydarzenia": wyd_id},
+                                    {"email": "marian@pazdzioch.pl",
+                                     "id_wydarzenia": wyd_id},
+                                    {"email": "marian@pazdzioch.pl",
+                                     "id_wydarzenia": wyd_id + 1}])
+        self.assertEqual(wynik["id"], [os_id, None, None])
+        self.assertEqual([b["nr"] for b in wynik["bledy"]], [1, 2])
+        xs = dbops.znajdz_zapisanych_na_wydarzenie(eng, wyd_id)
+        self.assertEqual([x["id"] for x in xs], [os_id])
+        eng.dispose()
+
+
+class TestImport(unittest.TestCase):
+    ICS = ("BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:Wykład\\, część 1"
+           "\r\nDTSTART:20240114T141500Z\r\nDTEND:20240114T160000Z\r\n"
+           "LOCATION:Sala 3\r\nATTENDEE;CN=\"Ferdynand Kiepski\":mailto:fe"
+           "\r\n rdek@kiepski.pl\r\nBEGIN:VALARM\r\nSUMMARY:x\r\n"
+           "END:VALARM\r\nEND:VEVENT\r\nBEGIN:VEVENT\r\nSUMMARY:Urlop"
+           "\r\nDTSTART;VALUE=DATE:20240201\r\n"
+           "DTEND;VALUE=DATE:20240203\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n")
+
+    def setUp(self):
+        self.eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.eng)
+        self.katalog = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.eng.dispose()
+        self.katalog.cleanup()
+        os.remove(dbops.path)
+
+    def wywolaj(self, action, action_args):
+        return getattr(dbops, action)(self.eng, *action_args)
+
+    def testIcs(self):
+        rekordy = list(wymiana.czytaj_ics(io.StringIO(self.ICS)))
+        self.assertEqual([nr for nr, _ in rekordy], [2, 13])
+        self.assertEqual(rekordy[0][1]["nazwa"], "Wykład, część 1")
+        self.assertEqual(rekordy[0][1]["uczestnicy"],
+                         [{"imie": "Ferdynand Kiepski",
+                           "email": "ferdek@kiepski.pl"}])
+        self.assertEqual([rekordy[1][1][k] for k in
+                          ["data_rozp", "godzina_rozp", "data_zak",
+                           "godzina_zak"]],
+                         ["2024-02-01", "00:00", "2024-02-02", "23:59"])
+        plik = os.path.join(self.katalog.name, "k.ics")
+        with open(plik, "w", encoding="utf-8", newline="") as f:
+            f.write(self.ICS)
+        wynik = wymiana.importuj(self.wywolaj, plik)
+        self.assertEqual(wynik, {"rekordy": 2, "dodane": 2, "bledy": 0,
+                                 "wznowiono": 0})
+        [wyd] = dbops.znajdz_wydarzenia_osoby(self.eng, "ferdek@kiepski.pl")
+        [wyd] = dbops.znajdz_wydarzenia_w_miejscu(self.eng, "Sala 3")
+        self.assertEqual(wyd["nazwa"], "Wykład, część 1")
+
+    def testStrefy(self):
+        ics = ("BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:a\r\n"
+               "DTSTART:20240114T141500Z\r\n"
+               "DTEND;TZID=America/New_York:20240114T100000\r\n"
+               "ATTENDEE;CN=\"Kiepski; Ferdynand\";ROLE=CHAIR:mailto:f@k.pl"
+               "\r\nEND:VEVENT\r\nBEGIN:VEVENT\r\nSUMMARY:b\r\n"
+               "DTSTART;TZID=Nigdzie/Nic:20240114T141500\r\n"
+               "END:VEVENT\r\nEND:VCALENDAR\r\n")
+        with mock.patch.dict(os.environ, {"TZ": "Europe/Warsaw"}):
+            time.tzset()
+            try:
+                rekordy = list(wymiana.czytaj_ics(io.StringIO(ics)))
+            finally:
+                time.tzset()
+        rekord = rekordy[0][1]
+        self.assertEqual([rekord[k] for k in ["data_rozp", "godzina_rozp",
+                                              "data_zak", "godzina_zak"]],
+                         ["2024-01-14", "15:15", "2024-01-14", "16:00"])
+        self.assertEqual(rekord["uczestnicy"],
+                         [{"imie": "Kiepski; Ferdynand", "email": "f@k.pl"}])
+        wynik = dbops.importuj(self.eng, [r for _, r in rekordy])
+        self.assertEqual([b["nr"] for b in wynik["bledy"]], [1])
+
+    def testSeria(self):
+        wyd = dbops.dodaj_wydarzenie(self.eng, "zaj", "2024-01-10", "08:15",
+                                     "2024-01-10", "10:00", "")
+        dbops.ustaw_powtarzanie(self.eng, wyd, "tygodniowo", 1, 4)
+        dbops.odwolaj_wystapienie(self.eng, wyd, "2024-01-17 08:15")
+        dbops.mod_wystapienie(self.eng, wyd, "2024-01-24 08:15", "zast",
+                              None, None, None, None, None)
+        plik = os.path.join(self.katalog.name, "k.ics")
+        with open(plik, "w", encoding="utf-8", newline="") as f:
+            f.writelines(wymiana.ics(dbops.eksport(self.eng)))
+        bledy = []
+        wynik = wymiana.importuj(self.wywolaj, plik,
+                                 zglos=lambda nr, b: bledy.append((nr, b)))
+        self.assertEqual(wynik["dodane"], 1)
+        self.assertEqual(bledy, [(13, "Nie można importować zmienionego"
+                                      " wystąpienia serii.")])
+        xs = dbops.znajdz_wydarzenia_w_przedziale(self.eng, "2024-01-01",
+                                                  "2024-03-01")
+        nowe = [x["data_rozp"] for x in xs if x["id"] not in (wyd, wyd + 1)]
+        self.assertEqual(nowe, ["2024-01-10", "2024-01-24", "2024-01-31"])
+        ics = ("BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:a\r\n"
+               "DTSTART:20240110T081500\r\nDTEND:20240110T100000\r\n"
+               "RRULE:FREQ=WEEKLY;BYDAY=MO,WE\r\nEND:VEVENT\r\n"
+               "END:VCALENDAR\r\n")
+        wynik = dbops.importuj(self.eng, [r for _, r in wymiana.czytaj_ics(
+            io.StringIO(ics))])
+        self.assertEqual(wynik["bledy"],
+                         [{"nr": 0, "blad": "Nieobsługiwane pola reguły"
+                                            " powtarzania: byday."}])
+
+    def testCsv(self):
+        plik = os.path.join(self.katalog.name, "k.csv")
+        with open(plik, "w", encoding="utf-8", newline="") as f:
+            f.write("nazwa,data_rozp,godzina_rozp,data_zak,godzina_zak,"
+                    "miejsce,uczestnicy\r\n"
+                    "wykład,2024-01-14,14:15,2024-01-14,16:00,Sala 3,"
+                    "Ferdek <ferdek@kiepski.pl>; halina@kiepski.pl\r\n"
+                    "\"zły\ngodzina\",2024-01-14,24:15,2024-01-14,16:00,,\r\n"
+                    "ćwiczenia,2024-01-15,10:00,2024-01-15,12:00,Sala 3,"
+                    "Ferdynand Kiepski <ferdek@kiepski.pl>\r\n")
+        bledy = []
+        wynik = wymiana.importuj(self.wywolaj, plik, paczka=1,
+                                 zglos=lambda nr, b: bledy.append((nr, b)))
+        self.assertEqual(wynik["dodane"], 2)
+        self.assertEqual(bledy, [(3, "Niepoprawna godzina.")])
+        self.assertEqual(len(dbops.znajdz_miejsce(self.eng, "Sala 3")), 1,
+                         "nie scalono miejsc")
+        self.assertEqual(dbops.znajdz_osoba(self.eng, "Ferdynand Kiepski")
+                         [0]["email"], "ferdek@kiepski.pl",
+                         "nie zmieniono imienia")
+        self.assertFalse(os.path.exists(plik + ".postep"),
+                         "nie usunięto punktu kontrolnego")
+
+    def testWznowienie(self):
+        plik = os.path.join(self.katalog.name, "k.csv")
+        with open(plik, "w", encoding="utf-8", newline="") as f:
+            f.write("nazwa,data_rozp,godzina_rozp,data_zak,godzina_zak\n")
+            for i in range(5):
+                f.write("w{0},2024-01-1{0},10:00,2024-01-1{0},11:00\n"
+                        .format(i))
+
+        def przerwij(action, action_args):
+            if action_args[0][0]["nazwa"] == "w4":
+                raise KeyboardInterrupt
+            return self.wywolaj(action, action_args)
+        self.assertRaises(KeyboardInterrupt, wymiana.importuj, przerwij,
+                          plik, paczka=2)
+        wynik = wymiana.importuj(self.wywolaj, plik, paczka=2)
+        self.assertEqual(wynik, {"rekordy": 5, "dodane": 5, "bledy": 0,
+                                 "wznowiono": 4})
+        self.assertEqual(len(dbops.znajdz_wydarzenie(self.eng, "w0")), 1)
+
+    def testWznowieniePrzedPunktem(self):
+        plik = os.path.join(self.katalog.name, "k.csv")
+        with open(plik, "w", encoding="utf-8", newline="") as f:
+            f.write("nazwa,data_rozp,godzina_rozp,data_zak,godzina_zak\n")
+            for i in range(5):
+                f.write("w{0},2024-01-1{0},10:00,2024-01-1{0},11:00\n"
+                        .format(i))
+        zapisz_punkt = wymiana._zapisz_punkt
+
+        def przerwij(punkt, plik, stan):
+            if stan["rekordy"] == 4:
+                raise KeyboardInterrupt
+            zapisz_punkt(punkt, plik, stan)
+        with mock.patch.object(wymiana, "_zapisz_punkt", przerwij):
+            self.assertRaises(KeyboardInterrupt, wymiana.importuj,
+                              self.wywolaj, plik, paczka=2)
+        wynik = wymiana.importuj(self.wywolaj, plik, paczka=2)
+        self.assertEqual(wynik, {"rekordy": 5, "dodane": 3, "bledy": 0,
+                                 "wznowiono": 4})
+        for i in range(5):
+            self.assertEqual(len(dbops.znajdz_wydarzenie(
+                self.eng, "w{0}".format(i))), 1, "zdublowano wydarzenie")
+        wynik = wymiana.importuj(self.wywolaj, plik, paczka=2)
+        self.assertEqual(wynik["dodane"], 5, "nie usunięto postępu")
+
+
+class TestPrzedzial(unittest.TestCase):
+    def setUp(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(eng)
+        eng.dispose()
+
+    def tearDown(self):
+        os.remove(dbops.path)
+
+    def testZnajdzWPrzedziale(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        dlugie = dbops.dodaj_wydarzenie(eng, "sesja",
+                                        "2024-01-29", "08:00",
+                                        "2024-02-09", "18:00", "")
+        krotkie = dbops.dodaj_wydarzenie(eng, "egzamin",
+                                         "2024-02-05", "10:00",
+                                         "2024-02-05", "12:00", "")
+        dbops.dodaj_wydarzenie(eng, "wykład",
+                               "2024-01-13", "08:15",
+                               "2024-01-13", "10:00", "")
+        xs = dbops.znajdz_wydarzenia_w_przedziale(eng, "2024-02-05 12:00",
+                                                  "2024-02-06")
+        self.assertEqual([x["id"] for x in xs], [dlugie])
+        xs = dbops.znajdz_wydarzenia_w_przedziale(eng, "2024-02-05 11:00",
+                                                  "2024-02-05 11:30")
+        self.assertEqual([x["id"] for x in xs], [dlugie, krotkie])
+        dbops.mod_wydarzenie(eng, krotkie, None, "2024-02-12", None,
+                             "2024-02-12", None, None)
+        xs = dbops.znajdz_wydarzenia_w_przedziale(eng, "2024-02-10",
+                                                  "2024-02-13")
+        self.assertEqual([x["id"] for x in xs], [krotkie])
+        eng.dispose()
+
+
+class TestTerminy(unittest.TestCase):
+    def setUp(self):
+        self.eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.eng)
+        self.msc = dbops.dodaj_miejsce(self.eng, "aula", "Banacha 2")
+
+    def tearDown(self):
+        self.eng.dispose()
+        os.remove(dbops.path)
+
+    def testKonflikty(self):
+        wyklad = dbops.dodaj_wydarzenie(self.eng, "wykład", "2024-03-04",
+                                        "10:00", "2024-03-04", "12:00", "")
+        cwiczenia = dbops.dodaj_wydarzenie(self.eng, "ćwiczenia",
+                                           "2024-03-01", "12:00",
+                                           "2024-03-01", "14:00", "")
+        egzamin = dbops.dodaj_wydarzenie(self.eng, "egzamin", "2024-03-11",
+                                         "11:00", "2024-03-11", "13:00", "")
+        self.assertEqual(dbops.dodaj_miejsce_do_wydarzenia(
+            self.eng, self.msc, wyklad), [])
+        dbops.ustaw_powtarzanie(self.eng, wyklad, "tygodniowo", 1, 4)
+        self.assertEqual(dbops.dodaj_miejsce_do_wydarzenia(
+            self.eng, self.msc, cwiczenia), [])
+        self.assertRaises(dbops.ConflictError,
+                          dbops.dodaj_miejsce_do_wydarzenia,
+                          self.eng, self.msc, egzamin)
+        self.assertEqual(dbops.wolne_terminy(self.eng, self.msc,
+                                             "2024-03-11 08:00",
+                                             "2024-03-11 16:00"),
+                         [{"od": "2024-03-11 08:00",
+                           "do": "2024-03-11 10:00"},
+                          {"od": "2024-03-11 12:00",
+                           "do": "2024-03-11 16:00"}])
+        dbops.odwolaj_wystapienie(self.eng, wyklad, "2024-03-11 10:00")
+        self.assertEqual(dbops.dodaj_miejsce_do_wydarzenia(
+            self.eng, self.msc, egzamin), [])
+        dbops.ustaw_powtarzanie(self.eng, cwiczenia, "dziennie")
+        self.assertEqual(dbops.dodaj_miejsce_do_wydarzenia(
+            self.eng, self.msc, cwiczenia, "ostrzez"),
+            [{"id": egzamin, "od": "2024-03-11 11:00",
+              "do": "2024-03-11 13:00"}])
+        self.assertEqual(dbops.wolne_terminy(self.eng, self.msc,
+                                             "2024-03-11 08:00",
+                                             "2024-03-11 16:00", 180),
+                         [{"od": "2024-03-11 08:00",
+                           "do": "2024-03-11 11:00"}])
+        self.assertRaises(dbops.NotFoundError, dbops.wolne_terminy,
+                          self.eng, self.msc + 1, "2024-03-11", "2024-03-12")
+        stare = dbops.dodaj_wydarzenie(self.eng, "stare", "2024-03-11",
+                                       "11:00", "2024-03-11", "13:00", "")
+        with self.eng.begin() as conn:
+            conn.execute(update(dbops.Wydarzenie)
+                         .where(dbops.Wydarzenie.id == stare)
+                         .values(poczatek=None, koniec=None))
+        self.assertEqual(dbops.dodaj_miejsce_do_wydarzenia(
+            self.eng, self.msc, stare), [])
+        dbops.usun_miejsce_z_wydarzenia(self.eng, stare)
+        self.assertIsNone(dbops.znajdz_wydarzenie(self.eng, "stare")[0]
+                          ["nazwa_miejsca"])
+        self.assertRaises(dbops.NotFoundError,
+                          dbops.usun_miejsce_z_wydarzenia,
+                          self.eng, stare + 1)
+
+    def testRownoczesnie(self):
+        ids = [dbops.dodaj_wydarzenie(self.eng, n, "2024-03-04", od,
+                                      "2024-03-04", do, "")
+               for n, od, do in [("a", "10:00", "12:00"),
+                                 ("b", "11:00", "13:00")]]
+        drugi = create_engine(dbops.dbpath, echo=False)
+        wyniki = []
+        gotowe = threading.Event()
+
+        def przypisz(eng, id):
+            try:
+                wyniki.append(dbops.dodaj_miejsce_do_wydarzenia(
+                    eng, self.msc, id))
+            except dbops.ConflictError:
+                wyniki.append("konflikt")
+
+        def w_trakcie(conn, cursor, statement, *args):
+            if statement.startswith("UPDATE") and watek.ident is None:
+                watek.start()
+                gotowe.wait(0.5)
+        watek = threading.Thread(target=lambda: (przypisz(drugi, ids[1]),
+                                                 gotowe.set()))
+        event.listen(self.eng, "before_cursor_execute", w_trakcie)
+        try:
+            przypisz(self.eng, ids[0])
+        finally:
+            event.remove(self.eng, "before_cursor_execute", w_trakcie)
+            watek.join()
+            drugi.dispose()
+        self.assertEqual(sorted(map(str, wyniki)), ["[]", "konflikt"])
+        self.assertEqual(len(dbops.znajdz_wydarzenia_w_miejscu(self.eng,
+                                                               "aula")), 1)
+
+    def testWspolnyCzas(self):
+        for imie in ["ala", "ola", "ela"]:
+            dbops.dodaj_osoba(self.eng, imie, imie + "@x.pl")
+        wyklad = dbops.dodaj_wydarzenie(self.eng, "wykład", "2024-03-04",
+                                        "10:00", "2024-03-04", "12:00", "")
+        dbops.ustaw_powtarzanie(self.eng, wyklad, "dziennie")
+        zebranie = dbops.dodaj_wydarzenie(self.eng, "zebranie", "2024-03-05",
+                                          "13:00", "2024-03-05", "14:00", "")
+        obiad = dbops.dodaj_wydarzenie(self.eng, "obiad", "2024-03-05",
+                                       "11:30", "2024-03-05", "13:30", "")
+        dbops.zapisz(self.eng, "ala@x.pl", wyklad)
+        dbops.zapisz(self.eng, "ola@x.pl", zebranie)
+        dbops.zapisz(self.eng, "ela@x.pl", obiad)
+        dbops.zapisz(self.eng, "ola@x.pl", obiad)
+        self.assertEqual(dbops.wspolny_wolny_czas(
+            self.eng, ["ala@x.pl", "ola@x.pl", "ela@x.pl"],
+            "2024-03-05 08:00", "2024-03-05 16:00"),
+            [{"od": "2024-03-05 08:00", "do": "2024-03-05 10:00",
+              "minuty": 120},
+             {"od": "2024-03-05 14:00", "do": "2024-03-05 16:00",
+              "minuty": 120}])
+        self.assertEqual(dbops.wspolny_wolny_czas(
+            self.eng, ["ola@x.pl"], "2024-03-05 08:00", "2024-03-05 16:00",
+            60, 1),
+            [{"od": "2024-03-05 08:00", "do": "2024-03-05 11:30",
+              "minuty": 210}])
+        self.assertRaises(dbops.NotFoundError, dbops.wspolny_wolny_czas,
+                          self.eng, ["ala@x.pl", "ula@x.pl"],
+                          "2024-03-05", "2024-03-06")
+
+    def testPlanZapytania(self):
+        with self.eng.connect() as conn:
+            plan = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id FROM wydarzenia"
+                " WHERE miejsce_id = 1 AND poczatek >= '2024-03-04'"
+                " AND poczatek < '2024-03-05'").all()
+        self.assertIn("ix_wydarzenia_miejsce_poczatek", plan[0][3])
+
+
+class TestUczestnicy(unittest.TestCase):
+    def setUp(self):
+        self.eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.eng)
+        self.wyd = dbops.dodaj_wydarzenie(self.eng, "wykład", "2024-01-10",
+                                          "08:15", "2024-01-10", "10:00", "")
+        self.osoby = [dbops.dodaj_osoba(self.eng, imie, imie + "@x.pl")
+                      for imie in ["ala", "ola", "ela"]]
+
+    def tearDown(self):
+        self.eng.dispose()
+        os.remove(dbops.path)
+
+    def stan(self):
+        w = dbops.znajdz_wydarzenie(self.eng, "wykład", zapisy=True)[0]
+        return w["liczba_uczestnikow"], w["pelne"]
+
+    def testLiczba(self):
+        dbops.zapisz(self.eng, "ala@x.pl", self.wyd)
+        wynik = dbops.zapisz_wiele(self.eng, [
+            {"email": "ola@x.pl", "id_wydarzenia": self.wyd},
+            {"email": "ela@x.pl", "id_wydarzenia": self.wyd}])
+        self.assertEqual(wynik["bledy"], [])
+        self.assertEqual(self.stan(), (3, False))
+        dbops.wypisz(self.eng, "ola@x.pl", self.wyd)
+        dbops.usun_osoba(self.eng, self.osoby[0])
+        self.assertEqual(self.stan(), (1, False))
+        with self.eng.begin() as conn:
+            conn.exec_driver_sql("UPDATE wydarzenia"
+                                 " SET liczba_uczestnikow = 0")
+            dbops._migracja_uczestnicy(conn)
+        self.assertEqual(self.stan(), (1, False))
+
+    def testLimit(self):
+        dbops.ustaw_limit_miejsc(self.eng, self.wyd, 2)
+        dbops.zapisz(self.eng, "ala@x.pl", self.wyd)
+        wynik = dbops.zapisz_wiele(self.eng, [
+            {"email": "ola@x.pl", "id_wydarzenia": self.wyd},
+            {"email": "ela@x.pl", "id_wydarzenia": self.wyd}])
+        self.assertEqual([(b["nr"], b["blad"]) for b in wynik["bledy"]],
+                         [(1, dbops.CapacityError.wydarzenie_msg)])
+        self.assertEqual(self.stan(), (2, True))
+        self.assertRaises(dbops.CapacityError, dbops.zapisz, self.eng,
+                          "ela@x.pl", self.wyd)
+        with self.eng.begin() as conn:
+            self.assertRaises(IntegrityError, conn.execute,
+                              insert(dbops.uczestnictwa),
+                              {"osoba_id": self.osoby[2],
+                               "wydarzenie_id": self.wyd})
+        dbops.wypisz(self.eng, "ala@x.pl", self.wyd)
+        dbops.zapisz(self.eng, "ela@x.pl", self.wyd)
+        dbops.ustaw_limit_miejsc(self.eng, self.wyd, None)
+        dbops.zapisz(self.eng, "ala@x.pl", self.wyd)
+        self.assertEqual(self.stan(), (3, False))
+        self.assertRaises(dbops.NotFoundError, dbops.ustaw_limit_miejsc,
+                          self.eng, self.wyd + 1, 5)
+
+    def testWystapienie(self):
+        for imie in ["ala", "ola", "ela"]:
+            dbops.zapisz(self.eng, imie + "@x.pl", self.wyd)
+        dbops.ustaw_limit_miejsc(self.eng, self.wyd, 2)
+        dbops.ustaw_powtarzanie(self.eng, self.wyd, "tygodniowo")
+        nowe = dbops.mod_wystapienie(self.eng, self.wyd, "2024-01-17 08:15",
+                                     None, None, None, None, None, "inny")
+        self.assertEqual(
+            len(dbops.znajdz_zapisanych_na_wydarzenie(self.eng, nowe)), 3)
+        w = dbops.znajdz_wydarzenia_w_przedziale(
+            self.eng, "2024-01-17", "2024-01-18", zapisy=True)
+        self.assertEqual([(x["id"], x["limit_miejsc"], x["pelne"])
+                          for x in w], [(nowe, 2, True)])
+
+
+class TestIndeksy(unittest.TestCase):
+    def setUp(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(eng)
+        eng.dispose()
+
+    def tearDown(self):
+        os.remove(dbops.path)
+
+    def testUnikalnyEmail(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        id = dbops.dodaj_osoba(eng, "Ferdynand Kiepski", "ferdek@kiepski.pl")
+        self.assertRaises(dbops.DuplicateError, dbops.dodaj_osoba, eng,
+                          "Ferdek", "ferdek@kiepski.pl")
+        id2 = dbops.dodaj_osoba(eng, "Halina Kiepska", "halina@kiepski.pl")
+        self.assertRaises(dbops.DuplicateError, dbops.mod_osoba, eng,
+                          id2, None, "ferdek@kiepski.pl")
+        wynik = dbops.dodaj_osoby(eng, [{"imie": "Ferdek",
+                                         "email": "ferdek@kiepski.pl"},
+                                        {"imie": "Boczek",
+                                         "email": "boczek@kiepski.pl"},
+                                        {"imie": "Arnold",
+                                         "email": "boczek@kiepski.pl"}])
+        self.assertEqual([b["nr"] for b in wynik["bledy"]], [0, 2])
+        self.assertEqual(dbops.znajdz_osoba(eng, "Ferdynand Kiepski"),
+                         [{"id": id, "imie": "Ferdynand Kiepski",
+                           "email": "ferdek@kiepski.pl"}])
+        eng.dispose()
+
+    def testPlanZapytania(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        with eng.connect() as conn:
+            for tabela, kolumna in [("wydarzenia", "nazwa"),
+                                    ("miejsca", "nazwa"),
+                                    ("osoby", "imie"),
+                                    ("osoby", "email")]:
+                plan = conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN SELECT * FROM {0} WHERE {1} = 'x'"
+                    .format(tabela, kolumna)).all()
+                self.assertIn("USING INDEX", plan[0][3], "brak indeksu")
+        eng.dispose()
+
+
+class TestOdczyt(unittest.TestCase):
+    def setUp(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(eng)
+        eng.dispose()
+
+    def tearDown(self):
+        os.remove(dbops.path)
+
+    def testJednoZapytanie(self):
+        eng = create_engine(dbops.dbpath, echo=False)
+        msc_id = dbops.dodaj_miejsce(eng, "sala 25", "Joliot-Curie 15")
+        ids = dbops.dodaj_wydarzenia(eng, [{"nazwa": "wykład",
+                                            "data_rozp": "2024-01-1" + str(i),
+                                            "godzina_rozp": "08:15",
+                                            "data_zak": "2024-01-1" + str(i),
+                                            "godzina_zak": "10:00",
+                                            "id_miejsca": msc_id}
+                                           for i in range(5)])["id"]
+        zapytania = []
+        event.listen(eng, "before_cursor_execute",
+                     lambda *args: zapytania.append(args[2]))
+        for f, arg in [(dbops.znajdz_wydarzenie, "wykład"),
+                       (dbops.znajdz_wydarzenia_w_miejscu, "sala 25")]:
+            zapytania.clear()
+            xs = f(eng, arg)
+            self.assertEqual(len(zapytania), 1, "zła liczba zapytań")
+            self.assertEqual([x["id"] for x in xs], ids)
+            self.assertEqual(xs[0], {"id": ids[0], "nazwa": "wykład",
+                                     "data_rozp": "2024-01-10",
+                                     "godzina_rozp": "08:15",
+                                     "data_zak": "2024-01-10",
+                                     "godzina_zak": "10:00", "opis": "",
+                                     "nazwa_miejsca": "sala 25"})
+        zapytania.clear()
+        xs = dbops.znajdz_wydarzenia_w_przedziale(eng, "2024-01-11",
+                                                  "2024-01-13")
+        self.assertEqual(len(zapytania), 1, "zła liczba zapytań")
+        self.assertEqual([x["id"] for x in xs], ids[1:3])
+        eng.dispose()
+
+
+class TestZmiany(unittest.TestCase):
+    def setUp(self):
+        self.eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.eng)
+
+    def tearDown(self):
+        self.eng.dispose()
+        dbops.przechowanie_zmian = 100000
+        os.remove(dbops.path)
+
+    def zmiany(self, rewizja, limit=None):
+        wynik = dbops.zmiany_od(self.eng, rewizja, limit)
+        return wynik["rewizja"], [(z["tabela"], z["id"], z["id_osoby"],
+                                   z["usuniete"]) for z in wynik["zmiany"]]
+
+    def testZmiany(self):
+        wyd_id = dbops.dodaj_wydarzenie(self.eng, "libacja", "2024-01-13",
+                                        "20:00", "2024-01-14", "05:00", "")
+        osoba_id = dbops.dodaj_osoba(self.eng, "Ferdynand Kiepski",
+                                     "ferdek@kiepski.pl")
+        start = dbops.rewizja(self.eng)
+        dbops.zapisz(self.eng, "ferdek@kiepski.pl", wyd_id)
+        msc_id = dbops.dodaj_miejsce(self.eng, "klatka", "Ćwiartki 3/4")
+        dbops.dodaj_miejsce_do_wydarzenia(self.eng, msc_id, wyd_id)
+        dbops.wypisz(self.eng, "ferdek@kiepski.pl", wyd_id)
+        dbops.usun_osoba(self.eng, osoba_id)
+        rewizja, zmiany = self.zmiany(start)
+        self.assertEqual(rewizja, dbops.rewizja(self.eng))
+        self.assertEqual(zmiany,
+                         [("wydarzenia", wyd_id, None, False),
+                          ("uczestnictwa", wyd_id, osoba_id, False),
+                          ("miejsca", msc_id, None, False),
+                          ("wydarzenia", wyd_id, None, False),
+                          ("wydarzenia", wyd_id, None, False),
+                          ("uczestnictwa", wyd_id, osoba_id, True),
+                          ("osoby", osoba_id, None, True)])
+        self.assertEqual(self.zmiany(start, 2), (start + 2, zmiany[:2]))
+        self.assertEqual(self.zmiany(rewizja), (rewizja, []))
+        wynik = dbops.konserwuj(self.eng)
+        self.assertEqual(wynik["zmiany"], 5)
+        self.assertEqual(self.zmiany(0)[1],
+                         [("miejsca", msc_id, None, False),
+                          ("wydarzenia", wyd_id, None, False),
+                          ("uczestnictwa", wyd_id, osoba_id, True),
+                          ("osoby", osoba_id, None, True)])
+        dbops.przechowanie_zmian = 1
+        dbops.konserwuj(self.eng)
+        self.assertEqual(self.zmiany(rewizja - 1),
+                         (rewizja, [("osoby", osoba_id, None, True)]))
+        self.assertTrue(dbops.zmiany_od(self.eng, 0)["od_nowa"])
+
+
+class TestStronicowanie(unittest.TestCase):
+    def setUp(self):
+        self.echo = dbops.echo
+        dbops.echo = False
+        dbops.with_engine(dbops.utworz)
+
+    def tearDown(self):
+        dbops.dispose_engines()
+        dbops.echo = self.echo
+        os.remove(dbops.path)
+
+    def testStrony(self):
+        eng = dbops.get_engine()
+        wyd_id = dbops.dodaj_wydarzenie(eng, "libacja",
+                                        "2024-01-13", "20:00",
+                                        "2024-01-14", "05:00", "")
+        ids = dbops.dodaj_osoby(eng, [{"imie": "Gość",
+                                       "email": "gosc{0}@x.pl".format(i)}
+                                      for i in range(10)])["id"]
+        dbops.zapisz_wiele(eng, [{"email": "gosc{0}@x.pl".format(i),
+                                  "id_wydarzenia": wyd_id}
+                                 for i in range(10)])
+        xs = dbops.znajdz_zapisanych_na_wydarzenie(eng, wyd_id, 4, ids[3])
+        self.assertEqual([x["id"] for x in xs], ids[4:8])
+        xs = dbops.znajdz_osoba(eng, "Gość", None, ids[8])
+        self.assertEqual([x["id"] for x in xs], ids[9:])
+        xs = list(klient.strony("znajdz_zapisanych_na_wydarzenie",
+                                [wyd_id], False, 3))
+        self.assertEqual([x["id"] for x in xs], ids)
+
+    def testStronyPrzedzialu(self):
+        eng = dbops.get_engine()
+        ids = dbops.dodaj_wydarzenia(eng, [{"nazwa": "wykład",
+                                            "data_rozp": "2024-01-1" + str(i),
+                                            "godzina_rozp": "08:15",
+                                            "data_zak": "2024-01-1" + str(i),
+                                            "godzina_zak": "10:00"}
+                                           for i in reversed(range(6))])["id"]
+        xs = list(klient.strony("znajdz_wydarzenia_w_przedziale",
+                                ["2024-01-10", "2024-01-20"], False, 4))
+        self.assertEqual([x["id"] for x in xs], list(reversed(ids)))
+
+
+class TestSzukaj(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(dbops.path)
+
+    def testPrefiksy(self):
+        eng = self.engine
+        wyd_id = dbops.dodaj_wydarzenie(eng, "Wykład z algebry",
+                                        "2024-01-10", "10:00",
+                                        "2024-01-10", "12:00",
+                                        "grupy i pierścienie")
+        msc_id = dbops.dodaj_miejsce(eng, "Aula", "Żółkiewskiego 3")
+        os_id = dbops.dodaj_osoba(eng, "Algernon", "a@x.pl")
+        self.assertEqual({(x["rodzaj"], x["id"])
+                          for x in dbops.szukaj(eng, "alg")},
+                         {("wydarzenia", wyd_id), ("osoby", os_id)})
+        xs = dbops.szukaj(eng, "pierscienie wykł")
+        self.assertEqual([x["id"] for x in xs], [wyd_id])
+        xs = dbops.szukaj(eng, "zołk")
+        self.assertEqual([(x["rodzaj"], x["nazwa"]) for x in xs],
+                         [("miejsca", "Aula")])
+        self.assertEqual(dbops.szukaj(eng, '"*'), [])
+        self.assertEqual(len(dbops.szukaj(eng, "alg", 1)), 1)
+
+        dbops.mod_wydarzenie(eng, wyd_id, "Seminarium",
+                             None, None, None, None, None)
+        self.assertEqual(dbops.szukaj(eng, "wykł"), [])
+        self.assertEqual([x["id"] for x in dbops.szukaj(eng, "semin")],
+                         [wyd_id])
+        dbops.usun_osoba(eng, os_id)
+        dbops.usun_miejsce(eng, msc_id)
+        self.assertEqual(dbops.szukaj(eng, "alg aula"), [])
+
+
+class TestPamiec(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.engine)
+        self.pamiec = pamiec.Pamiec(wpisy=3, bajty=10000)
+        self.f = {name: pamiec.z_pamiecia(self.pamiec, f, name)
+                  for f, name in serwer.FUNKCJE}
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(dbops.path)
+
+    def testUniewaznianie(self):
+        eng, f = self.engine, self.f
+        msc_id = f["dodaj_miejsce"](eng, "aula", "Banacha 2")
+        wyd_id = f["dodaj_wydarzenie"](eng, "wykład", "2024-01-10", "10:00",
+                                       "2024-01-10", "12:00", "")
+        f["dodaj_osoba"](eng, "Ala", "ala@x.pl")
+        self.assertEqual(f["znajdz_wydarzenia_osoby"](eng, "ala@x.pl"), [])
+        self.assertEqual(f["znajdz_miejsce"](eng, "sala"), [])
+        xs = f["znajdz_wydarzenie"](eng, "wykład")
+        self.assertEqual(f["znajdz_wydarzenie"](eng, "wykład"), xs)
+        self.assertEqual(self.pamiec.stan()["trafienia"], 1)
+
+        f["zapisz"](eng, "ala@x.pl", wyd_id)
+        self.assertEqual(self.pamiec.stan()["wpisy"], 2)
+        self.assertEqual(len(f["znajdz_wydarzenia_osoby"](eng, "ala@x.pl")),
+                         1)
+        f["dodaj_miejsce_do_wydarzenia"](eng, msc_id, wyd_id)
+        self.assertEqual(self.pamiec.stan()["wpisy"], 1)
+        self.assertEqual(f["znajdz_wydarzenie"](eng, "wykład")[0]
+                         ["nazwa_miejsca"], "aula")
+        f["mod_miejsce"](eng, msc_id, "sala", None)
+        self.assertEqual(f["znajdz_wydarzenie"](eng, "wykład")[0]
+                         ["nazwa_miejsca"], "sala")
+        self.assertEqual(len(f["znajdz_miejsce"](eng, "sala")), 1)
+
+        f["znajdz_osoba"](eng, "Ala")
+        f["znajdz_zapisanych_na_wydarzenie"](eng, wyd_id)
+        stan = self.pamiec.stan()
+        self.assertEqual(stan["wpisy"], 3)
+        self.assertEqual(stan["wyeksmitowane"], 1)
+        f["usun_osoba"](eng, 1)
+        self.assertEqual(self.pamiec.stan()["wpisy"], 1)
+        self.assertEqual(f["znajdz_zapisanych_na_wydarzenie"](eng, wyd_id),
+                         [])
+
+    def testZapisy(self):
+        eng, f = self.engine, self.f
+        wyd_id = f["dodaj_wydarzenie"](eng, "wykład", "2024-01-10", "10:00",
+                                       "2024-01-10", "12:00", "")
+        f["dodaj_osoba"](eng, "Ala", "ala@x.pl")
+        f["znajdz_wydarzenie"](eng, "wykład")
+        self.assertEqual(f["znajdz_wydarzenie"](eng, "wykład", None, None,
+                                                True)[0]["pelne"], False)
+        f["ustaw_limit_miejsc"](eng, wyd_id, 1)
+        f["zapisz"](eng, "ala@x.pl", wyd_id)
+        self.assertEqual(self.pamiec.stan()["wpisy"], 1)
+        self.assertEqual(f["znajdz_wydarzenie"](eng, "wykład", None, None,
+                                                True)[0]["pelne"], True)
+
+
+class TestPomiary(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(dbops.dbpath, echo=False)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(dbops.path)
+
+    def testWszystkieFunkcje(self):
+        kal = generator.generuj(self.engine, osoby=20, miejsca=3,
+                                wydarzenia=30, gestosc=2, ziarno=7)
+        self.assertEqual(len(kal["wydarzenia"]), 30)
+        self.assertEqual(kal["osoby"][0]["email"], "osoba0@przyklad.pl")
+        funkcje = {name: f for f, name in serwer.FUNKCJE}
+        self.assertEqual(set(OPERACJE), set(funkcje))
+        wyniki = pomiar.zmierz(
+            lambda nazwa, a: funkcje[nazwa](self.engine, *a),
+            self.engine, kal, list(funkcje), 2)
+        self.assertEqual(set(wyniki), set(funkcje))
+        self.assertEqual(wyniki["zapisz"]["liczba"], 2)
+        bazowe = {"lokalnie": {"szukaj": dict(wyniki["szukaj"], p50=0,
+                                              p95=0)}}
+        regresje = pomiar.porownaj({"lokalnie": wyniki}, bazowe, 0.2)
+        self.assertEqual([(r["nazwa"], r["miara"]) for r in regresje],
+                         [("szukaj", "p50"), ("szukaj", "p95")])
+
+
+class TestMetryki(unittest.TestCase):
+    def setUp(self):
+        self.echo = dbops.echo
+        dbops.echo = False
+        self.metryki = metryki.Metryki()
+        self.server = serwer.zbuduj_serwer(port=0, tryb="watki",
+                                           pomiary=self.metryki,
+                                           prometheus=True)
+        self.server.logRequests = False
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = "http://localhost:{0}".format(
+            self.server.server_address[1])
+        self.proxy = xmlrpc.client.ServerProxy(self.url, allow_none=True)
+
+    def tearDown(self):
+        self.proxy("close")()
+        self.server.shutdown()
+        self.server.server_close()
+        self.metryki.zamknij()
+        dbops.dispose_engines()
+        dbops.echo = self.echo
+        os.remove(dbops.path)
+
+    def testMetryki(self):
+        self.proxy.utworz()
+        self.proxy.znajdz_miejsce("aula")
+        self.proxy.znajdz_miejsce("sala")
+        with self.assertRaises(xmlrpc.client.Fault):
+            self.proxy.mod_miejsce(1, "aula", None)
+        stan = self.proxy.metryki_serwera()
+        m = stan["znajdz_miejsce"]
+        self.assertEqual((m["wywolania"], m["bledy"]), (2, 0))
+        self.assertEqual(m["zapytania_sql"], 2)
+        self.assertEqual(m["histogram"]["+Inf"], 2)
+        self.assertEqual(stan["mod_miejsce"]["bledy"], 1)
+
+        with urllib.request.urlopen(self.url + "/metrics") as odp:
+            tekst = odp.read().decode("utf-8")
+        self.assertIn('kalendarz_rpc_wywolania_total{metoda="znajdz_miejsce"',
+                      tekst)
+        self.assertIn("kalendarz_rpc_czas_sekundy_bucket{", tekst)
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(self.url + "/inne")
+
+
+class TestSpecyfikacja(unittest.TestCase):
+    def testPamiec(self):
+        with tempfile.TemporaryDirectory() as katalog:
+            plik = os.path.join(katalog, "help.txt")
+            pamiec = os.path.join(katalog, "cache", "help.marshal")
+            with open(plik, "w", encoding="utf-8") as f:
+                f.write("OPTIONS\n-s API.\nPARAMS\nACTIONS\n--a A.\n")
+            spec = klient.wczytaj_specyfikacje(plik, pamiec)
+            self.assertEqual(spec, [("OPTIONS", "-s", "API.\n"),
+                                    ("ACTIONS", "--a", "A.\n")])
+            self.assertTrue(os.path.exists(pamiec))
+            self.assertEqual(klient.wczytaj_specyfikacje(plik, pamiec), spec)
+            with open(plik, "a", encoding="utf-8") as f:
+                f.write("--b B.\n")
+            self.assertEqual(len(klient.wczytaj_specyfikacje(plik, pamiec)),
+                             3)
+
+
+class TestPowtorzenia(unittest.TestCase):
+    def setUp(self):
+        self.eng = create_engine(dbops.dbpath, echo=False)
+        dbops.utworz(self.eng)
+        self.id = dbops.dodaj_wydarzenie(self.eng, "zajęcia", "2024-01-31",
+                                         "10:00", "2024-01-31", "12:00", "")
+
+    def tearDown(self):
+        self.eng.dispose()
+        os.remove(dbops.path)
+
+    def poczatki(self, xs):
+        return [(x["id"], x["data_rozp"] + " " + x["godzina_rozp"])
+                for x in xs]
+
+    def testWystapienia(self):
+        dbops.ustaw_powtarzanie(self.eng, self.id, "miesiecznie", 1, 4)
+        xs = dbops.znajdz_wydarzenia_w_przedziale(self.eng, "2024-02-01",
+                                                  "2025-01-01")
+        self.assertEqual(self.poczatki(xs),
+                         [(self.id, "2024-02-29 10:00"),
+                          (self.id, "2024-03-31 10:00"),
+                          (self.id, "2024-04-30 10:00")])
+        with self.assertRaises(dbops.NotFoundError):
+            dbops.odwolaj_wystapienie(self.eng, self.id, "2024-02-28 10:00")
+
+    def testWyjatki(self):
+        dbops.ustaw_powtarzanie(self.eng, self.id, "tygodniowo")
+        dbops.odwolaj_wystapienie(self.eng, self.id, "2024-02-07 10:00")
+        nowe = dbops.mod_wystapienie(self.eng, self.id, "2024-02-14 10:00",
+                                     "zastępstwo", None, "14:00", None,
+                                     "16:00", None)
+        xs = dbops.znajdz_wydarzenia_w_przedziale(self.eng, "2024-02-01",
+                                                  "2024-02-22")
+        self.assertEqual(self.poczatki(xs), [(nowe, "2024-02-14 14:00"),
+                                             (self.id, "2024-02-21 10:00")])
+        self.assertEqual(xs[0]["nazwa"], "zastępstwo")
+        with self.assertRaises(dbops.NotFoundError):
+            dbops.mod_wystapienie(self.eng, self.id, "2024-02-07 10:00",
+                                  "x", None, None, None, None, None)
+        [seria, zmiana] = dbops.eksport(self.eng)
+        self.assertEqual(seria["powtarzanie"]["czestotliwosc"], "tygodniowo")
+        self.assertEqual(seria["odwolane"],
+                         [datetime.datetime(2024, 2, 7, 10)])
+        self.assertEqual(zmiana["zastepuje"],
+                         (self.id, datetime.datetime(2024, 2, 14, 10)))
+        ics = "".join(wymiana.ics([seria, zmiana]))
+        self.assertIn("RRULE:FREQ=WEEKLY;INTERVAL=1\r\n", ics)
+        self.assertIn("EXDATE:20240207T100000\r\n", ics)
+        self.assertIn("RECURRENCE-ID:20240214T100000\r\n", ics)
+
+    def testStrony(self):
+        dbops.ustaw_powtarzanie(self.eng, self.id, "dziennie", 2)
+        drugie = dbops.dodaj_wydarzenie(self.eng, "dyżur", "2024-02-02",
+                                        "10:00", "2024-02-02", "11:00", "")
+        wszystkie = self.poczatki(dbops.znajdz_wydarzenia_w_przedziale(
+            self.eng, "2024-02-01", "2024-02-08"))
+        self.assertEqual(len(wszystkie), 4)
+        self.assertIn((drugie, "2024-02-02 10:00"), wszystkie)
+
+        def wywolaj(action, action_args):
+            return getattr(dbops, action)(self.eng, *action_args)
+
+        with mock.patch.object(klient, "invoke_action",
+                               lambda a, args, online: wywolaj(a, args)):
+            xs = klient.strony("znajdz_wydarzenia_w_przedziale",
+                               ["2024-02-01", "2024-02-08"], False, 2)
+            self.assertEqual(self.poczatki(xs), wszystkie)
+
+
+class TestSerwerAsync(unittest.TestCase):
+    def testJsonRpc(self):
+        async def dispatch(metoda, params):
+            await asyncio.sleep(0)
+            return params[0] // params[1]
+
+        zapytanie = [{"jsonrpc": "2.0", "id": 1, "method": "dziel",
+                      "params": [7, 3]},
+                     {"jsonrpc": "2.0", "id": 2, "method": "dziel",
+                      "params": [1, 0]},
+                     {"jsonrpc": "2.0", "id": 3, "method": "inna"},
+                     {"jsonrpc": "2.0", "method": "dziel", "params": [1, 0]},
+                     {"jsonrpc": "2.0", "id": None, "method": "dziel",
+                      "params": [4, 2]}]
+
+        def odpowiedz(zapytanie):
+            return asyncio.run(transport.odpowiedz_async(
+                {"dziel": None}, dispatch,
+                transport.koduj(zapytanie, "json"), "json"))
+        odp = transport.dekoduj(odpowiedz(zapytanie), "json")
+        self.assertEqual(odp[0], {"jsonrpc": "2.0", "id": 1, "result": 2})
+        self.assertEqual([o["error"]["code"] for o in odp[1:3]],
+                         [transport.BLAD_SERWERA, transport.BRAK_METODY])
+        self.assertEqual(odp[3:], [{"jsonrpc": "2.0", "id": None,
+                                    "result": 2}])
+        self.assertIsNone(odpowiedz(zapytanie[3]))
+        self.assertIsNone(odpowiedz(zapytanie[3:4] * 2))
+
+    def testKolejka(self):
+        server = serwer_async.SerwerAsync(None, rownolegle=1, kolejka=1)
+
+        async def zapytania():
+            async with server._kolej():
+                drugie = asyncio.create_task(server._kolej().__aenter__())
+                await asyncio.sleep(0)
+                self.assertEqual(server.stan()["kolejka"], 1)
+                with self.assertRaises(serwer_async.Przeciazenie):
+                    async with server._kolej():
+                        pass
+            await drugie
+            self.assertEqual(server.stan()["zajeci"], 1)
+
+        asyncio.run(zapytania())
+
+    def testSerwer(self):
+        echo = dbops.echo
+        dbops.echo = False
+        dbops.with_engine(dbops.utworz, dispose=True)
+        petla = asyncio.new_event_loop()
+        server = serwer_async.SerwerAsync(serwer_async.zbuduj_silnik(),
+                                          rownolegle=2)
+        porty = []
+        gotowy = threading.Event()
+
+        def serwuj():
+            petla.run_until_complete(server.serwuj(
+                "localhost", 0,
+                lambda port: (porty.append(port), gotowy.set())))
+        watek = threading.Thread(target=serwuj)
+        watek.start()
+        try:
+            gotowy.wait(5)
+            url = "http://localhost:{0}".format(porty[0])
+            with xmlrpc.client.ServerProxy(url, allow_none=True) as proxy:
+                id_osoby = proxy.dodaj_osoba("Ferdynand Kiepski",
+                                             "ferdek@kiepski.pl")
+                multi = xmlrpc.client.MultiCall(proxy)
+                multi.znajdz_osoba("Ferdynand Kiepski", None, None)
+                multi.usun_osoba(id_osoby + 1)
+                wyniki = multi()
+                self.assertEqual(wyniki[0][0]["id"], id_osoby)
+                with self.assertRaises(xmlrpc.client.Fault):
+                    wyniki[1]
+            json = transport.Polaczenie(url)
+            try:
+                self.assertEqual(json.wywolaj("stan_serwera", [])["tryb"],
+                                 "asyncio")
+            finally:
+                json.zamknij()
+            for naglowki, status in [({}, 411),
+                                     ({"Transfer-Encoding": "chunked"}, 411),
+                                     ({"Content-Length": "-5"}, 400)]:
+                surowe = http.client.HTTPConnection(json.host)
+                surowe.putrequest("POST", transport.SCIEZKA)
+                surowe.putheader("Content-Type", transport.TYPY["json"])
+                for k, v in naglowki.items():
+                    surowe.putheader(k, v)
+                surowe.endheaders(b"2\r\n{}\r\n0\r\n\r\n")
+                odp = surowe.getresponse()
+                self.assertEqual((odp.status, odp.will_close),
+                                 (status, True))
+                surowe.close()
+            surowe = http.client.HTTPConnection(json.host)
+            surowe.request("POST", transport.SCIEZKA,
+                           b'{"jsonrpc":"2.0","method":"stan_serwera"}',
+                           {"Content-Type": transport.TYPY["json"]})
+            odp = surowe.getresponse()
+            self.assertEqual((odp.status, odp.read()), (204, b""))
+            surowe.close()
+            with socket.create_connection(("localhost", porty[0])) as s:
+                s.sendall(b"GET /eksport.ics HTTP/1.0\r\n\r\n")
+                odp = b"".join(iter(lambda: s.recv(4096), b""))
+            glowa, _, tresc = odp.partition(b"\r\n\r\n")
+            self.assertNotIn(b"Transfer-Encoding", glowa)
+            self.assertTrue(tresc.startswith(b"BEGIN:VCALENDAR"))
+            self.assertTrue(tresc.endswith(b"END:VCALENDAR\r\n"))
+        finally:
+            petla.call_soon_threadsafe(server.zatrzymaj)
+            watek.join()
+            petla.close()
+            dbops.echo = echo
+            os.remove(dbops.path)
+
+    def testPamiec(self):
+        echo = dbops.echo
+        dbops.echo = False
+        dbops.with_engine(dbops.utworz, dispose=True)
+        engine = serwer_async.zbuduj_silnik()
+        server = serwer_async.SerwerAsync(
+            engine, podreczna=pamiec.Pamiec(100, 2**20))
+        uzbrojone = threading.Event()
+        zatwierdzanie, odczytano = threading.Event(), threading.Event()
+
+        def przed_zatwierdzeniem(conn):
+            if uzbrojone.is_set() and not zatwierdzanie.is_set():
+                zatwierdzanie.set()
+                odczytano.wait(5)
+        event.listen(engine.sync_engine, "commit", przed_zatwierdzeniem)
+
+        async def zapis_i_odczyt():
+            await server.wywolaj("dodaj_miejsce", ["aula", "Banacha 2"])
+            await server.wywolaj("znajdz_miejsce", ["aula"])
+            uzbrojone.set()
+            zapis = asyncio.create_task(server.wywolaj(
+                "dodaj_miejsce", ["aula", "Pasteura 5"]))
+            await asyncio.to_thread(zatwierdzanie.wait, 5)
+            await server.wywolaj("znajdz_miejsce", ["aula"])
+            odczytano.set()
+            await zapis
+            try:
+                return await server.wywolaj("znajdz_miejsce", ["aula"])
+            finally:
+                await engine.dispose()
+        try:
+            xs = asyncio.run(zapis_i_odczyt())
+        finally:
+            dbops.echo = echo
+            os.remove(dbops.path)
+        self.assertTrue(zatwierdzanie.is_set())
+        self.assertEqual(sorted(x["adres"] for x in xs),
+                         ["Banacha 2", "Pasteura 5"],
+                         "nieaktualny wynik w pamięci podręcznej")